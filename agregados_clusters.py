@@ -0,0 +1,164 @@
+"""
+Agregados mescláveis dos gráficos do Modelo 1 para bases grandes
+
+Acima de alguns centenas de milhares de clientes, enviar cada ponto ao
+navegador trava a página. Em vez disso, cada bloco pontuado é reduzido a:
+
+- `densidade`: contagem de clientes por cluster em faixas 2D
+  (frequência × gasto total, faixas logarítmicas), com as somas de cada
+  eixo para posicionar o ponto no centro de massa da faixa;
+- `recencia`: histograma exato da recência (dias inteiros) por cluster,
+  do qual saem os quartis e as cercas do boxplot;
+- `extremos`: por cluster, os clientes com maiores gastos e recências mais
+  altas/baixas (tamanho limitado), candidatos a outliers com hover.
+
+Os três agregados são somas/uniões e podem ser mesclados entre blocos.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from dados_graficos import quantis_histograma
+
+# Faixas logarítmicas dos eixos do gráfico de densidade (~10% de largura relativa)
+FAIXAS_POR_DECADA = 24
+VALOR_MINIMO_FAIXA = 1e-2
+# Pontos máximos da dispersão de densidade: acima disso, faixas vizinhas são unidas
+LIMITE_PONTOS_DENSIDADE = 1000
+# Clientes extremos mantidos por cluster e por critério
+LIMITE_EXTREMOS = 200
+# (coluna, maiores?) que definem os candidatos a outlier
+_CRITERIOS_EXTREMOS = [('total_spent', True), ('recency_days', True), ('recency_days', False)]
+
+
+class AgregadosClusters(NamedTuple):
+    densidade: pd.DataFrame
+    recencia: pd.DataFrame
+    extremos: pd.DataFrame
+
+
+def _faixa_log(valores):
+    """Índice da faixa logarítmica de cada valor (valores abaixo do mínimo vão para a primeira faixa)"""
+    valores = np.maximum(np.asarray(valores, dtype='float64'), VALOR_MINIMO_FAIXA)
+    return np.floor(np.log10(valores / VALOR_MINIMO_FAIXA) * FAIXAS_POR_DECADA).astype('int32')
+
+
+def _extremos_por_cluster(df, limite):
+    """Até `limite` clientes por cluster em cada critério de `_CRITERIOS_EXTREMOS`"""
+    partes = [
+        df.sort_values(coluna, ascending=not maiores, kind='stable').groupby('cluster', sort=False).head(limite)
+        for coluna, maiores in _CRITERIOS_EXTREMOS
+    ]
+    extremos = pd.concat(partes)
+    return extremos[~extremos.index.duplicated()]
+
+
+def agregar_bloco(bloco, limite_extremos=LIMITE_EXTREMOS):
+    """
+    Reduz um bloco pontuado aos agregados dos gráficos.
+
+    Args:
+        bloco (pd.DataFrame): Clientes com `user_id`, FEATURES_CLUSTER e `cluster`
+        limite_extremos (int): Clientes extremos mantidos por cluster e critério
+
+    Returns:
+        AgregadosClusters: Agregados do bloco
+    """
+    total_spent = bloco['total_spent'].to_numpy(dtype='float64')
+    frequency = bloco['frequency'].to_numpy(dtype='float64')
+    faixas = pd.DataFrame({
+        'cluster': bloco['cluster'].to_numpy(),
+        'faixa_frequency': _faixa_log(frequency),
+        'faixa_total_spent': _faixa_log(total_spent),
+        'soma_frequency': frequency,
+        'soma_total_spent': total_spent,
+    })
+    densidade = faixas.groupby(['cluster', 'faixa_frequency', 'faixa_total_spent']).agg(
+        quantidade=('soma_frequency', 'size'),
+        soma_frequency=('soma_frequency', 'sum'),
+        soma_total_spent=('soma_total_spent', 'sum'),
+    )
+    recencia = bloco.groupby(['cluster', 'recency_days']).size().rename('quantidade').to_frame()
+    return AgregadosClusters(densidade, recencia, _extremos_por_cluster(bloco, limite_extremos))
+
+
+def mesclar_agregados(a, b, limite_extremos=LIMITE_EXTREMOS):
+    """Mescla os agregados de dois blocos (ou de dois arquivos)"""
+    if a is None:
+        return b
+    return AgregadosClusters(
+        a.densidade.add(b.densidade, fill_value=0),
+        a.recencia.add(b.recencia, fill_value=0),
+        _extremos_por_cluster(pd.concat([a.extremos, b.extremos]), limite_extremos),
+    )
+
+
+def pontos_densidade(agregados, limite_pontos=LIMITE_PONTOS_DENSIDADE):
+    """
+    Uma linha por faixa 2D ocupada, posicionada no centro de massa dos clientes da faixa.
+
+    Enquanto houver mais de `limite_pontos` faixas ocupadas, faixas vizinhas são
+    unidas (largura dobrada em cada eixo), de forma que o número de pontos não
+    cresce com o número de clientes; o centro de massa continua exato.
+
+    Returns:
+        pd.DataFrame: cluster, frequency, total_spent e quantidade
+    """
+    densidade = agregados.densidade
+    while len(densidade) > limite_pontos:
+        faixas = densidade.index
+        densidade = densidade.groupby([
+            faixas.get_level_values('cluster'),
+            faixas.get_level_values('faixa_frequency') // 2,
+            faixas.get_level_values('faixa_total_spent') // 2,
+        ]).sum()
+    densidade = densidade.reset_index()
+    quantidade = densidade['quantidade']
+    return pd.DataFrame({
+        'cluster': densidade['cluster'],
+        'frequency': densidade['soma_frequency'] / quantidade,
+        'total_spent': densidade['soma_total_spent'] / quantidade,
+        'quantidade': quantidade.astype(int),
+    })
+
+
+def quantis_recencia(agregados):
+    """
+    Quartis e cercas (1,5 × IQR, limitadas aos valores observados) da recência por cluster.
+
+    Returns:
+        pd.DataFrame: Por cluster: quantidade, minimo, q1, mediana, q3, maximo,
+        cerca_inferior e cerca_superior
+    """
+    linhas = []
+    for cluster, grupo in agregados.recencia['quantidade'].groupby(level='cluster'):
+        valores = grupo.index.get_level_values('recency_days').to_numpy(dtype='float64')
+        q1, mediana, q3 = quantis_histograma(valores, grupo.to_numpy(), [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+        linhas.append({
+            'cluster': cluster, 'quantidade': int(grupo.sum()),
+            'minimo': valores[0], 'q1': q1, 'mediana': mediana, 'q3': q3, 'maximo': valores[-1],
+            'cerca_inferior': dentro.min(), 'cerca_superior': dentro.max(),
+        })
+    return pd.DataFrame(linhas)
+
+
+def amostra_outliers(agregados, quantis, por_cluster=50, semente=0):
+    """
+    Amostra estratificada (até `por_cluster` por cluster) dos clientes fora das
+    cercas de recência ou com os maiores gastos, para inspeção com hover.
+
+    Returns:
+        pd.DataFrame: Clientes selecionados, com a coluna `motivo`
+    """
+    extremos = agregados.extremos.merge(
+        quantis[['cluster', 'cerca_inferior', 'cerca_superior']], on='cluster', how='left'
+    )
+    fora_cercas = ~extremos['recency_days'].between(extremos['cerca_inferior'], extremos['cerca_superior'])
+    maior_gasto = extremos.groupby('cluster')['total_spent'].rank(ascending=False, method='first') <= por_cluster
+    extremos['motivo'] = np.where(fora_cercas, 'Recência fora das cercas', 'Maior gasto do cluster')
+    candidatos = extremos[fora_cercas | maior_gasto].drop(columns=['cerca_inferior', 'cerca_superior'])
+    embaralhados = candidatos.sample(frac=1.0, random_state=semente)
+    return embaralhados.groupby('cluster', sort=True).head(por_cluster).sort_values(['cluster', 'total_spent'])
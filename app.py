@@ -1,4 +1,14 @@
 import streamlit as st
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from aquecimento import iniciar_aquecimento
+from ingestao import ativar_copy_on_write
+
+# Com `streamlit run app.py` (sem `iniciar_servidor.py`), o aquecimento começa na primeira visita à página inicial
+iniciar_aquecimento()
+ativar_copy_on_write()
 
 st.set_page_config(
     page_title="Tech Challenge 03 - ML Analytics",
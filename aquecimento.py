@@ -0,0 +1,104 @@
+"""
+Aquecimento dos modelos na inicialização do servidor
+
+Os artefatos (K-Means, floresta + encoders do Modelo 2 e regressão logística)
+ficam no registro por processo de `registro_artefatos`: cada um é carregado
+uma única vez, na primeira chamada de `obter_artefato`, e compartilhado por
+todas as sessões.
+
+`iniciar_aquecimento` dispara, em uma thread em segundo plano, o
+carregamento e a validação de todos os artefatos (uma predição de uma linha
+em cada modelo) e a importação dos módulos pesados usados só nos gráficos
+(Plotly). Chamado por `iniciar_servidor.py` antes de o Streamlit abrir a
+porta, de forma que o primeiro visitante após um restart já encontra tudo
+carregado; as páginas que pedirem um artefato ainda em carregamento
+aguardam o mesmo carregamento, sem repeti-lo. `MODEL_PREWARM=0` desliga o
+aquecimento (os artefatos voltam a ser carregados na primeira página que
+os usa).
+
+Cada etapa é registrada como uma linha JSON no logger `instrumentacao`
+(`"evento": "aquecimento"`) e fica disponível em `estado_aquecimento`.
+"""
+import importlib
+import json
+import os
+import threading
+import time
+
+from instrumentacao import LOG_ETAPAS, logger
+
+AQUECER = os.environ.get("MODEL_PREWARM", "1") != "0"
+# Importados em segundo plano: só as páginas com gráficos precisam deles
+MODULOS_PESADOS = ("plotly.express", "plotly.graph_objects")
+# Importados antes de a thread começar: o Plotly detecta o pandas olhando `sys.modules`, e um
+# pandas ainda em importação por outra thread quebra a montagem das figuras
+MODULOS_BASE = ("numpy", "pandas", "pyarrow")
+
+_estado = {}
+_concluido = threading.Event()
+_thread = None
+_trava_thread = threading.Lock()
+
+
+def _registrar(etapa, inicio, erro=None):
+    _estado[etapa] = {"segundos": time.perf_counter() - inicio, "erro": erro}
+    if LOG_ETAPAS:
+        logger.info(json.dumps({"evento": "aquecimento", "etapa": etapa, **_estado[etapa]}))
+
+
+def aquecer():
+    """Carrega e valida todos os artefatos e importa os módulos pesados (erros ficam no estado)"""
+    from registro_artefatos import ARTEFATOS, obter_artefato
+
+    comeco = time.perf_counter()
+    for nome in ARTEFATOS:
+        inicio = time.perf_counter()
+        try:
+            # A carga pelo registro já valida o artefato (features e uma predição de uma linha)
+            obter_artefato(nome)
+            _registrar(nome, inicio)
+        except Exception as e:
+            _registrar(nome, inicio, f"{type(e).__name__}: {e}")
+    for modulo in MODULOS_PESADOS:
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(modulo)
+            _registrar(modulo, inicio)
+        except ImportError as e:
+            _registrar(modulo, inicio, str(e))
+    _registrar("total", comeco)
+    _concluido.set()
+
+
+def iniciar_aquecimento():
+    """
+    Dispara o aquecimento em uma thread em segundo plano (uma única vez por processo).
+
+    Os módulos de MODULOS_BASE são importados antes, na thread que chama.
+
+    Returns:
+        bool: True se o aquecimento está ativo (`MODEL_PREWARM` diferente de 0)
+    """
+    global _thread
+    if not AQUECER:
+        return False
+    with _trava_thread:
+        if _thread is None:
+            for modulo in MODULOS_BASE:
+                importlib.import_module(modulo)
+            _thread = threading.Thread(target=aquecer, name="aquecimento", daemon=True)
+            _thread.start()
+    return True
+
+
+def aguardar_aquecimento(timeout=None):
+    """Bloqueia até o fim do aquecimento; devolve False se `timeout` (s) expirar antes"""
+    return _concluido.wait(timeout)
+
+
+def estado_aquecimento():
+    """
+    Returns:
+        dict: Etapa (artefato ou módulo) -> segundos e erro; vazio antes do início
+    """
+    return dict(_estado)
@@ -0,0 +1,191 @@
+"""
+Armazém de resultados compartilhado entre as sessões do processo
+
+O `st.cache_data` devolve uma cópia desserializada do resultado a cada
+chamada, e o que fica em `st.session_state` é mantido por sessão: com
+dezenas de analistas abrindo o mesmo catálogo, a memória do servidor cresce
+com o número de sessões. Aqui cada resultado fica uma única vez na memória
+do processo; as sessões guardam apenas a chave e registram uma referência.
+
+- Contagem de referências: cada sessão referencia no máximo um resultado
+  por página; trocar de arquivo libera a referência anterior e sessões sem
+  acesso há mais de `TTL_SESSOES_S` segundos são descartadas.
+- Teto global de memória (`LIMITE_BYTES_ARMAZEM`): acima dele, os
+  resultados sem referências saem primeiro (LRU) e depois os referenciados.
+  A sessão cujo resultado saiu o obtém de novo no próximo acesso
+  (normalmente do cache de resultados em disco, sem chamar o modelo).
+- `uso_por_sessao` expõe, para operadores, a memória atribuída a cada sessão.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+LIMITE_BYTES_ARMAZEM = int(os.environ.get("SESSION_STORE_MAX_BYTES", 512 * 1024 ** 2))
+TTL_SESSOES_S = float(os.environ.get("SESSION_STORE_TTL_S", 30 * 60))
+
+
+def tamanho_resultado(valor):
+    """Bytes ocupados por um resultado (NamedTuples, dicionários, DataFrames, Series, Index e ndarrays)"""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, (pd.Series, pd.Index)):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sum(tamanho_resultado(item) for item in valor.values())
+    if isinstance(valor, (tuple, list)):
+        return sum(tamanho_resultado(item) for item in valor)
+    return 0
+
+
+@dataclass
+class _Entrada:
+    valor: object
+    bytes: int
+    ultimo_uso: float
+    sessoes: set = field(default_factory=set)
+
+
+class ArmazemResultados:
+    """
+    Resultados compartilhados por chave, com referências por sessão e teto de memória.
+
+    Args:
+        limite_bytes (int): Memória máxima ocupada pelos resultados
+        ttl_sessoes_s (float): Inatividade após a qual as referências de uma sessão são liberadas
+    """
+
+    def __init__(self, limite_bytes=LIMITE_BYTES_ARMAZEM, ttl_sessoes_s=TTL_SESSOES_S):
+        self.limite_bytes = limite_bytes
+        self.ttl_sessoes_s = ttl_sessoes_s
+        self._entradas = {}
+        # sessão -> {página: chave} e sessão -> último acesso
+        self._referencias = {}
+        self._acessos = {}
+        self._lock = threading.Lock()
+        # Um lock por chave: sessões pedindo o mesmo resultado esperam um único cálculo
+        self._calculando = {}
+
+    def obter(self, sessao, pagina, chave, calcular):
+        """
+        Devolve o resultado `chave`, calculando-o com `calcular()` se não estiver na memória.
+
+        O resultado é compartilhado entre sessões e não deve ser modificado.
+
+        Args:
+            sessao (str): Identificador da sessão
+            pagina (str): Página que usa o resultado (uma referência por página e sessão)
+            chave (str): Chave do resultado (ex.: `cache_resultados.chave_resultado`)
+            calcular (Callable[[], Any]): Calcula ou recarrega o resultado
+
+        Returns:
+            Any: O resultado
+        """
+        with self._lock:
+            self._expirar_sessoes()
+            self._referenciar(sessao, pagina, chave)
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                entrada.ultimo_uso = time.monotonic()
+                return entrada.valor
+            lock_chave = self._calculando.setdefault(chave, threading.Lock())
+
+        try:
+            with lock_chave:
+                with self._lock:
+                    entrada = self._entradas.get(chave)
+                if entrada is None:
+                    valor = calcular()
+                    with self._lock:
+                        entrada = _Entrada(valor, tamanho_resultado(valor), time.monotonic())
+                        entrada.sessoes = {s for s, paginas in self._referencias.items() if chave in paginas.values()}
+                        self._entradas[chave] = entrada
+                        self._limitar(preservar=chave)
+        finally:
+            # Também quando `calcular` falha: a chave não fica para sempre em `_calculando`
+            with self._lock:
+                self._calculando.pop(chave, None)
+        return entrada.valor
+
+    def liberar(self, sessao):
+        """Libera todas as referências de uma sessão"""
+        with self._lock:
+            self._soltar_sessao(sessao)
+
+    def _referenciar(self, sessao, pagina, chave):
+        paginas = self._referencias.setdefault(sessao, {})
+        anterior = paginas.get(pagina)
+        if anterior is not None and anterior != chave and anterior in self._entradas:
+            self._entradas[anterior].sessoes.discard(sessao)
+        paginas[pagina] = chave
+        self._acessos[sessao] = time.monotonic()
+        if chave in self._entradas:
+            self._entradas[chave].sessoes.add(sessao)
+
+    def _soltar_sessao(self, sessao):
+        for chave in self._referencias.pop(sessao, {}).values():
+            if chave in self._entradas:
+                self._entradas[chave].sessoes.discard(sessao)
+        self._acessos.pop(sessao, None)
+
+    def _expirar_sessoes(self):
+        limite = time.monotonic() - self.ttl_sessoes_s
+        for sessao in [s for s, acesso in self._acessos.items() if acesso < limite]:
+            self._soltar_sessao(sessao)
+
+    def _limitar(self, preservar):
+        """Remove resultados até caber no teto: primeiro os sem referências, depois os usados há mais tempo"""
+        total = sum(entrada.bytes for entrada in self._entradas.values())
+        ordem = sorted(self._entradas.items(), key=lambda item: (bool(item[1].sessoes), item[1].ultimo_uso))
+        for chave, entrada in ordem:
+            if total <= self.limite_bytes:
+                break
+            if chave == preservar:
+                continue
+            del self._entradas[chave]
+            total -= entrada.bytes
+
+    def uso_por_sessao(self):
+        """
+        Memória atribuída a cada sessão (o resultado é rateado entre as sessões que o referenciam).
+
+        Returns:
+            pd.DataFrame: sessao, pagina, chave, carregado, bytes_resultado,
+            bytes_atribuidos e inativa_s (segundos desde o último acesso)
+        """
+        agora = time.monotonic()
+        with self._lock:
+            linhas = []
+            for sessao, paginas in self._referencias.items():
+                for pagina, chave in paginas.items():
+                    entrada = self._entradas.get(chave)
+                    linhas.append({
+                        'sessao': sessao,
+                        'pagina': pagina,
+                        'chave': chave[:12],
+                        'carregado': entrada is not None,
+                        'bytes_resultado': entrada.bytes if entrada else 0,
+                        'bytes_atribuidos': entrada.bytes / max(len(entrada.sessoes), 1) if entrada else 0.0,
+                        'inativa_s': agora - self._acessos[sessao],
+                    })
+        colunas = ['sessao', 'pagina', 'chave', 'carregado', 'bytes_resultado', 'bytes_atribuidos', 'inativa_s']
+        return pd.DataFrame(linhas, columns=colunas)
+
+    def resumo(self):
+        """Totais do armazém: resultados, sessões, bytes ocupados e teto"""
+        with self._lock:
+            return {
+                'resultados': len(self._entradas),
+                'sessoes': len(self._referencias),
+                'bytes': sum(entrada.bytes for entrada in self._entradas.values()),
+                'limite_bytes': self.limite_bytes,
+            }
+
+
+# Instância única do processo (os módulos importados são compartilhados entre as sessões do Streamlit)
+ARMAZEM = ArmazemResultados()
@@ -0,0 +1,123 @@
+"""
+Gerador de carga local para o servidor de pontuação (servidor_scoring.py)
+
+Sobe o servidor duas vezes - sem agrupamento (max_lote=1) e com micro-lotes -
+e dispara as mesmas requisições concorrentes linha a linha, comparando os
+percentis de latência e o throughput observados pelo cliente.
+
+Uso:
+    python benchmarks/carga_servidor.py --endpoint precos --requisicoes 5000 --concorrencia 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from modelos import FEATURES_CONVERSAO, FEATURES_PRECOS
+
+DATASETS = {
+    "precos": ("datasets/classific_test.csv", FEATURES_PRECOS),
+    "conversao": ("datasets/randomforest_test.csv", FEATURES_CONVERSAO),
+}
+
+
+def _linhas(endpoint, quantidade):
+    """Linhas do dataset padrão do endpoint, serializadas como corpo JSON"""
+    caminho, features = DATASETS[endpoint]
+    dados = pd.read_csv(os.path.join(RAIZ, caminho), usecols=features)
+    dados = dados.sample(quantidade, replace=True, random_state=0)
+    return [json.dumps(linha) for linha in dados.to_dict("records")]
+
+
+async def _aguardar_servidor(url, tentativas=100):
+    cliente = AsyncHTTPClient()
+    for _ in range(tentativas):
+        try:
+            await cliente.fetch(f"{url}/saude")
+            return
+        except (ConnectionError, HTTPClientError, OSError):
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Servidor não respondeu")
+
+
+async def _disparar(url, corpos, concorrencia):
+    """Envia as requisições com `concorrencia` clientes simultâneos; devolve latências (ms) e duração"""
+    cliente = AsyncHTTPClient(max_clients=concorrencia)
+    fila = asyncio.Queue()
+    for corpo in corpos:
+        fila.put_nowait(corpo)
+    latencias = []
+
+    async def cliente_simulado():
+        while not fila.empty():
+            corpo = fila.get_nowait()
+            inicio = time.perf_counter()
+            await cliente.fetch(url, method="POST", body=corpo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_simulado() for _ in range(concorrencia)))
+    return np.array(latencias), time.perf_counter() - inicio
+
+
+async def _medir(porta, endpoint, corpos, concorrencia):
+    url = f"http://localhost:{porta}"
+    await _aguardar_servidor(url)
+    await _disparar(f"{url}/v1/{endpoint}", corpos[:200], concorrencia)  # aquecimento
+    latencias, duracao = await _disparar(f"{url}/v1/{endpoint}", corpos, concorrencia)
+    metricas = json.loads((await AsyncHTTPClient().fetch(f"{url}/metricas")).body)[endpoint]
+    return latencias, duracao, metricas
+
+
+def executar(endpoint, requisicoes, concorrencia, max_lote, max_espera_ms, porta):
+    corpos = _linhas(endpoint, requisicoes)
+    cenarios = {"sem agrupamento": (1, 0.0), "micro-lotes": (max_lote, max_espera_ms)}
+    resultados = {}
+    for nome, (lote, espera) in cenarios.items():
+        servidor = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, "servidor_scoring.py"), "--porta", str(porta),
+             "--max-lote", str(lote), "--max-espera-ms", str(espera)],
+            cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            latencias, duracao, metricas = asyncio.run(_medir(porta, endpoint, corpos, concorrencia))
+        finally:
+            servidor.terminate()
+            servidor.wait()
+        p50, p99 = np.percentile(latencias, [50, 99])
+        resultados[nome] = {
+            "p50_ms": p50, "p99_ms": p99, "req_por_segundo": len(latencias) / duracao,
+            "tamanhos_lote": metricas["tamanhos_lote"],
+        }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=sorted(DATASETS), default="precos")
+    parser.add_argument("--requisicoes", type=int, default=5000)
+    parser.add_argument("--concorrencia", type=int, default=64)
+    parser.add_argument("--max-lote", type=int, default=64)
+    parser.add_argument("--max-espera-ms", type=float, default=5.0)
+    parser.add_argument("--porta", type=int, default=8611)
+    args = parser.parse_args()
+
+    resultados = executar(args.endpoint, args.requisicoes, args.concorrencia, args.max_lote, args.max_espera_ms, args.porta)
+    print(f"{'cenário':<16} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>9}")
+    for nome, r in resultados.items():
+        print(f"{nome:<16} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['req_por_segundo']:>9.0f}")
+    lotes = resultados["micro-lotes"]["tamanhos_lote"]
+    print("histograma de lotes (micro-lotes):", lotes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Carga de sessões simultâneas nas páginas do Streamlit (AppTest)
+
+Simula vários analistas usando o app ao mesmo tempo em um único processo,
+como no servidor. Cada sessão é um `AppTest` com o seu próprio id de
+sessão, roda em uma thread própria e compartilha com as demais os caches
+do processo (`st.cache_resource`/`st.cache_data`, registro de artefatos,
+armazém do Modelo 3) e os caches em disco. Em cada página, a sessão abre
+a página, envia um CSV pelo `file_uploader` e interage com os filtros:
+
+- app.py: abertura;
+- Modelo 1: upload e troca do cluster;
+- Modelo 2: upload e troca do limiar de conversão;
+- Modelo 3: upload, categoria, marca e "Analisar Preços".
+
+Para cada nível de concorrência (`--sessoes`), reporta os percentis de
+latência por interação, o throughput (interações por segundo) e o RSS do
+processo (pico e final, amostrado durante o nível). Por padrão todas as
+sessões enviam o mesmo arquivo (a partir da segunda, o resultado vem dos
+caches); com `--arquivos-distintos`, cada sessão envia um CSV próprio e
+todas pontuam, o pior caso.
+
+O `AppTest` não simula uploads e, a cada execução, cria e remove o runtime
+global do Streamlit (o que derrubaria as outras sessões em andamento).
+`SessaoSimulada` instala um único runtime para o processo e registra os
+arquivos enviados em um gerenciador de uploads compartilhado, como no
+servidor.
+
+Uso:
+    python benchmarks/carga_sessoes.py --sessoes 1 4 16 32 --linhas 20000
+    python benchmarks/carga_sessoes.py --sessoes 8 --arquivos-distintos --saida carga.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from unittest.mock import MagicMock
+from urllib import parse
+
+# Caches das páginas em diretórios temporários (antes dos imports que leem as variáveis)
+_TEMPORARIO = tempfile.mkdtemp(prefix="carga-sessoes-")
+for _variavel in ("DATASET_CACHE_DIR", "RESULT_CACHE_DIR", "EXPORT_CACHE_DIR"):
+    os.environ.setdefault(_variavel, os.path.join(_TEMPORARIO, _variavel.lower()))
+os.environ.setdefault("STAGE_LOG", "0")
+
+import numpy as np
+import pandas as pd
+from streamlit.proto.Common_pb2 import FileUploaderState
+from streamlit.proto.WidgetStates_pb2 import WidgetStates
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.memory_uploaded_file_manager import MemoryUploadedFileManager
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner import RerunData, ScriptRunnerEvent
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.uploaded_file_manager import UploadedFileRec
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.element_tree import parse_tree_from_messages
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from suite_desempenho import dataset_sintetico
+
+SESSOES_PADRAO = [1, 4, 16]
+LINHAS_PADRAO = 20_000
+TIMEOUT_PADRAO_S = 600
+INTERVALO_RSS_S = 0.05
+PERCENTIS = [50, 90, 99]
+
+# Uploads de todas as sessões (por id de sessão) e scripts compilados, compartilhados como no servidor.
+# O `AppTest` compila a página a cada execução; compilações simultâneas em threads falham no Python 3.11
+# ("AST constructor recursion depth mismatch"), e o cache compila cada página uma única vez, com trava
+_UPLOADS = MemoryUploadedFileManager("/carga/upload")
+_SCRIPTS = ScriptCache()
+
+
+class InteracaoFalhouError(RuntimeError):
+    """A interação terminou com exceção na página (o restante da visita é pulado)"""
+
+
+def rss_bytes():
+    """RSS atual do processo (fora do Linux, o pico do processo)"""
+    try:
+        with open("/proc/self/statm") as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == "darwin" else pico * 1024
+
+
+def instalar_runtime():
+    """Runtime único do processo (o mesmo que o `AppTest` monta, mas mantido entre as execuções)"""
+    if Runtime._instance is None:
+        runtime = MagicMock(spec=Runtime)
+        runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/carga/media"))
+        runtime.cache_storage_manager = MemoryCacheStorageManager()
+        Runtime._instance = runtime
+
+
+class _ExecutorSessao(LocalScriptRunner):
+    """`LocalScriptRunner` com id de sessão próprio, uploads e scripts compartilhados e espera sem polling"""
+
+    def __init__(self, script_path, session_state, pages_manager, sessao):
+        super().__init__(script_path, session_state, pages_manager)
+        self._session_id = sessao
+        self._uploaded_file_mgr = _UPLOADS
+        self._script_cache = _SCRIPTS
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        # O original consulta o fim do script a cada 1 ms: com dezenas de sessões, o polling
+        # disputaria o GIL com as próprias páginas
+        terminou = threading.Event()
+
+        def ao_evento(sender, event, **_):
+            if event == ScriptRunnerEvent.SHUTDOWN:
+                terminou.set()
+
+        self.on_event.connect(ao_evento, weak=False)
+        self.request_rerun(RerunData(
+            widget_states=widget_state,
+            query_string=parse.urlencode(query_params or {}, doseq=True),
+            page_script_hash=page_hash,
+        ))
+        if not self._script_thread:
+            self.start()
+        if not terminou.wait(timeout):
+            self.request_stop()
+            self.join()
+            raise TimeoutError(f"Sessão {self._session_id}: execução passou de {timeout} s")
+        return parse_tree_from_messages(self.forward_msgs())
+
+
+class SessaoSimulada(AppTest):
+    """
+    Uma sessão de navegador em uma página: `AppTest` com id de sessão e upload de arquivos.
+
+    Args:
+        pagina (str): Script relativo à raiz do projeto ('app.py', 'pages/modelo_1.py', ...)
+        sessao (str): Id da sessão (o mesmo em todas as páginas visitadas pela sessão)
+        timeout (float): Tempo máximo de cada execução da página, em segundos
+    """
+
+    def __init__(self, pagina, sessao, timeout=TIMEOUT_PADRAO_S):
+        super().__init__(os.path.join(RAIZ, pagina), default_timeout=timeout)
+        self.sessao = sessao
+        # Id do widget -> arquivos enviados; reenviados a cada execução, como faz o navegador
+        self._arquivos = {}
+
+    def _run(self, widget_state=None, timeout=None):
+        estados = WidgetStates()
+        if widget_state is not None:
+            estados.CopyFrom(widget_state)
+        for id_widget, arquivos in self._arquivos.items():
+            estado = estados.widgets.add()
+            estado.id = id_widget
+            estado.file_uploader_state_value.CopyFrom(arquivos)
+
+        paginas = PagesManager(self._script_path, _SCRIPTS, setup_watcher=False)
+        executor = _ExecutorSessao(self._script_path, self.session_state, paginas, self.sessao)
+        self._tree = executor.run(estados, self.query_params, timeout or self.default_timeout, self._page_hash)
+        self._tree._runner = self
+        return self
+
+    def enviar_arquivo(self, caminho, indice=0):
+        """
+        Envia um CSV pelo `indice`-ésimo `file_uploader` da página e executa a página de novo.
+
+        Raises:
+            LookupError: Se a página não tiver o `file_uploader`
+        """
+        campos = self.get("file_uploader")
+        if len(campos) <= indice:
+            raise LookupError(f"{self._script_path}: file_uploader {indice} não encontrado "
+                              f"({len(self._tree)} elementos na última execução)")
+        with open(caminho, "rb") as arquivo:
+            dados = arquivo.read()
+        registro = UploadedFileRec(uuid.uuid4().hex, os.path.basename(caminho), "text/csv", dados)
+        _UPLOADS.add_file(self.sessao, registro)
+
+        arquivos = FileUploaderState()
+        info = arquivos.uploaded_file_info.add()
+        info.file_id = registro.file_id
+        info.name = registro.name
+        info.size = len(dados)
+        self._arquivos[campos[indice].proto.id] = arquivos
+        return self.run()
+
+
+def _selectbox(teste, rotulo):
+    return next(caixa for caixa in teste.selectbox if caixa.label == rotulo)
+
+
+def _outra_opcao(rng, caixa):
+    """Opção diferente da atual (a troca de filtro que o analista faria)"""
+    opcoes = [opcao for opcao in caixa.options if opcao != caixa.value] or list(caixa.options)
+    return opcoes[rng.integers(len(opcoes))]
+
+
+def _visitar_app(teste, arquivo, rng, medir):
+    medir("abrir", teste.run)
+
+
+def _visitar_modelo_1(teste, arquivo, rng, medir):
+    medir("abrir", teste.run)
+    medir("upload", lambda: teste.enviar_arquivo(arquivo))
+    caixa = _selectbox(teste, "Selecione o Cluster:")
+    medir("cluster", lambda: caixa.set_value(_outra_opcao(rng, caixa)).run())
+
+
+def _visitar_modelo_2(teste, arquivo, rng, medir):
+    medir("abrir", teste.run)
+    medir("upload", lambda: teste.enviar_arquivo(arquivo))
+    limiar = next(controle for controle in teste.slider if controle.label == "Limiar de Conversão")
+    medir("limiar", lambda: limiar.set_value(round(float(rng.uniform(0.05, 0.95)), 2)).run())
+
+
+def _visitar_modelo_3(teste, arquivo, rng, medir):
+    medir("abrir", teste.run)
+    medir("upload", lambda: teste.enviar_arquivo(arquivo))
+    categoria = _selectbox(teste, "Selecione a Categoria:")
+    medir("categoria", lambda: categoria.set_value(_outra_opcao(rng, categoria)).run())
+    marca = _selectbox(teste, "Selecione a Marca:")
+    medir("marca", lambda: marca.set_value(_outra_opcao(rng, marca)).run())
+    analisar = next(botao for botao in teste.button if "Analisar Preços" in botao.label)
+    medir("analisar", lambda: analisar.click().run())
+
+
+# Página -> (modelo do CSV enviado, roteiro da visita)
+PAGINAS = {
+    "app.py": (None, _visitar_app),
+    "pages/modelo_1.py": ("modelo_1", _visitar_modelo_1),
+    "pages/modelo_2.py": ("modelo_2", _visitar_modelo_2),
+    "pages/modelo_3.py": ("modelo_3", _visitar_modelo_3),
+}
+
+
+def _arquivos(paginas, sessoes, linhas, semente, distintos):
+    """CSV enviado por sessão e página (gerados antes da medição)"""
+    return [
+        {
+            pagina: dataset_sintetico(modelo, linhas, semente + (indice if distintos else 0))
+            for pagina, (modelo, _) in PAGINAS.items() if pagina in paginas and modelo is not None
+        }
+        for indice in range(sessoes)
+    ]
+
+
+def _executar_sessao(indice, paginas, arquivos, semente, timeout, registrar):
+    """Uma sessão percorrendo as páginas em ordem; cada interação é registrada com a sua latência"""
+    sessao = f"carga-{indice}-{uuid.uuid4().hex[:8]}"
+    rng = np.random.default_rng(semente + indice)
+    try:
+        for pagina in paginas:
+            teste = SessaoSimulada(pagina, sessao, timeout)
+
+            def medir(interacao, acao):
+                inicio = time.perf_counter()
+                erro = None
+                try:
+                    acao()
+                    if teste.exception:
+                        erro = teste.exception[0].value
+                except Exception as e:
+                    erro = f"{type(e).__name__}: {e}"
+                registrar(pagina, interacao, time.perf_counter() - inicio, erro)
+                if erro is not None:
+                    raise InteracaoFalhouError(erro)
+
+            try:
+                PAGINAS[pagina][1](teste, arquivos.get(pagina), rng, medir)
+            except InteracaoFalhouError:
+                continue
+    finally:
+        _UPLOADS.remove_session_files(sessao)
+
+
+def executar_nivel(sessoes, paginas, arquivos, semente=0, timeout=TIMEOUT_PADRAO_S):
+    """
+    Roda `sessoes` sessões simultâneas (uma thread cada, liberadas juntas).
+
+    Returns:
+        tuple[pd.DataFrame, dict]: Uma linha por interação (página, interação, segundos, erro)
+        e o resumo do nível (duração, interações por segundo, RSS inicial/pico/final)
+    """
+    registros = []
+    trava = threading.Lock()
+
+    def registrar(pagina, interacao, segundos, erro):
+        with trava:
+            registros.append({"pagina": pagina, "interacao": interacao, "segundos": segundos, "erro": erro})
+
+    largada = threading.Barrier(sessoes + 1)
+
+    def sessao(indice):
+        largada.wait()
+        _executar_sessao(indice, paginas, arquivos[indice], semente, timeout, registrar)
+
+    amostras = []
+    parar = threading.Event()
+
+    def amostrar_rss():
+        while not parar.wait(INTERVALO_RSS_S):
+            amostras.append(rss_bytes())
+
+    threads = [threading.Thread(target=sessao, args=(indice,), daemon=True) for indice in range(sessoes)]
+    for thread in threads:
+        thread.start()
+    rss_inicial = rss_bytes()
+    monitor = threading.Thread(target=amostrar_rss, daemon=True)
+    monitor.start()
+    largada.wait()
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    monitor.join()
+
+    interacoes = pd.DataFrame(registros, columns=["pagina", "interacao", "segundos", "erro"])
+    rss_final = rss_bytes()
+    resumo = {
+        "sessoes": sessoes,
+        "interacoes": len(interacoes),
+        "erros": int(interacoes["erro"].notna().sum()),
+        "duracao_s": duracao,
+        "interacoes_por_s": len(interacoes) / duracao,
+        "rss_inicial_mib": rss_inicial / 2 ** 20,
+        "rss_pico_mib": max(amostras + [rss_final]) / 2 ** 20,
+        "rss_final_mib": rss_final / 2 ** 20,
+    }
+    return interacoes, resumo
+
+
+def percentis(interacoes):
+    """
+    Returns:
+        pd.DataFrame: Quantidade, erros e p50/p90/p99 (ms) por sessões × página × interação
+    """
+    def resumir(grupo):
+        latencias = grupo["segundos"].to_numpy() * 1000
+        linha = {"n": len(grupo), "erros": int(grupo["erro"].notna().sum())}
+        linha.update({f"p{p}_ms": valor for p, valor in zip(PERCENTIS, np.percentile(latencias, PERCENTIS))})
+        return pd.Series(linha)
+
+    chaves = ["sessoes", "pagina", "interacao"]
+    tabela = interacoes.groupby(chaves, sort=False)[["segundos", "erro"]].apply(resumir).reset_index()
+    return tabela.astype({"n": int, "erros": int})
+
+
+def medir(niveis, paginas, linhas=LINHAS_PADRAO, semente=0, distintos=False, timeout=TIMEOUT_PADRAO_S):
+    """
+    Aquece o processo com uma sessão (não medida) e roda cada nível de concorrência.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: Percentis por interação e resumo por nível
+    """
+    instalar_runtime()
+    with patch_config_options({"global.appTest": True}):
+        inicio = time.perf_counter()
+        aquecimento, _ = executar_nivel(1, paginas, _arquivos(paginas, 1, linhas, semente, False), semente, timeout)
+        print(f"aquecimento: {time.perf_counter() - inicio:.1f} s, {aquecimento['erro'].notna().sum()} erro(s)")
+
+        todas, resumos = [], []
+        for nivel, sessoes in enumerate(niveis, start=1):
+            # Com arquivos distintos, cada nível usa sementes novas (nada em cache dos níveis anteriores)
+            arquivos = _arquivos(paginas, sessoes, linhas, semente + nivel * 10_000, distintos)
+            interacoes, resumo = executar_nivel(sessoes, paginas, arquivos, semente, timeout)
+            todas.append(interacoes.assign(sessoes=sessoes))
+            resumos.append(resumo)
+            print(f"{sessoes:>4} sessões: {resumo['interacoes_por_s']:.2f} interações/s, "
+                  f"RSS pico {resumo['rss_pico_mib']:.0f} MiB, {resumo['erros']} erro(s)")
+            for (pagina, interacao), erro in interacoes.dropna(subset=["erro"]).groupby(
+                    ["pagina", "interacao"], sort=False)["erro"].first().items():
+                print(f"     {pagina} / {interacao}: {erro}")
+    return percentis(pd.concat(todas, ignore_index=True)), pd.DataFrame(resumos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", nargs="+", type=int, default=SESSOES_PADRAO,
+                        help="Níveis de concorrência (sessões simultâneas)")
+    parser.add_argument("--paginas", nargs="+", choices=list(PAGINAS), default=list(PAGINAS))
+    parser.add_argument("--linhas", type=int, default=LINHAS_PADRAO, help="Linhas dos CSVs enviados")
+    parser.add_argument("--arquivos-distintos", action="store_true",
+                        help="Cada sessão envia um CSV próprio (sem reaproveitar os caches)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_PADRAO_S,
+                        help="Tempo máximo de cada execução de página, em segundos")
+    parser.add_argument("--saida", help="Grava percentis e resumo em JSON")
+    args = parser.parse_args(argv)
+    paginas = [pagina for pagina in PAGINAS if pagina in args.paginas]
+
+    tabela, resumo = medir(sorted(args.sessoes), paginas, args.linhas, args.semente, args.arquivos_distintos,
+                           args.timeout)
+    print()
+    print(tabela.round(1).to_string(index=False))
+    print()
+    print(resumo.round(2).to_string(index=False))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"percentis": tabela.to_dict("records"), "niveis": resumo.to_dict("records")},
+                      arquivo, ensure_ascii=False, indent=2)
+    return 1 if resumo["erros"].any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
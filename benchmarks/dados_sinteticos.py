@@ -0,0 +1,155 @@
+"""
+Geradores de dados sintéticos nos esquemas dos datasets das páginas
+
+Os arquivos seguem as colunas de `cluster_test.csv`, `randomforest_test.csv`
+e `classific_test.csv`, com marcas e categorias em distribuição de Zipf
+(poucas classes concentram a maior parte das linhas, como no catálogo real)
+e valores monetários log-normais. A geração é feita em blocos, então
+arquivos de dezenas de milhões de linhas não precisam caber em memória.
+Marcas e categorias usam as classes dos encoders do projeto, de forma que
+os códigos do Modelo 2 são decodificáveis.
+
+Uso:
+    python benchmarks/dados_sinteticos.py modelo_3 1000000 /tmp/produtos_1m.csv
+"""
+import argparse
+import os
+import sys
+
+import joblib
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modelos import CAMINHOS_ENCODERS
+
+LINHAS_POR_BLOCO = 1_000_000
+# Expoente da distribuição de Zipf de marcas e categorias
+EXPOENTE_ZIPF = 1.2
+_DATA_REFERENCIA = np.datetime64("2020-04-01T00:00:00", "s")
+
+
+def probabilidades_zipf(quantidade, expoente=EXPOENTE_ZIPF):
+    """Probabilidade de cada uma de `quantidade` classes (a k-ésima mais frequente ∝ 1/k^expoente)"""
+    pesos = 1.0 / np.arange(1, quantidade + 1, dtype="float64") ** expoente
+    return pesos / pesos.sum()
+
+
+def _amostrar_zipf(rng, quantidade, linhas, ordem):
+    """Índices de classes em Zipf, com a classe mais frequente definida pela permutação `ordem`"""
+    return ordem[rng.choice(quantidade, size=linhas, p=probabilidades_zipf(quantidade))]
+
+
+def _classes(encoder):
+    return joblib.load(CAMINHOS_ENCODERS[encoder]).classes_
+
+
+def blocos_clientes(linhas, semente=0, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Blocos no esquema de `cluster_test.csv` (user_id, total_spent, frequency, last_purchase, recency_days)"""
+    rng = np.random.default_rng(semente)
+    for inicio in range(0, linhas, linhas_por_bloco):
+        n = min(linhas_por_bloco, linhas - inicio)
+        frequency = rng.zipf(2.5, n).clip(max=200)
+        recency_days = rng.integers(0, 153, n)
+        ultima_compra = _DATA_REFERENCIA - recency_days.astype("timedelta64[D]") + rng.integers(0, 86_400, n).astype("timedelta64[s]")
+        # Mesmo formato do dataset original: "2020-04-01 03:37:05+00:00"
+        ultima_compra = np.char.add(np.char.replace(ultima_compra.astype(str), "T", " "), "+00:00")
+        yield pa.table({
+            "user_id": np.arange(inicio, inicio + n, dtype="int64") + 400_000_000,
+            "total_spent": np.round(rng.lognormal(5.3, 1.0, n) * frequency, 2),
+            "frequency": frequency.astype("int32"),
+            "last_purchase": pa.array(ultima_compra),
+            "recency_days": recency_days.astype("int32"),
+        })
+
+
+def blocos_sessoes(linhas, semente=0, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Blocos no esquema de `randomforest_test.csv` (features codificadas do Modelo 2)"""
+    rng = np.random.default_rng(semente)
+    n_marcas, n_categorias = len(_classes("le_brand")), len(_classes("le_main_category"))
+    n_dias = len(_classes("le_weekday"))
+    ordem_marcas, ordem_categorias = rng.permutation(n_marcas), rng.permutation(n_categorias)
+    for inicio in range(0, linhas, linhas_por_bloco):
+        n = min(linhas_por_bloco, linhas - inicio)
+        yield pa.table({
+            "price": np.round(rng.lognormal(5.2, 0.9, n), 2),
+            "brand_encoded": _amostrar_zipf(rng, n_marcas, n, ordem_marcas).astype("int32"),
+            "main_category_encoded": _amostrar_zipf(rng, n_categorias, n, ordem_categorias).astype("int32"),
+            "sub_category_encoded": rng.integers(0, 127, n, dtype="int32"),
+            "hour": rng.integers(0, 6, n, dtype="int32"),
+            "weekday_encoded": rng.integers(0, n_dias, n, dtype="int32"),
+            "add_to_cart_count": rng.binomial(1, 0.03, n).astype("int32"),
+            "views_count": (1 + rng.poisson(0.4, n)).astype("int32"),
+        })
+
+
+def blocos_produtos(linhas, semente=0, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Blocos no esquema de `classific_test.csv` (price, price_ratio_cat, brand, main_category).
+
+    `price_ratio_cat` é o preço dividido pelo preço médio (teórico) da categoria.
+    """
+    rng = np.random.default_rng(semente)
+    marcas, categorias = _classes("le_brand"), _classes("le_main_category")
+    ordem_marcas, ordem_categorias = rng.permutation(len(marcas)), rng.permutation(len(categorias))
+    mu_categoria = rng.uniform(4.0, 6.5, len(categorias))
+    sigma = 0.8
+    media_categoria = np.exp(mu_categoria + sigma ** 2 / 2)
+    for inicio in range(0, linhas, linhas_por_bloco):
+        n = min(linhas_por_bloco, linhas - inicio)
+        categoria = _amostrar_zipf(rng, len(categorias), n, ordem_categorias)
+        price = np.round(rng.lognormal(mu_categoria[categoria], sigma), 2)
+        yield pa.table({
+            "price": price,
+            "price_ratio_cat": price / media_categoria[categoria],
+            "brand": pa.DictionaryArray.from_arrays(
+                _amostrar_zipf(rng, len(marcas), n, ordem_marcas).astype("int32"), marcas.astype(str)
+            ).cast(pa.string()),
+            "main_category": pa.array(categorias.astype(str)[categoria]),
+        })
+
+
+GERADORES = {
+    "modelo_1": blocos_clientes,
+    "modelo_2": blocos_sessoes,
+    "modelo_3": blocos_produtos,
+}
+
+
+def gerar_csv(pagina, linhas, destino, semente=0):
+    """
+    Grava um CSV sintético da página (escrita em blocos; atômica via arquivo temporário).
+
+    Returns:
+        str: `destino`
+    """
+    temporario = f"{destino}.tmp"
+    # Sem aspas, como os CSVs originais (nenhuma classe dos encoders contém vírgula ou aspas)
+    opcoes = pa_csv.WriteOptions(include_header=False, quoting_style="none")
+    with open(temporario, "wb") as arquivo:
+        escritor = None
+        for tabela in GERADORES[pagina](linhas, semente):
+            if escritor is None:
+                arquivo.write((",".join(tabela.column_names) + "\n").encode())
+                escritor = pa_csv.CSVWriter(arquivo, tabela.schema, write_options=opcoes)
+            escritor.write_table(tabela)
+        if escritor is not None:
+            escritor.close()
+    os.replace(temporario, destino)
+    return destino
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pagina", choices=sorted(GERADORES))
+    parser.add_argument("linhas", type=int)
+    parser.add_argument("destino")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args(argv)
+    gerar_csv(args.pagina, args.linhas, args.destino, args.semente)
+    print(f"{args.linhas:,} linhas gravadas em {args.destino} ({os.path.getsize(args.destino) / 1024 ** 2:,.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
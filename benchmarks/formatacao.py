@@ -0,0 +1,90 @@
+"""
+Formatação brasileira escalar (uma chamada por valor) x colunar
+
+Para cada formato de `utils` e tamanho de coluna, formata os mesmos valores
+com a função escalar aplicada valor a valor (`Series.map`, como nas tabelas
+formatadas linha a linha) e com a versão colunar, confere que os textos são
+idênticos e mede os tempos. As colunas sintéticas misturam preços (log-normal,
+com valores negativos, nulos e empates no arredondamento), percentuais e
+contagens inteiras.
+
+Uso:
+    python benchmarks/formatacao.py --linhas 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import (
+    formatar_milhares, formatar_milhares_coluna, formatar_moeda, formatar_moeda_coluna, formatar_numero,
+    formatar_numero_coluna, formatar_percentual, formatar_percentual_coluna
+)
+
+LINHAS_PADRAO = [10_000, 100_000, 1_000_000]
+FORMATOS = {
+    "moeda": (formatar_moeda, formatar_moeda_coluna),
+    "numero": (formatar_numero, formatar_numero_coluna),
+    "numero_2_casas": (lambda valor: formatar_numero(valor, 2), lambda valores: formatar_numero_coluna(valores, 2)),
+    "percentual": (formatar_percentual, formatar_percentual_coluna),
+    "milhares": (formatar_milhares, formatar_milhares_coluna),
+}
+
+
+def colunas_sinteticas(linhas, semente=0):
+    rng = np.random.default_rng(semente)
+    precos = rng.lognormal(4, 1.5, linhas) * rng.choice([-1, 1], linhas, p=[0.05, 0.95])
+    precos[rng.random(linhas) < 0.01] = np.nan
+    # Empates exatos no arredondamento de 2 casas (x,xx5 representáveis), resolvidos pela função escalar
+    empates = rng.random(linhas) < 0.01
+    precos[empates] = rng.integers(0, 10_000, empates.sum()) + 0.125
+    return {
+        "precos": pd.Series(precos),
+        "percentuais": pd.Series(rng.uniform(0, 100, linhas)),
+        "contagens": pd.Series(rng.integers(0, 10_000_000, linhas)),
+    }
+
+
+def medir(tamanhos, semente=0):
+    """
+    Returns:
+        pd.DataFrame: formato, coluna, linhas, segundos escalar/colunar e aceleração
+
+    Raises:
+        AssertionError: Se algum texto colunar diferir do escalar
+    """
+    linhas_tabela = []
+    for linhas in tamanhos:
+        for nome_coluna, valores in colunas_sinteticas(linhas, semente).items():
+            for formato, (escalar, colunar) in FORMATOS.items():
+                inicio = time.perf_counter()
+                esperado = valores.map(escalar)
+                segundos_escalar = time.perf_counter() - inicio
+                inicio = time.perf_counter()
+                obtido = colunar(valores)
+                segundos_colunar = time.perf_counter() - inicio
+                diferentes = (esperado != obtido).sum()
+                assert diferentes == 0, f"{formato}/{nome_coluna}: {diferentes} textos diferentes"
+                linhas_tabela.append({
+                    "formato": formato, "coluna": nome_coluna, "linhas": linhas,
+                    "escalar_s": segundos_escalar, "colunar_s": segundos_colunar,
+                    "aceleracao": segundos_escalar / segundos_colunar,
+                })
+    return pd.DataFrame(linhas_tabela)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", nargs="+", type=int, default=LINHAS_PADRAO)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args(argv)
+    tabela = medir(sorted(args.linhas), args.semente)
+    print(tabela.round(4).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
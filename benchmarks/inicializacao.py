@@ -0,0 +1,116 @@
+"""
+Tempo até a primeira renderização de cada página em um processo novo
+
+Simula o primeiro visitante após um restart: cada medição roda em um
+processo Python novo (imports e modelos frios), com os caches em disco
+vazios (diretórios temporários, a menos que `--manter-cache`). No processo,
+o Streamlit já está importado (como no servidor) e a página é executada
+uma vez pelo `AppTest`; o tempo dessa execução completa é o tempo até a
+primeira renderização. Uma segunda execução (rerun) dá a referência com
+tudo quente.
+
+Dois modos por página:
+
+- `sem_aquecimento`: `MODEL_PREWARM=0`, a página carrega os modelos e
+  importa o que precisa;
+- `com_aquecimento`: `aquecimento.iniciar_aquecimento` roda e termina antes
+  da primeira sessão (como em `iniciar_servidor.py`); o tempo do
+  aquecimento é reportado à parte.
+
+Uso:
+    python benchmarks/inicializacao.py --repeticoes 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGINAS = ["app.py", "pages/modelo_1.py", "pages/modelo_2.py", "pages/modelo_3.py"]
+MODOS = ["sem_aquecimento", "com_aquecimento"]
+
+
+def medir_processo(pagina, modo):
+    """Executado no processo filho: devolve os tempos de uma medição"""
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, RAIZ_PROJETO)
+    aquecimento_s = None
+    if modo == "com_aquecimento":
+        from aquecimento import aguardar_aquecimento, iniciar_aquecimento
+
+        inicio = time.perf_counter()
+        iniciar_aquecimento()
+        aguardar_aquecimento()
+        aquecimento_s = time.perf_counter() - inicio
+
+    teste = AppTest.from_file(os.path.join(RAIZ_PROJETO, pagina), default_timeout=600)
+    inicio = time.perf_counter()
+    teste.run()
+    primeira = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    teste.run()
+    rerun = time.perf_counter() - inicio
+    return {
+        "pagina": pagina,
+        "modo": modo,
+        "primeira_renderizacao_s": primeira,
+        "rerun_s": rerun,
+        "aquecimento_s": aquecimento_s,
+        "erros": [str(erro.value) for erro in teste.exception] + [str(erro.value) for erro in teste.error],
+    }
+
+
+def medir(pagina, modo, manter_cache=False):
+    """Roda uma medição em um processo novo (caches em disco vazios, salvo `manter_cache`)"""
+    ambiente = dict(os.environ, STAGE_LOG="0", MODEL_PREWARM="0" if modo == "sem_aquecimento" else "1")
+    with tempfile.TemporaryDirectory(prefix="inicializacao-") as temporario:
+        if not manter_cache:
+            for variavel in ("DATASET_CACHE_DIR", "RESULT_CACHE_DIR", "EXPORT_CACHE_DIR"):
+                ambiente[variavel] = os.path.join(temporario, variavel.lower())
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--filho", pagina, modo],
+            cwd=RAIZ_PROJETO, env=ambiente, capture_output=True, text=True, check=True,
+        )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", nargs="+", choices=PAGINAS, default=PAGINAS)
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=MODOS)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--manter-cache", action="store_true",
+                        help="Usa os caches em disco do projeto (restart com volume persistente)")
+    parser.add_argument("--saida", help="Grava as medições em JSON")
+    parser.add_argument("--filho", nargs=2, metavar=("PAGINA", "MODO"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.filho:
+        print(json.dumps(medir_processo(*args.filho)))
+        return
+
+    medicoes = []
+    print(f"{'página':<20} {'modo':<16} {'1ª renderização (s)':>20} {'rerun (s)':>10} {'aquecimento (s)':>16}")
+    for pagina in args.paginas:
+        for modo in args.modos:
+            rodadas = [medir(pagina, modo, args.manter_cache) for _ in range(args.repeticoes)]
+            medicoes.extend(rodadas)
+            erros = {erro for rodada in rodadas for erro in rodada["erros"]}
+            aquecimentos = [r["aquecimento_s"] for r in rodadas if r["aquecimento_s"] is not None]
+            print(f"{pagina:<20} {modo:<16} "
+                  f"{statistics.median(r['primeira_renderizacao_s'] for r in rodadas):>20.3f} "
+                  f"{statistics.median(r['rerun_s'] for r in rodadas):>10.3f} "
+                  f"{statistics.median(aquecimentos) if aquecimentos else float('nan'):>16.3f}"
+                  + (f"  erros: {sorted(erros)}" if erros else ""))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(medicoes, arquivo, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compara o RandomForest do sklearn com a floresta compilada (floresta_compilada.py):
+tamanho do arquivo, tempo de carga, linhas/s por tamanho de lote e a maior
+diferença absoluta entre as probabilidades.
+
+Uso:
+    python benchmarks/medir_floresta.py [--repeticoes 5] [--linhas 300000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from floresta_compilada import carregar_floresta, compilar_floresta, salvar_floresta
+from modelos import CAMINHO_RANDOMFOREST, FEATURES_CONVERSAO
+
+TAMANHOS_LOTE = [1, 64, 4096, None]
+
+
+def medir(funcao, repeticoes):
+    """Executa `funcao` `repeticoes` vezes e devolve o melhor tempo (s) e o último resultado"""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--linhas", type=int, default=300_000, help="Linhas pontuadas no teste de throughput")
+    args = parser.parse_args()
+
+    dados = pd.read_csv(os.path.join(RAIZ, "datasets/randomforest_test.csv"), usecols=FEATURES_CONVERSAO)
+    dados = dados.sample(args.linhas, replace=True, random_state=0)[FEATURES_CONVERSAO].reset_index(drop=True)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        compilado = os.path.join(diretorio, "modelo_randomforest.arrow")
+        salvar_floresta(compilar_floresta(joblib.load(CAMINHO_RANDOMFOREST)), compilado)
+        modelos = {
+            "sklearn (.pkl)": (CAMINHO_RANDOMFOREST, lambda: joblib.load(CAMINHO_RANDOMFOREST)),
+            "compilado (.arrow)": (compilado, lambda: carregar_floresta(compilado)),
+        }
+        probabilidades = {}
+        print(f"{'modelo':<20} {'arquivo (KiB)':>13} {'carga (ms)':>11} " + " ".join(
+            f"{f'lote {tamanho or args.linhas}':>14}" for tamanho in TAMANHOS_LOTE) + "   (linhas/s)")
+        for nome, (caminho, carregar) in modelos.items():
+            tempo_carga, modelo = medir(carregar, args.repeticoes)
+            vazoes = []
+            for tamanho in TAMANHOS_LOTE:
+                lote = dados if tamanho is None else dados.iloc[:tamanho]
+                repeticoes = args.repeticoes if tamanho is None else max(args.repeticoes, 2000 // max(tamanho, 1))
+                tempo, resultado = medir(lambda: modelo.predict_proba(lote), repeticoes)
+                vazoes.append(len(lote) / tempo)
+            probabilidades[nome] = resultado[:, 1]
+            print(f"{nome:<20} {os.path.getsize(caminho) / 1024:>13,.0f} {tempo_carga * 1000:>11.1f} "
+                  + " ".join(f"{vazao:>14,.0f}" for vazao in vazoes))
+        referencia, compilada = probabilidades.values()
+        print(f"maior diferença absoluta nas probabilidades: {np.abs(referencia - compilada).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
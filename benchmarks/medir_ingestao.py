@@ -0,0 +1,92 @@
+"""
+Mede tempo de parsing e memória (memory_usage(deep=True)) dos datasets padrão,
+comparando o `pd.read_csv` padrão com a leitura tipada pelo leitor CSV do Arrow.
+
+Ao final, confere a leitura de uma coluna fora do esquema vazia nas primeiras
+linhas e com texto mais adiante (em blocos e pela conversão para o cache
+colunar), que não pode falhar nem mudar de tipo entre blocos.
+
+Uso:
+    python benchmarks/medir_ingestao.py [--repeticoes 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache_datasets import obter_dataset_colunar
+from ingestao import ativar_copy_on_write, ler_csv_em_blocos, ler_csv_tipado
+from modelos import ESQUEMAS
+
+DATASETS = {
+    "modelo_1": "datasets/cluster_test.csv",
+    "modelo_2": "datasets/randomforest_test.csv",
+    "modelo_3": "datasets/classific_test.csv",
+}
+
+
+def medir(funcao, repeticoes):
+    """Executa `funcao` `repeticoes` vezes e devolve o melhor tempo (s) e o último resultado"""
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def verificar_coluna_extra(caminho, esquema, tamanho_bloco=64 * 1024):
+    """
+    Lê o dataset com uma coluna extra vazia na primeira metade e preenchida na
+    segunda, em blocos pequenos (vários por arquivo) e pelo cache colunar.
+
+    Returns:
+        list[str]: Tipos pandas da coluna extra em cada bloco lido
+    """
+    df = pd.read_csv(caminho, dtype=str, keep_default_na=False)
+    df["obs"] = ""
+    df.loc[len(df) // 2:, "obs"] = "vip"
+    with tempfile.TemporaryDirectory() as diretorio:
+        csv = os.path.join(diretorio, "extra.csv")
+        df.to_csv(csv, index=False)
+        colunar = obter_dataset_colunar(csv, esquema, "extra", diretorio=diretorio, tamanho_bloco=tamanho_bloco)
+        tipos = []
+        for fonte in (csv, colunar):
+            blocos = list(ler_csv_em_blocos(fonte, esquema, tamanho_bloco, todas_colunas=True))
+            assert sum(len(bloco) for bloco in blocos) == len(df)
+            assert (pd.concat(blocos)["obs"] == df["obs"]).all()
+            tipos += [str(bloco["obs"].dtype) for bloco in blocos]
+    return tipos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+    ativar_copy_on_write()
+
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'modelo':<10} {'leitor':<14} {'tempo (ms)':>11} {'memória (KiB)':>14}")
+    for modelo, caminho in DATASETS.items():
+        caminho = os.path.join(raiz, caminho)
+        leitores = {
+            "pandas padrão": lambda: pd.read_csv(caminho),
+            "arrow tipado": lambda: ler_csv_tipado(caminho, ESQUEMAS[modelo]),
+        }
+        for nome, leitor in leitores.items():
+            tempo, df = medir(leitor, args.repeticoes)
+            memoria = df.memory_usage(deep=True).sum() / 1024
+            print(f"{modelo:<10} {nome:<14} {tempo * 1000:>11.1f} {memoria:>14.1f}")
+
+    print()
+    for modelo, caminho in DATASETS.items():
+        tipos = verificar_coluna_extra(os.path.join(raiz, caminho), ESQUEMAS[modelo])
+        print(f"{modelo:<10} coluna extra: {len(tipos)} blocos, tipos {sorted(set(tipos))}")
+
+
+if __name__ == "__main__":
+    main()
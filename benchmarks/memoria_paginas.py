@@ -0,0 +1,168 @@
+"""
+Pico de memória dos pipelines das páginas em relação ao tamanho da entrada
+
+Verificação de regressão: executa o mesmo caminho das páginas (cópia
+colunar em cache + `processar_*` e `exportar_*` de `pipelines`) sobre CSVs
+sintéticos e compara o pico de memória rastreada pelo `tracemalloc`
+(vetores do NumPy/pandas e objetos Python, mais os buffers do Arrow retidos)
+de cada etapa com o tamanho dos dados tipados da entrada (bytes da cópia
+colunar). Com o processamento bloco a bloco, sem cópias do quadro completo,
+o pico depende do tamanho do bloco (`COLUMNAR_BATCH_ROWS`) e do resultado
+acumulado, não do arquivo; a verificação falha (código de saída 1) se
+alguma etapa passar do fator máximo da página (`FATORES_MAXIMOS`, ou
+`--fator-maximo` para todas) nas entradas com pelo menos `--linhas-minimas`
+linhas (abaixo disso, o custo fixo dos modelos e dos agregados domina).
+No Modelo 3, o fator inclui o cubo acumulado (histograma por categoria,
+marca e status), que cresce com a variedade de marcas e não com as linhas.
+
+`--sem-copy-on-write` mantém o copy-on-write do pandas desligado, para comparar o
+pico com as cópias defensivas de `assign`/`astype`/`concat` em cada bloco.
+
+Uso:
+    python benchmarks/memoria_paginas.py --linhas 100000 1000000
+    python benchmarks/memoria_paginas.py --linhas 1000000 --sem-copy-on-write
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+# Caches das páginas em diretórios temporários (antes dos imports que leem as variáveis)
+_TEMPORARIO = tempfile.mkdtemp(prefix="memoria-paginas-")
+for _variavel in ("DATASET_CACHE_DIR", "RESULT_CACHE_DIR", "EXPORT_CACHE_DIR"):
+    os.environ.setdefault(_variavel, os.path.join(_TEMPORARIO, _variavel.lower()))
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from cache_datasets import obter_dataset_colunar
+from ingestao import ativar_copy_on_write, hash_conteudo
+from modelos import ESQUEMA_MODELO_1, ESQUEMA_MODELO_2, ESQUEMA_MODELO_3
+from pipelines import (
+    exportar_clusters, exportar_conversao, exportar_precos, processar_clusters, processar_conversao,
+    processar_precos
+)
+from suite_desempenho import _modelo_necessario, carregar_modelos, dataset_sintetico
+
+LINHAS_PADRAO = [100_000, 1_000_000]
+# Pico máximo por etapa, em múltiplos do tamanho dos dados tipados da entrada
+# (medidos com 1 milhão de linhas: 0,46x, 0,60x e 1,20x, respectivamente)
+FATORES_MAXIMOS = {"modelo_1": 1.0, "modelo_2": 1.5, "modelo_3": 2.0}
+LINHAS_MINIMAS = 1_000_000
+ESQUEMAS = {"modelo_1": ESQUEMA_MODELO_1, "modelo_2": ESQUEMA_MODELO_2, "modelo_3": ESQUEMA_MODELO_3}
+
+
+def _etapas_modelo_1(fonte, modelos, chave):
+    kmeans = modelos["kmeans"]
+    return {
+        "processamento": lambda: processar_clusters(fonte, kmeans),
+        "exportacao": lambda: exportar_clusters(fonte, kmeans, chave),
+    }
+
+
+def _etapas_modelo_2(fonte, modelos, chave):
+    assets = modelos["assets_conversao"]
+    return {
+        "processamento": lambda: processar_conversao(fonte, assets["model"], assets),
+        "exportacao": lambda: exportar_conversao(fonte, assets["model"], assets, chave),
+    }
+
+
+def _etapas_modelo_3(fonte, modelos, chave):
+    reglog = modelos["reglog"]
+    cubo = processar_precos(fonte, reglog)
+    categoria = cubo.grupos.groupby("main_category", observed=True)["quantidade"].sum().idxmax()
+    return {
+        "processamento": lambda: processar_precos(fonte, reglog),
+        "exportacao": lambda: exportar_precos(fonte, reglog, chave),
+        "exportacao_filtrada": lambda: exportar_precos(fonte, reglog, f"{chave}-filtrada", categoria=categoria),
+    }
+
+
+ETAPAS = {"modelo_1": _etapas_modelo_1, "modelo_2": _etapas_modelo_2, "modelo_3": _etapas_modelo_3}
+
+
+def tamanho_entrada(fonte):
+    """Bytes dos dados tipados da cópia colunar (mapeada em memória: a leitura não aloca)"""
+    with pa.memory_map(fonte) as arquivo:
+        return pa.ipc.open_file(arquivo).read_all().nbytes
+
+
+def pico_etapa(executar):
+    """Pico de memória rastreada (acima do que já estava alocado) durante `executar`"""
+    gc.collect()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    arrow_base = pa.total_allocated_bytes()
+    resultado = executar()
+    _, pico = tracemalloc.get_traced_memory()
+    arrow = max(pa.total_allocated_bytes() - arrow_base, 0)
+    del resultado
+    return pico - base + arrow
+
+
+def medir(paginas, tamanhos, semente=0):
+    """
+    Returns:
+        pd.DataFrame: pagina, linhas, etapa, bytes da entrada, pico e pico/entrada
+    """
+    modelos = carregar_modelos()
+    linhas_tabela = []
+    tracemalloc.start()
+    try:
+        for pagina in paginas:
+            if _modelo_necessario(pagina) not in modelos:
+                continue
+            for linhas in tamanhos:
+                csv = dataset_sintetico(pagina, linhas, semente)
+                chave = hash_conteudo(csv)
+                fonte = obter_dataset_colunar(csv, ESQUEMAS[pagina], chave)
+                entrada = tamanho_entrada(fonte)
+                for etapa, executar in ETAPAS[pagina](fonte, modelos, chave).items():
+                    pico = pico_etapa(executar)
+                    linhas_tabela.append({
+                        "pagina": pagina, "linhas": linhas, "etapa": etapa,
+                        "entrada_mib": entrada / 2 ** 20, "pico_mib": pico / 2 ** 20, "pico_entrada": pico / entrada,
+                    })
+                    print(f"{pagina} {linhas:>12,} {etapa:<20} pico {pico / 2 ** 20:8.1f} MiB "
+                          f"({pico / entrada:.2f}x a entrada de {entrada / 2 ** 20:.1f} MiB)")
+    finally:
+        tracemalloc.stop()
+    return pd.DataFrame(linhas_tabela)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", nargs="+", choices=sorted(ETAPAS), default=sorted(ETAPAS))
+    parser.add_argument("--linhas", nargs="+", type=int, default=LINHAS_PADRAO)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--fator-maximo", type=float,
+                        help="Pico máximo por etapa, em múltiplos do tamanho da entrada (padrão: FATORES_MAXIMOS)")
+    parser.add_argument("--linhas-minimas", type=int, default=LINHAS_MINIMAS,
+                        help="Menor entrada verificada contra --fator-maximo")
+    parser.add_argument("--sem-copy-on-write", action="store_true",
+                        help="Não liga o copy-on-write do pandas (comparação)")
+    args = parser.parse_args(argv)
+    if not args.sem_copy_on_write:
+        ativar_copy_on_write()
+
+    tabela = medir(args.paginas, sorted(args.linhas), args.semente)
+    tabela["fator_maximo"] = args.fator_maximo or tabela["pagina"].map(FATORES_MAXIMOS)
+    verificadas = tabela[tabela["linhas"] >= args.linhas_minimas]
+    acima = verificadas[verificadas["pico_entrada"] > verificadas["fator_maximo"]]
+    print()
+    print(tabela.round(3).to_string(index=False))
+    if len(acima):
+        print("\nPico acima do fator máximo:")
+        print(acima.round(3).to_string(index=False))
+        return 1
+    print(f"\nOK: {len(verificadas)} etapas dentro do fator máximo da página")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Tamanho do JSON das figuras das páginas em função do número de linhas
+
+Para cada página e tamanho de entrada (CSVs sintéticos da suíte de
+desempenho), executa o pipeline da página, monta as mesmas figuras a partir
+de `dados_graficos` e dos agregados e mede o JSON de cada uma
+(`tamanho_payload`), que é o que o Streamlit serializa a cada rerun. Com os
+gráficos sobre tabelas resumidas, o tamanho deve ficar praticamente
+constante; a coluna `crescimento` é a razão entre o maior e o menor
+tamanho de entrada.
+
+Para comparação, no Modelo 1 também são medidas as figuras linha a linha
+(dispersão com todos os clientes e boxplot com `points="all"`) até
+`--limite-linha-a-linha` clientes, que crescem linearmente.
+
+Uso:
+    python benchmarks/payload_graficos.py --linhas 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from agregados_clusters import amostra_outliers, pontos_densidade, quantis_recencia
+from cubo_precos import STATUS_FORA, contagem_por_status, filtrar_cubo
+from dados_graficos import fatias, percentuais, tamanho_payload, top_n
+from indice_conversao import contagens_no_limiar, curva_limiar
+from ingestao import ativar_copy_on_write
+from modelos import CLASSE_BAIXO_POTENCIAL, CLASSE_CONVERSAO, LIMIAR_CONVERSAO
+from pipelines import blocos_pontuados_clusters, processar_clusters, processar_conversao, processar_precos
+from suite_desempenho import _modelo_necessario, carregar_modelos, dataset_sintetico
+
+LINHAS_PADRAO = [10_000, 100_000, 1_000_000]
+LIMITE_LINHA_A_LINHA = 100_000
+DIAS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def figuras_modelo_1(caminho, modelos):
+    resultado = processar_clusters(caminho, modelos["kmeans"])
+    resumo, agregados = resultado.resumo, resultado.agregados
+    quantis = quantis_recencia(agregados)
+    outliers = amostra_outliers(agregados, quantis)
+    dispersao = px.scatter(pontos_densidade(agregados), x="frequency", y="total_spent", color="cluster", size="quantidade")
+    dispersao.add_trace(go.Scatter(x=outliers["frequency"], y=outliers["total_spent"], mode="markers",
+                                   customdata=outliers[["user_id", "cluster", "motivo"]]))
+    recencia = go.Figure([
+        go.Box(x=[linha.cluster], q1=[linha.q1], median=[linha.mediana], q3=[linha.q3],
+               lowerfence=[linha.cerca_inferior], upperfence=[linha.cerca_superior])
+        for linha in quantis.itertuples()
+    ])
+    recencia.add_trace(go.Scatter(x=outliers["cluster"], y=outliers["recency_days"], mode="markers"))
+    return {
+        "grafico_gasto_total": px.bar(resumo.sort_values("total_spent", ascending=False), x="cluster", y="total_spent"),
+        "grafico_clientes": px.pie(fatias(resumo.set_index("cluster")["customers"], "cluster", "customers"),
+                                   values="customers", names="cluster"),
+        "grafico_dispersao": dispersao,
+        "grafico_recencia": recencia,
+    }
+
+
+def figuras_linha_a_linha_modelo_1(caminho, modelos):
+    """Figuras antigas do Modelo 1, com cada cliente enviado ao navegador"""
+    clientes = pd.concat(blocos_pontuados_clusters(caminho, modelos["kmeans"]))
+    return {
+        "grafico_dispersao (linha a linha)": px.scatter(clientes, x="frequency", y="total_spent", color="cluster",
+                                                        hover_data=["user_id"]),
+        "grafico_recencia (linha a linha)": px.box(clientes, x="cluster", y="recency_days", color="cluster",
+                                                   points="all"),
+    }
+
+
+def figuras_modelo_2(caminho, modelos):
+    assets = modelos["assets_conversao"]
+    indice = processar_conversao(caminho, assets["model"], assets).indice
+    contagens = contagens_no_limiar(indice, LIMIAR_CONVERSAO)
+    dias = percentuais(contagens.dias_classificacao.unstack(fill_value=0),
+                       linhas=DIAS, colunas=[CLASSE_BAIXO_POTENCIAL, CLASSE_CONVERSAO])
+    curva = curva_limiar(indice, [round(x / 100, 2) for x in range(1, 100)])
+    return {
+        "grafico_classificacao": px.pie(fatias(contagens.contagem_classificacao, "classificacao"),
+                                        names="classificacao", values="count"),
+        "grafico_limiar": px.line(curva, x="limiar", y=["precisao_esperada", "recall_esperado", "cobertura"]),
+        "grafico_marcas": px.bar(top_n(contagens.marcas_conversao, 10, "brand"), x="count", y="brand", orientation="h"),
+        "grafico_categorias": px.bar(top_n(contagens.categorias_conversao, 10, "main_category"),
+                                     x="count", y="main_category", orientation="h"),
+        "grafico_dias": px.bar(dias.reset_index(), x="weekday", y=[CLASSE_BAIXO_POTENCIAL, CLASSE_CONVERSAO]),
+    }
+
+
+def figuras_modelo_3(caminho, modelos):
+    cubo = filtrar_cubo(processar_precos(caminho, modelos["reglog"]))
+    categorias = contagem_por_status(cubo, "main_category").sort_values(STATUS_FORA, ascending=False)
+    return {
+        "grafico_categorias": px.bar(categorias.reset_index(), x="main_category", y=list(categorias.columns)),
+        "grafico_marcas": px.bar(top_n(contagem_por_status(cubo, "brand"), 10, "brand", por=STATUS_FORA),
+                                 x="brand", y=list(categorias.columns)),
+        "grafico_status": px.pie(fatias(contagem_por_status(cubo), "status_preco"), values="count", names="status_preco"),
+    }
+
+
+FIGURAS = {
+    "modelo_1": figuras_modelo_1,
+    "modelo_2": figuras_modelo_2,
+    "modelo_3": figuras_modelo_3,
+}
+
+
+def medir(paginas, tamanhos, semente=0, limite_linha_a_linha=LIMITE_LINHA_A_LINHA):
+    """
+    Returns:
+        pd.DataFrame: pagina, figura, linhas e bytes do JSON da figura
+    """
+    modelos = carregar_modelos()
+    linhas_tabela = []
+    for pagina in paginas:
+        if _modelo_necessario(pagina) not in modelos:
+            continue
+        for linhas in tamanhos:
+            caminho = dataset_sintetico(pagina, linhas, semente)
+            figuras = FIGURAS[pagina](caminho, modelos)
+            if pagina == "modelo_1" and linhas <= limite_linha_a_linha:
+                figuras.update(figuras_linha_a_linha_modelo_1(caminho, modelos))
+            for nome, figura in figuras.items():
+                linhas_tabela.append({"pagina": pagina, "figura": nome, "linhas": linhas, "bytes": tamanho_payload(figura)})
+            print(f"{pagina} {linhas:>12,} linhas: {len(figuras)} figuras")
+    return pd.DataFrame(linhas_tabela, columns=["pagina", "figura", "linhas", "bytes"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", nargs="+", choices=sorted(FIGURAS), default=sorted(FIGURAS))
+    parser.add_argument("--linhas", nargs="+", type=int, default=LINHAS_PADRAO)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--limite-linha-a-linha", type=int, default=LIMITE_LINHA_A_LINHA,
+                        help="Maior entrada medida com as figuras linha a linha do Modelo 1")
+    args = parser.parse_args(argv)
+    ativar_copy_on_write()
+
+    tabela = medir(args.paginas, sorted(args.linhas), args.semente, args.limite_linha_a_linha)
+    kib = tabela.pivot_table(index=["pagina", "figura"], columns="linhas", values="bytes", sort=False) / 1024
+    kib["crescimento"] = kib.max(axis=1) / kib.min(axis=1)
+    print("JSON das figuras (KiB):")
+    print(kib.round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
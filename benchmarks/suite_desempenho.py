@@ -0,0 +1,266 @@
+"""
+Suíte de desempenho dos pipelines das páginas, etapa por etapa
+
+Para cada página e cada tamanho de entrada (CSVs sintéticos de
+`dados_sinteticos.py`, gerados uma vez e reaproveitados), executa as
+funções públicas de `pipelines` usadas pelas páginas (`processar_*` e
+`exportar_*`) com um coletor de `instrumentacao` aberto, e registra o tempo
+e o pico de memória de cada etapa marcada pelos próprios pipelines:
+
+- `validacao`: leitura do cabeçalho e checagem das colunas obrigatórias
+- `parsing`: leitura tipada dos blocos do CSV
+- `pontuacao`: chamada ao modelo
+- `decodificacao`: códigos -> categorias (Modelo 2)
+- `agregacao`: redução dos blocos aos agregados exibidos pela página
+- `dados_grafico`: preparação dos dados entregues aos gráficos
+- `exportacao`: arquivo de download completo, gravado bloco a bloco em um
+  diretório temporário (com as subetapas `exportacao/pontuacao` e
+  `exportacao/serializacao` marcadas pela exportação)
+
+Os tempos são somados entre os blocos; o pico de memória é o maior pico
+entre os blocos (alocações rastreadas pelo `tracemalloc`, o que inclui os
+vetores do NumPy/pandas). Como o `tracemalloc` deixa as etapas com muitas
+alocações pequenas bem mais lentas, a memória é medida em um processo
+separado, com `STAGE_TRACE_MEMORY=1`. O resultado é gravado em JSON, com o
+commit e as versões das bibliotecas, para comparação entre commits com
+`--comparar`.
+
+Uso:
+    python benchmarks/suite_desempenho.py --linhas 10000 100000 1000000
+    python benchmarks/suite_desempenho.py --paginas modelo_3 --linhas 50000000 --sem-memoria
+    python benchmarks/suite_desempenho.py --comparar benchmarks/resultados/desempenho_abc1234.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+# Exportações em diretório temporário e sem as linhas JSON de cada etapa (antes dos imports que leem as variáveis)
+os.environ.setdefault("EXPORT_CACHE_DIR", os.path.join(tempfile.mkdtemp(prefix="suite-desempenho-"), "exportacoes"))
+os.environ.setdefault("STAGE_LOG", "0")
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import sklearn
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from agregados_clusters import amostra_outliers, pontos_densidade, quantis_recencia
+from cubo_precos import contagem_por_status, estatisticas_por_categoria, filtrar_cubo
+from dados_sinteticos import gerar_csv
+from indice_conversao import contagens_no_limiar, curva_limiar
+from ingestao import TAMANHO_BLOCO, ativar_copy_on_write, ler_cabecalho, validar_colunas
+from instrumentacao import etapa, iniciar_coleta
+from modelos import ESQUEMA_MODELO_1, ESQUEMA_MODELO_2, ESQUEMA_MODELO_3, LIMIAR_CONVERSAO
+from pipelines import (
+    exportar_clusters, exportar_conversao, exportar_precos, processar_clusters, processar_conversao,
+    processar_precos
+)
+from registro_artefatos import ARTEFATOS, obter_artefato
+
+LINHAS_PADRAO = [10_000, 100_000, 1_000_000]
+DIRETORIO_DADOS = os.path.join(RAIZ, ".cache", "benchmarks")
+DIRETORIO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+# Variação relativa de tempo a partir da qual `--comparar` destaca a etapa
+LIMIAR_REGRESSAO = 0.10
+ESQUEMAS = {"modelo_1": ESQUEMA_MODELO_1, "modelo_2": ESQUEMA_MODELO_2, "modelo_3": ESQUEMA_MODELO_3}
+
+
+def medir_modelo_1(caminho, modelos, tamanho_bloco, chave):
+    kmeans = modelos["kmeans"]
+    agregados = processar_clusters(caminho, kmeans, tamanho_bloco).agregados
+    with etapa("dados_grafico"):
+        pontos_densidade(agregados)
+        amostra_outliers(agregados, quantis_recencia(agregados))
+    exportar_clusters(caminho, kmeans, chave, tamanho_bloco=tamanho_bloco)
+
+
+def medir_modelo_2(caminho, modelos, tamanho_bloco, chave):
+    assets = modelos["assets_conversao"]
+    indice = processar_conversao(caminho, assets["model"], assets, tamanho_bloco).indice
+    with etapa("dados_grafico"):
+        contagens_no_limiar(indice, LIMIAR_CONVERSAO)
+        curva_limiar(indice, [round(x / 100, 2) for x in range(1, 100)])
+    exportar_conversao(caminho, assets["model"], assets, chave, tamanho_bloco=tamanho_bloco)
+
+
+def medir_modelo_3(caminho, modelos, tamanho_bloco, chave):
+    cubo = processar_precos(caminho, modelos["reglog"], tamanho_bloco)
+    with etapa("dados_grafico"):
+        filtrado = filtrar_cubo(cubo)
+        contagem_por_status(filtrado)
+        contagem_por_status(filtrado, 'main_category')
+        contagem_por_status(filtrado, 'brand')
+        estatisticas_por_categoria(filtrado)
+    exportar_precos(caminho, modelos["reglog"], chave, tamanho_bloco=tamanho_bloco)
+
+
+PAGINAS = {
+    "modelo_1": medir_modelo_1,
+    "modelo_2": medir_modelo_2,
+    "modelo_3": medir_modelo_3,
+}
+
+
+def medir_pagina(pagina, caminho, modelos, tamanho_bloco):
+    """
+    Executa o caminho da página com um coletor de etapas aberto.
+
+    Returns:
+        pd.DataFrame: Medições por etapa (`instrumentacao.ColetorEtapas.tabela`)
+    """
+    coletor = iniciar_coleta(pagina)
+    with etapa("validacao"):
+        validar_colunas(ler_cabecalho(caminho), list(ESQUEMAS[pagina]))
+    # Chave nova a cada execução: a exportação nunca vem do cache
+    PAGINAS[pagina](caminho, modelos, tamanho_bloco, chave=uuid.uuid4().hex)
+    return coletor.tabela()
+
+
+def carregar_modelos():
+    """Carrega os modelos de cada página (registro de artefatos); páginas sem modelo ficam fora da suíte"""
+    modelos = {}
+    for nome in ARTEFATOS:
+        try:
+            modelos[nome] = obter_artefato(nome).objeto
+        except FileNotFoundError as e:
+            print(f"Modelo indisponível ({nome}): {e.filename}")
+    return modelos
+
+
+def _modelo_necessario(pagina):
+    return {"modelo_1": "kmeans", "modelo_2": "assets_conversao", "modelo_3": "reglog"}[pagina]
+
+
+def dataset_sintetico(pagina, linhas, semente, diretorio=DIRETORIO_DADOS):
+    """Caminho do CSV sintético, gerado apenas na primeira vez"""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"{pagina}_{linhas}_{semente}.csv")
+    if not os.path.exists(caminho):
+        gerar_csv(pagina, linhas, caminho, semente)
+    return caminho
+
+
+def medir_memoria(pagina, linhas, semente, tamanho_bloco):
+    """
+    Pico de memória por etapa, medido em um processo novo com `STAGE_TRACE_MEMORY=1`.
+
+    Returns:
+        dict: Etapa -> pico em bytes
+    """
+    saida = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--filho-memoria", pagina, str(linhas), str(semente),
+         str(tamanho_bloco)],
+        cwd=RAIZ, env=dict(os.environ, STAGE_TRACE_MEMORY="1"), capture_output=True, text=True, check=True,
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def _medir_memoria_filho(pagina, linhas, semente, tamanho_bloco):
+    """Executado no processo filho: imprime o pico de cada etapa em JSON"""
+    tabela = medir_pagina(pagina, dataset_sintetico(pagina, linhas, semente), carregar_modelos(), tamanho_bloco)
+    print(json.dumps({linha.etapa: int(linha.pico_bytes) for linha in tabela.itertuples()}))
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def executar(paginas, tamanhos, semente=0, tamanho_bloco=TAMANHO_BLOCO, memoria=True):
+    """
+    Executa a suíte e devolve o relatório (dicionário serializável em JSON).
+
+    Returns:
+        dict: Metadados do ambiente e uma linha por (página, linhas, etapa)
+    """
+    modelos = carregar_modelos()
+    resultados = []
+    for pagina in paginas:
+        if _modelo_necessario(pagina) not in modelos:
+            continue
+        for linhas in tamanhos:
+            caminho = dataset_sintetico(pagina, linhas, semente)
+            inicio = time.perf_counter()
+            tempos = medir_pagina(pagina, caminho, modelos, tamanho_bloco)
+            total = time.perf_counter() - inicio
+            memorias = medir_memoria(pagina, linhas, semente, tamanho_bloco) if memoria else {}
+            for linha in tempos.itertuples():
+                resultados.append({
+                    "pagina": pagina, "linhas": linhas, "etapa": linha.etapa,
+                    "segundos": linha.segundos, "linhas_por_s": linhas / linha.segundos if linha.segundos else None,
+                    "pico_bytes": memorias.get(linha.etapa),
+                })
+            print(f"{pagina} {linhas:>12,} linhas: {total:8.2f} s")
+    return {
+        "commit": _commit(),
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "pyarrow": pa.__version__,
+            "sklearn": sklearn.__version__,
+        },
+        "parametros": {"semente": semente, "tamanho_bloco": tamanho_bloco, "memoria": memoria},
+        "resultados": resultados,
+    }
+
+
+def comparar(atual, anterior, limiar=LIMIAR_REGRESSAO):
+    """Tabela de variação de tempo e memória por (página, linhas, etapa) entre dois relatórios"""
+    chaves = ["pagina", "linhas", "etapa"]
+    tabela = pd.DataFrame(atual["resultados"]).merge(
+        pd.DataFrame(anterior["resultados"]), on=chaves, suffixes=("", "_anterior")
+    )
+    tabela["variacao_tempo"] = tabela["segundos"] / tabela["segundos_anterior"] - 1
+    tabela["variacao_memoria"] = tabela["pico_bytes"] / tabela["pico_bytes_anterior"] - 1
+    tabela["regressao"] = tabela["variacao_tempo"] > limiar
+    return tabela[chaves + ["segundos_anterior", "segundos", "variacao_tempo", "variacao_memoria", "regressao"]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", nargs="+", choices=sorted(PAGINAS), default=sorted(PAGINAS))
+    parser.add_argument("--linhas", nargs="+", type=int, default=LINHAS_PADRAO, help="Tamanhos das entradas (até 50M)")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO, help="Bytes de CSV por bloco")
+    parser.add_argument("--sem-memoria", action="store_true", help="Só mede tempo (pula o processo com tracemalloc)")
+    parser.add_argument("--saida", help="Arquivo JSON (padrão: benchmarks/resultados/desempenho_<commit>.json)")
+    parser.add_argument("--comparar", help="Relatório JSON anterior para comparação")
+    parser.add_argument("--filho-memoria", nargs=4, metavar=("PAGINA", "LINHAS", "SEMENTE", "TAMANHO_BLOCO"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    ativar_copy_on_write()
+    if args.filho_memoria:
+        pagina, linhas, semente, tamanho_bloco = args.filho_memoria
+        _medir_memoria_filho(pagina, int(linhas), int(semente), int(tamanho_bloco))
+        return
+
+    relatorio = executar(args.paginas, args.linhas, args.semente, args.tamanho_bloco, not args.sem_memoria)
+    saida = args.saida or os.path.join(DIRETORIO_RESULTADOS, f"desempenho_{relatorio['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, indent=2)
+    print(f"Relatório gravado em {saida}")
+
+    tabela = pd.DataFrame(relatorio["resultados"])
+    if len(tabela):
+        print(tabela.pivot_table(index=["pagina", "linhas"], columns="etapa", values="segundos").round(3).to_string())
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            print(comparar(relatorio, json.load(arquivo)).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
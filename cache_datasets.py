@@ -0,0 +1,131 @@
+"""
+Cache em disco de datasets no formato colunar (Arrow IPC/Feather v2)
+
+Na primeira vez que um CSV é visto, ele é convertido bloco a bloco para um
+arquivo `.arrow` sem compressão, identificado pelo hash do conteúdo e pelo
+esquema do modelo. Nas leituras seguintes o arquivo é mapeado em memória e
+convertido para pandas sem cópia, pulando completamente o parsing do CSV.
+O diretório tem um limite de tamanho: os arquivos usados há mais tempo são
+removidos primeiro (LRU pela data de modificação, renovada a cada acesso).
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import pyarrow as pa
+
+from ingestao import EXTENSAO_COLUNAR, TAMANHO_BLOCO, eh_colunar, ler_lotes_arrow
+
+DIRETORIO_CACHE = os.environ.get("DATASET_CACHE_DIR", "./.cache/datasets")
+LIMITE_BYTES_CACHE = int(os.environ.get("DATASET_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Versão da conversão (parte do nome do arquivo): incrementar sempre que os
+# tipos gravados mudarem (2: colunas fora do esquema gravadas como texto)
+VERSAO_CONVERSAO = 2
+
+
+def _hash_esquema(esquema):
+    """Identificador curto do esquema e da versão da conversão (os tipos gravados dependem deles)"""
+    conteudo = json.dumps({"esquema": esquema, "versao": VERSAO_CONVERSAO}, sort_keys=True)
+    return hashlib.sha256(conteudo.encode()).hexdigest()[:12]
+
+
+def caminho_colunar(chave_dataset, esquema, diretorio=DIRETORIO_CACHE):
+    """Caminho do arquivo colunar de um dataset (hash do conteúdo + esquema)"""
+    return os.path.join(diretorio, f"{chave_dataset}-{_hash_esquema(esquema)}{EXTENSAO_COLUNAR}")
+
+
+def _converter(fonte, esquema, destino, tamanho_bloco):
+    """
+    Converte o CSV para Arrow IPC bloco a bloco, com escrita atômica (arquivo temporário + rename).
+
+    Returns:
+        bool: False se o CSV não tinha nenhuma linha (nada é gravado)
+    """
+    lotes = ler_lotes_arrow(fonte, esquema, tamanho_bloco, todas_colunas=True)
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            escritor = None
+            for lote in lotes:
+                # Dicionários (category) mudam a cada lote e o formato de arquivo IPC
+                # não aceita substituí-los: grava-se o texto e a categoria é refeita na leitura
+                lote = pa.RecordBatch.from_arrays(
+                    [coluna.cast(pa.string()) if pa.types.is_dictionary(coluna.type) else coluna for coluna in lote.columns],
+                    names=lote.schema.names,
+                )
+                if escritor is None:
+                    escritor = pa.ipc.new_file(arquivo, lote.schema)
+                escritor.write_batch(lote)
+            if escritor is None:
+                os.unlink(temporario)
+                return False
+            escritor.close()
+        os.replace(temporario, destino)
+        return True
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def limitar_cache(diretorio=DIRETORIO_CACHE, limite_bytes=LIMITE_BYTES_CACHE, preservar=()):
+    """
+    Remove os arquivos colunares menos usados até o cache caber em `limite_bytes`.
+
+    Args:
+        diretorio (str): Diretório do cache
+        limite_bytes (int): Tamanho máximo do diretório
+        preservar (tuple[str]): Caminhos que não podem ser removidos (ex.: o recém-gravado)
+    """
+    arquivos = []
+    for entrada in os.scandir(diretorio):
+        if entrada.name.endswith(EXTENSAO_COLUNAR):
+            info = entrada.stat()
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    preservados = {os.path.abspath(caminho) for caminho in preservar}
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite_bytes:
+            break
+        if os.path.abspath(caminho) in preservados:
+            continue
+        try:
+            os.unlink(caminho)
+            total -= tamanho
+        except FileNotFoundError:
+            pass
+
+
+def obter_dataset_colunar(fonte, esquema, chave_dataset, diretorio=DIRETORIO_CACHE,
+                          limite_bytes=LIMITE_BYTES_CACHE, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Devolve o caminho da cópia colunar do dataset, convertendo o CSV se necessário.
+
+    Se o cache não puder ser gravado (disco cheio, diretório somente leitura),
+    a própria fonte CSV é devolvida e a leitura segue pelo parser de CSV.
+
+    Args:
+        fonte (str | file-like): Caminho do CSV ou arquivo enviado pelo usuário
+        esquema (dict[str, str]): Esquema do modelo (ver `modelos.ESQUEMAS`)
+        chave_dataset (str): Hash do conteúdo (ver `ingestao.hash_conteudo`)
+
+    Returns:
+        str | file-like: Caminho do arquivo `.arrow` ou a fonte original
+
+    Raises:
+        ColunasFaltandoError: Se alguma coluna do esquema estiver ausente no CSV
+    """
+    if eh_colunar(fonte):
+        return fonte
+    destino = caminho_colunar(chave_dataset, esquema, diretorio)
+    try:
+        if os.path.exists(destino):
+            os.utime(destino)
+            return destino
+        os.makedirs(diretorio, exist_ok=True)
+        if not _converter(fonte, esquema, destino, tamanho_bloco):
+            return fonte
+        limitar_cache(diretorio, limite_bytes, preservar=(destino,))
+        return destino
+    except OSError:
+        return fonte
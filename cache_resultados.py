@@ -0,0 +1,217 @@
+"""
+Cache em disco dos resultados das páginas, compartilhado entre sessões e processos
+
+Cada resultado é identificado por (página, versão do pipeline, hash do
+conteúdo do dataset, hash dos artefatos do modelo) e gravado como um
+diretório com um arquivo Arrow IPC por tabela/vetor e um `manifesto.json`
+descrevendo a estrutura (NamedTuples, dicionários, Series, Index...). Um
+segundo analista que abre o mesmo arquivo recebe o resultado sem nenhuma
+chamada ao modelo, inclusive após reiniciar o servidor.
+
+Concorrência entre processos: cada entrada é escrita em um diretório
+temporário e publicada com `os.rename` (atômico); publicação e remoção
+(LRU pela data de modificação, dentro de um orçamento de bytes) acontecem
+sob um lock exclusivo de arquivo (`fcntl.flock`). A leitura não precisa de
+lock: uma entrada removida no meio da leitura é tratada como ausente.
+"""
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ingestao import hash_conteudo
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (a publicação continua atômica)
+    fcntl = None
+
+DIRETORIO_RESULTADOS = os.environ.get("RESULT_CACHE_DIR", "./.cache/resultados")
+LIMITE_BYTES_RESULTADOS = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 1024 ** 3))
+_MANIFESTO = "manifesto.json"
+_ARQUIVO_LOCK = ".lock"
+
+
+def chave_resultado(pagina, versao_pipeline, chave_dataset, hash_modelo):
+    """Chave do resultado: hash de (página, versão do pipeline, dataset, modelo)"""
+    identificador = json.dumps([pagina, versao_pipeline, chave_dataset, hash_modelo])
+    return hashlib.sha256(identificador.encode()).hexdigest()[:40]
+
+
+def hash_artefatos(*caminhos):
+    """Hash combinado dos arquivos de modelo/encoders usados por uma página"""
+    return hashlib.sha256("".join(hash_conteudo(caminho) for caminho in caminhos).encode()).hexdigest()
+
+
+@contextlib.contextmanager
+def _lock(diretorio):
+    """Lock exclusivo entre processos para publicar e remover entradas"""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(diretorio, _ARQUIVO_LOCK), "a") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+# ===============================
+# Serialização (estrutura no manifesto, dados em Arrow IPC)
+# ===============================
+def _gravar_tabela(tabela, diretorio, nome):
+    with pa.OSFile(os.path.join(diretorio, nome), "wb") as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return nome
+
+
+def _ler_tabela(diretorio, nome):
+    with pa.memory_map(os.path.join(diretorio, nome), "r") as arquivo:
+        return pa.ipc.open_file(arquivo).read_all()
+
+
+def _serializar(valor, diretorio, contador):
+    """Grava as folhas (DataFrame, Series, Index, ndarray) e devolve a descrição da estrutura"""
+    nome = f"{next(contador)}.arrow"
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return {"tipo": "valor", "valor": valor}
+    if isinstance(valor, tuple) and hasattr(valor, "_fields"):
+        return {
+            "tipo": "namedtuple",
+            "classe": f"{type(valor).__module__}:{type(valor).__qualname__}",
+            "campos": {campo: _serializar(getattr(valor, campo), diretorio, contador) for campo in valor._fields},
+        }
+    if isinstance(valor, dict):
+        return {"tipo": "dict", "itens": [[chave, _serializar(item, diretorio, contador)] for chave, item in valor.items()]}
+    if isinstance(valor, pd.DataFrame):
+        colunas = [str(coluna) for coluna in valor.columns]
+        tabela = pa.Table.from_pandas(valor.set_axis(colunas, axis=1), preserve_index=True)
+        return {"tipo": "dataframe", "arquivo": _gravar_tabela(tabela, diretorio, nome), "colunas": list(valor.columns)}
+    if isinstance(valor, pd.Series):
+        tabela = pa.Table.from_pandas(valor.to_frame("valores"), preserve_index=True)
+        return {"tipo": "series", "arquivo": _gravar_tabela(tabela, diretorio, nome), "nome": valor.name}
+    if isinstance(valor, pd.Index):
+        tabela = pa.Table.from_pandas(pd.DataFrame({"valores": valor}), preserve_index=False)
+        return {"tipo": "index", "arquivo": _gravar_tabela(tabela, diretorio, nome), "nome": valor.name}
+    if isinstance(valor, np.ndarray):
+        return {"tipo": "ndarray", "arquivo": _gravar_tabela(pa.table({"valores": valor}), diretorio, nome)}
+    raise TypeError(f"Tipo não suportado no cache de resultados: {type(valor).__name__}")
+
+
+def _desserializar(descricao, diretorio):
+    tipo = descricao["tipo"]
+    if tipo == "valor":
+        return descricao["valor"]
+    if tipo == "namedtuple":
+        modulo, nome = descricao["classe"].split(":")
+        classe = getattr(importlib.import_module(modulo), nome)
+        return classe(**{campo: _desserializar(item, diretorio) for campo, item in descricao["campos"].items()})
+    if tipo == "dict":
+        return {chave: _desserializar(item, diretorio) for chave, item in descricao["itens"]}
+    tabela = _ler_tabela(diretorio, descricao["arquivo"])
+    if tipo == "ndarray":
+        return tabela.column("valores").to_numpy()
+    dados = tabela.to_pandas()
+    if tipo == "dataframe":
+        return dados.set_axis(descricao["colunas"], axis=1)
+    if tipo == "series":
+        return dados["valores"].rename(descricao["nome"])
+    return pd.Index(dados["valores"]).rename(descricao["nome"])
+
+
+# ===============================
+# Leitura, gravação e remoção
+# ===============================
+def ler_resultado(chave, diretorio=DIRETORIO_RESULTADOS):
+    """
+    Lê um resultado do cache, renovando sua data de uso.
+
+    Returns:
+        Any | None: O resultado, ou None se não estiver no cache
+    """
+    entrada = os.path.join(diretorio, chave)
+    try:
+        with open(os.path.join(entrada, _MANIFESTO), encoding="utf-8") as arquivo:
+            manifesto = json.load(arquivo)
+        resultado = _desserializar(manifesto, entrada)
+        os.utime(entrada)
+        return resultado
+    except (OSError, ValueError, pa.ArrowException):
+        # Entrada ausente, removida durante a leitura ou incompleta
+        return None
+
+
+def _tamanho_entrada(caminho):
+    return sum(arquivo.stat().st_size for arquivo in os.scandir(caminho) if arquivo.is_file())
+
+
+def limitar_resultados(diretorio=DIRETORIO_RESULTADOS, limite_bytes=LIMITE_BYTES_RESULTADOS, preservar=()):
+    """Remove as entradas usadas há mais tempo até o cache caber em `limite_bytes` (chamar sob `_lock`)"""
+    entradas = []
+    for entrada in os.scandir(diretorio):
+        if entrada.is_dir() and not entrada.name.startswith("."):
+            try:
+                entradas.append((entrada.stat().st_mtime, _tamanho_entrada(entrada.path), entrada.path))
+            except FileNotFoundError:
+                continue
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= limite_bytes:
+            break
+        if os.path.basename(caminho) in preservar:
+            continue
+        shutil.rmtree(caminho, ignore_errors=True)
+        total -= tamanho
+
+
+def gravar_resultado(chave, resultado, diretorio=DIRETORIO_RESULTADOS, limite_bytes=LIMITE_BYTES_RESULTADOS):
+    """Grava o resultado (escrita em diretório temporário + rename) e aplica o limite de bytes"""
+    os.makedirs(diretorio, exist_ok=True)
+    temporario = tempfile.mkdtemp(dir=diretorio, prefix=".tmp-")
+    try:
+        manifesto = _serializar(resultado, temporario, iter(range(1_000_000)))
+        with open(os.path.join(temporario, _MANIFESTO), "w", encoding="utf-8") as arquivo:
+            json.dump(manifesto, arquivo)
+        with _lock(diretorio):
+            destino = os.path.join(diretorio, chave)
+            if os.path.exists(destino):
+                # Outro processo publicou o mesmo resultado primeiro
+                shutil.rmtree(temporario, ignore_errors=True)
+            else:
+                os.rename(temporario, destino)
+            limitar_resultados(diretorio, limite_bytes, preservar=(chave,))
+    except BaseException:
+        shutil.rmtree(temporario, ignore_errors=True)
+        raise
+
+
+def obter_resultado(chave, calcular, diretorio=DIRETORIO_RESULTADOS, limite_bytes=LIMITE_BYTES_RESULTADOS):
+    """
+    Devolve o resultado em cache ou o calcula (e grava) com `calcular()`.
+
+    Falhas de disco ao gravar não impedem a página de usar o resultado calculado.
+
+    Args:
+        chave (str): Chave de `chave_resultado`
+        calcular (Callable[[], Any]): Calcula o resultado (executa o modelo)
+
+    Returns:
+        Any: Resultado (NamedTuples, dicionários, DataFrames, Series, Index e ndarrays)
+    """
+    resultado = ler_resultado(chave, diretorio)
+    if resultado is not None:
+        return resultado
+    resultado = calcular()
+    try:
+        gravar_resultado(chave, resultado, diretorio, limite_bytes)
+    except OSError:
+        pass
+    return resultado
@@ -0,0 +1,208 @@
+"""
+Cubo de agregação categoria × marca × status para o Modelo 3
+
+O cubo é construído uma única vez após a classificação e guarda, para cada
+combinação (main_category, brand, status_preco), apenas estatísticas
+mescláveis: quantidade, soma, média e M2 (soma dos quadrados dos desvios)
+dos preços, além de um histograma logarítmico esparso usado como sketch
+da mediana. Qualquer filtro de categoria/marca e qualquer reagrupamento
+é resolvido sobre os grupos, nunca sobre as linhas de produtos.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+DIMENSOES = ['main_category', 'brand', 'status_preco']
+STATUS_NORMAL = 'Preço Normal'
+STATUS_FORA = 'Preço fora do Padrão'
+
+# Faixas logarítmicas do histograma de preços: 1024 faixas entre 0,01 e 10^7
+# (largura relativa de ~2% por faixa; a mediana é interpolada dentro da faixa)
+PRECO_MINIMO = 1e-2
+PRECO_MAXIMO = 1e7
+NUM_FAIXAS = 1024
+_LOG_MIN = np.log10(PRECO_MINIMO)
+_PASSO_LOG = (np.log10(PRECO_MAXIMO) - _LOG_MIN) / NUM_FAIXAS
+
+
+class CuboPrecos(NamedTuple):
+    """Estatísticas por grupo (`grupos`) e histograma esparso de preços (`histograma`)"""
+    grupos: pd.DataFrame
+    histograma: pd.DataFrame
+
+
+def _faixa_preco(precos):
+    """Índice da faixa logarítmica de cada preço (valores fora do intervalo são truncados)"""
+    precos = np.clip(np.asarray(precos, dtype='float64'), PRECO_MINIMO, PRECO_MAXIMO)
+    faixas = np.floor((np.log10(precos) - _LOG_MIN) / _PASSO_LOG)
+    return np.clip(faixas, 0, NUM_FAIXAS - 1).astype('int16')
+
+
+def _borda_faixa(faixa):
+    """Limite inferior (em preço) de cada faixa"""
+    return 10 ** (_LOG_MIN + np.asarray(faixa, dtype='float64') * _PASSO_LOG)
+
+
+def construir_cubo(df_classificado):
+    """
+    Constrói o cubo a partir do DataFrame já classificado.
+
+    Args:
+        df_classificado (pd.DataFrame): Dados com `price` e as colunas de DIMENSOES
+
+    Returns:
+        CuboPrecos: Cubo agregado por (main_category, brand, status_preco)
+    """
+    dados = df_classificado[DIMENSOES + ['price']].dropna(subset=DIMENSOES).astype({'price': 'float64'})
+    agrupado = dados.groupby(DIMENSOES, observed=True, sort=False)['price']
+    grupos = agrupado.agg(quantidade='count', soma_preco='sum', media_preco='mean', variancia='var')
+    grupos['m2_preco'] = (grupos.pop('variancia') * (grupos['quantidade'] - 1)).fillna(0.0)
+
+    dados_validos = dados[dados['price'].notna()]
+    histograma = (
+        dados_validos[DIMENSOES]
+        .assign(faixa=_faixa_preco(dados_validos['price']))
+        .groupby(DIMENSOES + ['faixa'], observed=True, sort=False)
+        .size()
+        .rename('quantidade')
+        .reset_index()
+    )
+    return CuboPrecos(grupos.reset_index(), histograma)
+
+
+def _reduzir_grupos(grupos, chaves):
+    """
+    Mescla estatísticas de grupos pelas `chaves` (fórmula de Chan para o M2).
+
+    Returns:
+        pd.DataFrame: quantidade, soma_preco, media_preco e m2_preco por chave
+    """
+    agrupado = grupos.groupby(chaves, observed=True, sort=False)
+    quantidade = agrupado['quantidade'].transform('sum')
+    media = agrupado['soma_preco'].transform('sum') / quantidade
+    parciais = grupos[chaves + ['quantidade', 'soma_preco']].assign(
+        m2_preco=grupos['m2_preco'] + grupos['quantidade'] * (grupos['media_preco'] - media) ** 2
+    )
+    reduzido = parciais.groupby(chaves, observed=True).sum()
+    reduzido['media_preco'] = reduzido['soma_preco'] / reduzido['quantidade']
+    return reduzido
+
+
+def _concatenar(tabelas):
+    """
+    Concatena tabelas do cubo mantendo as DIMENSOES como `category`.
+
+    Com categorias diferentes entre as partes (as marcas de cada bloco), o
+    `concat` convertia a coluna em objetos Python, e o histograma acumulado
+    chegava a ocupar mais do que os dados de entrada. As partes recebem a
+    união das categorias em ordem alfabética, a mesma ordem do agrupamento
+    sobre o texto.
+    """
+    for coluna in DIMENSOES:
+        tipos = [tabela[coluna].dtype for tabela in tabelas]
+        if all(isinstance(tipo, pd.CategoricalDtype) for tipo in tipos) and all(tipo == tipos[0] for tipo in tipos):
+            continue
+        valores = set()
+        for tabela in tabelas:
+            serie = tabela[coluna]
+            valores.update(serie.cat.categories if isinstance(serie.dtype, pd.CategoricalDtype) else serie.dropna().unique())
+        tipo = pd.CategoricalDtype(sorted(valores))
+        tabelas = [tabela.assign(**{coluna: tabela[coluna].astype(tipo)}) for tabela in tabelas]
+    return pd.concat(tabelas, ignore_index=True)
+
+
+def mesclar_cubos(cubos):
+    """
+    Mescla cubos parciais (por exemplo, de blocos de um mesmo arquivo) em um único cubo.
+
+    Args:
+        cubos (list[CuboPrecos]): Cubos a serem mesclados
+
+    Returns:
+        CuboPrecos: Cubo equivalente ao construído sobre todos os dados
+    """
+    grupos = _concatenar([c.grupos for c in cubos])
+    histograma = _concatenar([c.histograma for c in cubos])
+    grupos = _reduzir_grupos(grupos, DIMENSOES).reset_index()
+    histograma = histograma.groupby(DIMENSOES + ['faixa'], observed=True)['quantidade'].sum().reset_index()
+    return CuboPrecos(grupos, histograma)
+
+
+def filtrar_cubo(cubo, categoria='Todas', marca='Todas'):
+    """
+    Recorta o cubo pela categoria e marca selecionadas ('Todas' = sem filtro).
+
+    Returns:
+        CuboPrecos: Cubo contendo apenas os grupos selecionados
+    """
+    def mascara(tabela):
+        selecao = np.ones(len(tabela), dtype=bool)
+        if categoria != 'Todas':
+            selecao &= (tabela['main_category'] == categoria).to_numpy()
+        if marca != 'Todas':
+            selecao &= (tabela['brand'] == marca).to_numpy()
+        return selecao
+
+    return CuboPrecos(cubo.grupos[mascara(cubo.grupos)], cubo.histograma[mascara(cubo.histograma)])
+
+
+def contagem_por_status(cubo, dimensao=None):
+    """
+    Quantidade de produtos por status, opcionalmente quebrada por uma dimensão.
+
+    Args:
+        cubo (CuboPrecos): Cubo (já filtrado)
+        dimensao (str | None): 'main_category', 'brand' ou None para o total
+
+    Returns:
+        pd.DataFrame | pd.Series: Tabela dimensão × status ou série por status
+    """
+    if dimensao is None:
+        return cubo.grupos.groupby('status_preco', observed=True)['quantidade'].sum().sort_values(ascending=False)
+    return (
+        cubo.grupos.groupby([dimensao, 'status_preco'], observed=True)['quantidade']
+        .sum()
+        .unstack(fill_value=0)
+    )
+
+
+def _mediana_histograma(histograma, dimensao):
+    """Mediana aproximada por `dimensao`, interpolada geometricamente dentro da faixa mediana"""
+    contagens = (
+        histograma.groupby([dimensao, 'faixa'], observed=True)['quantidade']
+        .sum()
+        .reset_index()
+    )
+    agrupado = contagens.groupby(dimensao, observed=True, sort=False)['quantidade']
+    acumulado = agrupado.cumsum()
+    metade = agrupado.transform('sum') / 2
+    anterior = acumulado - contagens['quantidade']
+    faixa_mediana = contagens[(acumulado >= metade) & (anterior < metade)].drop_duplicates(subset=dimensao)
+    fracao = (metade - anterior)[faixa_mediana.index] / faixa_mediana['quantidade']
+    mediana = _borda_faixa(faixa_mediana['faixa']) * (10 ** _PASSO_LOG) ** fracao.to_numpy()
+    return pd.Series(mediana, index=faixa_mediana[dimensao].to_numpy())
+
+
+def estatisticas_por_categoria(cubo):
+    """
+    Tabela da "Análise Detalhada por Categoria" calculada a partir do cubo.
+
+    Returns:
+        pd.DataFrame: Total, fora do padrão, média, mediana (aproximada) e desvio padrão por categoria
+    """
+    chaves = ['main_category']
+    reduzido = _reduzir_grupos(cubo.grupos, chaves)
+    fora_padrao = (
+        cubo.grupos[cubo.grupos['status_preco'] == STATUS_FORA]
+        .groupby(chaves, observed=True)['quantidade'].sum()
+    )
+    variancia = reduzido['m2_preco'] / (reduzido['quantidade'] - 1)
+    tabela = pd.DataFrame({
+        'Total Produtos': reduzido['quantidade'],
+        'Produtos fora Padrão': fora_padrao.reindex(reduzido.index, fill_value=0),
+        'Preço Médio': reduzido['media_preco'],
+        'Preço Mediano': _mediana_histograma(cubo.histograma, 'main_category').reindex(reduzido.index),
+        'Desvio Padrão': np.sqrt(variancia.where(reduzido['quantidade'] > 1)),
+    })
+    return tabela.round(2)
@@ -0,0 +1,98 @@
+"""
+Dados dos gráficos: tabelas resumidas entregues ao Plotly
+
+As figuras das páginas recebem apenas tabelas já reduzidas (fatias com
+percentual, top-N, percentuais por linha e quantis de histogramas), nunca
+as linhas dos arquivos. Assim o JSON de cada figura, serializado a cada
+rerun e enviado ao navegador, tem tamanho limitado pelo número de classes
+(clusters, marcas, categorias, dias) e não pelo número de linhas.
+`tamanho_payload` mede esse JSON (ver `benchmarks/payload_graficos.py`).
+"""
+import numpy as np
+import pandas as pd
+
+
+def fatias(contagens, dimensao, valor='count'):
+    """
+    Fatias de um gráfico de pizza: contagem e percentual do total, na ordem recebida.
+
+    Args:
+        contagens (pd.Series): Contagens indexadas pela classe
+        dimensao (str): Nome da coluna das classes
+        valor (str): Nome da coluna das contagens
+
+    Returns:
+        pd.DataFrame: `dimensao`, `valor` e `percentual` (0-100)
+    """
+    tabela = contagens.rename_axis(dimensao).rename(valor).reset_index()
+    total = tabela[valor].sum()
+    tabela['percentual'] = tabela[valor] / total * 100 if total > 0 else 0.0
+    return tabela
+
+
+def top_n(contagens, n, dimensao, por=None, valor='count'):
+    """
+    As `n` maiores classes, em ordem decrescente (empates na ordem do índice).
+
+    Args:
+        contagens (pd.Series | pd.DataFrame): Contagens (ou tabela de contagens) indexadas pela classe
+        n (int): Quantidade de classes mantidas
+        dimensao (str): Nome da coluna das classes
+        por (str | None): Coluna de ordenação, quando `contagens` é uma tabela
+        valor (str): Nome da coluna das contagens, quando `contagens` é uma Series
+
+    Returns:
+        pd.DataFrame: Até `n` linhas, com a classe na coluna `dimensao`
+    """
+    if isinstance(contagens, pd.Series):
+        contagens, por = contagens.rename(valor).to_frame(), valor
+    maiores = contagens.sort_values(por, ascending=False, kind='stable').head(n)
+    return maiores.rename_axis(dimensao).reset_index()
+
+
+def percentuais(tabela, linhas=None, colunas=None):
+    """
+    Participação (0-100) de cada coluna no total da linha, para barras 100% empilhadas.
+
+    Args:
+        tabela (pd.DataFrame): Contagens (linhas x colunas)
+        linhas (list | None): Ordem das linhas; as ausentes entram com zero
+        colunas (list | None): Ordem das colunas; as ausentes entram com zero
+
+    Returns:
+        pd.DataFrame: Mesma forma; linhas sem nenhuma contagem ficam com zero
+    """
+    if linhas is not None:
+        tabela = tabela.reindex(linhas, fill_value=0)
+    if colunas is not None:
+        tabela = tabela.reindex(columns=colunas, fill_value=0)
+    valores = tabela.to_numpy(dtype='float64')
+    totais = valores.sum(axis=1, keepdims=True)
+    resultado = np.divide(valores * 100, totais, out=np.zeros_like(valores), where=totais > 0)
+    return pd.DataFrame(resultado, index=tabela.index, columns=tabela.columns)
+
+
+def quantis_histograma(valores, contagens, quantis):
+    """
+    Quantis com interpolação linear (o padrão do NumPy/Plotly) a partir de um histograma exato.
+
+    Args:
+        valores (np.ndarray): Valores distintos, em ordem crescente
+        contagens (np.ndarray): Ocorrências de cada valor
+        quantis (Sequence[float]): Quantis desejados (0-1)
+
+    Returns:
+        np.ndarray: Um valor por quantil
+    """
+    valores = np.asarray(valores, dtype='float64')
+    acumulado = np.cumsum(contagens)
+    posicao = np.asarray(quantis, dtype='float64') * (acumulado[-1] - 1)
+    abaixo, acima = np.floor(posicao), np.ceil(posicao)
+    valor_abaixo = valores[np.searchsorted(acumulado, abaixo, side='right')]
+    valor_acima = valores[np.searchsorted(acumulado, acima, side='right')]
+    return valor_abaixo + (valor_acima - valor_abaixo) * (posicao - abaixo)
+
+
+def tamanho_payload(figura):
+    """Bytes do JSON da figura (o que o Streamlit serializa e envia ao navegador a cada rerun)"""
+    return len(figura.to_json().encode())
@@ -0,0 +1,66 @@
+"""
+Empacota o escalonamento e o K-Means do Modelo 1 em um único artefato
+
+O `modelo_kmeans.pkl` original contém apenas o K-Means; a padronização das
+features era recalculada a cada arquivo enviado. Este script ajusta o
+StandardScaler bloco a bloco (`partial_fit`) sobre o dataset de referência e
+grava um Pipeline (`scaler` + `kmeans`) no lugar do modelo, de forma que os
+rótulos passam a ser estáveis entre lotes.
+
+Uso:
+    python empacotar_kmeans.py --referencia datasets/cluster_test.csv
+"""
+import argparse
+import os
+
+import joblib
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from ingestao import ativar_copy_on_write, ler_csv_em_blocos
+from modelos import CAMINHO_KMEANS, ESQUEMA_MODELO_1, FEATURES_CLUSTER, RAIZ_PROJETO
+from registro_artefatos import publicar_artefato
+
+REFERENCIA_PADRAO = os.path.join(RAIZ_PROJETO, "datasets", "cluster_test.csv")
+
+
+def ajustar_escalonamento(referencia):
+    """StandardScaler ajustado bloco a bloco (equivalente ao `fit` no arquivo completo)"""
+    scaler = StandardScaler()
+    for bloco in ler_csv_em_blocos(referencia, ESQUEMA_MODELO_1):
+        scaler.partial_fit(bloco[FEATURES_CLUSTER].to_numpy(dtype="float64"))
+    return scaler
+
+
+def empacotar(referencia=REFERENCIA_PADRAO, modelo=CAMINHO_KMEANS, destino=None):
+    """
+    Grava o Pipeline `scaler` + `kmeans` em `destino` (padrão: sobrescreve o modelo).
+
+    A gravação é atômica: servidores em execução passam para a nova versão na próxima
+    verificação do registro de artefatos, sem restart.
+
+    Returns:
+        Pipeline: Artefato gravado
+    """
+    kmeans = joblib.load(modelo)
+    if hasattr(kmeans, "named_steps"):
+        raise ValueError(f"{modelo} já contém o escalonamento")
+    pipeline = Pipeline([("scaler", ajustar_escalonamento(referencia)), ("kmeans", kmeans)])
+    publicar_artefato(pipeline, destino or modelo)
+    return pipeline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--referencia", default=REFERENCIA_PADRAO, help="CSV usado para ajustar o escalonamento")
+    parser.add_argument("--modelo", default=CAMINHO_KMEANS, help="Arquivo com o K-Means treinado")
+    parser.add_argument("--destino", default=None, help="Arquivo de saída (padrão: sobrescreve --modelo)")
+    args = parser.parse_args(argv)
+    ativar_copy_on_write()
+    pipeline = empacotar(args.referencia, args.modelo, args.destino)
+    scaler = pipeline.named_steps["scaler"]
+    print(f"Escalonamento ajustado em {scaler.n_samples_seen_} clientes: média={scaler.mean_}, desvio={scaler.scale_}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Exportação dos resultados pontuados em CSV, CSV gzip ou Parquet, com cache em disco
+
+Os arquivos são gerados apenas quando o usuário pede o download e escritos
+bloco a bloco direto no disco (sem montar o arquivo inteiro como string em
+memória). Cada arquivo fica em `.cache/exportacoes/`, identificado pela
+chave do resultado, pelo formato e pelos parâmetros da exportação (filtros,
+limiar), de forma que downloads repetidos não pontuam nem serializam nada
+de novo. Os arquivos menos usados são removidos acima de `EXPORT_CACHE_MAX_BYTES`.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+import pyarrow as pa
+
+from instrumentacao import etapa, iterar_medido
+
+DIRETORIO_EXPORTACOES = os.environ.get("EXPORT_CACHE_DIR", "./.cache/exportacoes")
+LIMITE_BYTES_EXPORTACOES = int(os.environ.get("EXPORT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Formato -> (rótulo exibido, tipo MIME, extensão do arquivo)
+FORMATOS_EXPORTACAO = {
+    "csv": ("CSV", "text/csv", ".csv"),
+    "csv.gz": ("CSV compactado (gzip)", "application/gzip", ".csv.gz"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet", ".parquet"),
+}
+NIVEL_GZIP = 6
+
+
+def chave_exportacao(chave_base, formato, *parametros):
+    """Chave do arquivo exportado: resultado de origem, formato e parâmetros (filtros, limiar...)"""
+    identificador = json.dumps([chave_base, formato, *parametros], default=str)
+    return hashlib.sha256(identificador.encode()).hexdigest()[:40]
+
+
+def caminho_exportacao(chave, formato, diretorio=DIRETORIO_EXPORTACOES):
+    return os.path.join(diretorio, chave + FORMATOS_EXPORTACAO[formato][2])
+
+
+def _tabela_arrow(bloco, esquema):
+    """Bloco como tabela Arrow; categorias com índice int32 para o esquema ser o mesmo em todos os blocos"""
+    tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+    if esquema is not None:
+        return tabela.cast(esquema)
+    campos = [
+        campo.with_type(pa.dictionary(pa.int32(), campo.type.value_type)) if pa.types.is_dictionary(campo.type) else campo
+        for campo in tabela.schema
+    ]
+    return tabela.cast(pa.schema(campos, metadata=tabela.schema.metadata))
+
+
+def escrever_blocos(blocos, formato, arquivo):
+    """
+    Serializa os blocos pontuados em um arquivo binário aberto, um bloco por vez.
+
+    Args:
+        blocos (Iterable[pd.DataFrame]): Blocos com as mesmas colunas
+        formato (str): Uma das chaves de FORMATOS_EXPORTACAO
+        arquivo (BinaryIO): Destino
+    """
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+
+        escritor = esquema = None
+        for bloco in blocos:
+            with etapa("serializacao", linhas=len(bloco)):
+                tabela = _tabela_arrow(bloco, esquema)
+                if escritor is None:
+                    esquema = tabela.schema
+                    escritor = pq.ParquetWriter(arquivo, esquema, compression="snappy")
+                escritor.write_table(tabela)
+        if escritor is None:
+            pq.write_table(pa.table({}), arquivo)
+        else:
+            escritor.close()
+        return
+
+    saida = gzip.GzipFile(fileobj=arquivo, mode="wb", compresslevel=NIVEL_GZIP) if formato == "csv.gz" else arquivo
+    try:
+        for i, bloco in enumerate(blocos):
+            with etapa("serializacao", linhas=len(bloco)):
+                bloco.to_csv(saida, index=False, header=(i == 0), encoding="utf-8")
+    finally:
+        if saida is not arquivo:
+            saida.close()
+
+
+def limitar_exportacoes(diretorio=DIRETORIO_EXPORTACOES, limite_bytes=LIMITE_BYTES_EXPORTACOES, preservar=()):
+    """Remove os arquivos exportados menos usados até o diretório caber em `limite_bytes`"""
+    arquivos = []
+    for entrada in os.scandir(diretorio):
+        if entrada.is_file() and not entrada.name.startswith("."):
+            info = entrada.stat()
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    preservados = {os.path.abspath(caminho) for caminho in preservar}
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite_bytes:
+            break
+        if os.path.abspath(caminho) in preservados:
+            continue
+        try:
+            os.unlink(caminho)
+            total -= tamanho
+        except FileNotFoundError:
+            pass
+
+
+def obter_exportacao(chave, formato, gerar_blocos, diretorio=DIRETORIO_EXPORTACOES,
+                     limite_bytes=LIMITE_BYTES_EXPORTACOES):
+    """
+    Devolve o arquivo exportado, gerando-o (escrita temporária + rename) se ainda não existir.
+
+    Args:
+        chave (str): Chave de `chave_exportacao`
+        formato (str): Uma das chaves de FORMATOS_EXPORTACAO
+        gerar_blocos (Callable[[], Iterable[pd.DataFrame]]): Produz os blocos pontuados
+
+    Returns:
+        str: Caminho do arquivo
+
+    Raises:
+        ValueError: Se o formato não for suportado
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação não suportado: {formato}")
+    destino = caminho_exportacao(chave, formato, diretorio)
+    if os.path.exists(destino):
+        os.utime(destino)
+        return destino
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix=".tmp-")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            escrever_blocos(iterar_medido("pontuacao", gerar_blocos()), formato, arquivo)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+    limitar_exportacoes(diretorio, limite_bytes, preservar=(destino,))
+    return destino
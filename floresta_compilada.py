@@ -0,0 +1,211 @@
+"""
+Floresta aleatória compilada em vetores planos (Modelo 2)
+
+O `RandomForestClassifier` treinado é convertido em uma estrutura de
+vetores (um nó por posição, todas as árvores concatenadas):
+
+- `feature` (int16): feature testada no nó
+- `limiar` (float32): o nó vai para a esquerda se `x <= limiar`
+- `esquerda` (int32): índice global do filho esquerdo; o direito é o seguinte
+- `valor` (float32): probabilidade da classe 1 (só usada nas folhas)
+
+Os nós são renumerados em largura para que os dois filhos fiquem lado a
+lado (`filho = esquerda[no] + (x > limiar[no])`), e as folhas apontam para
+si mesmas com limiar infinito: todas as árvores são percorridas juntas, por
+`profundidade` passos, com operações vetorizadas do NumPy sobre um bloco de
+árvores × linhas. O arquivo é um Arrow IPC sem compressão, mapeado em
+memória na carga (sem desserializar o objeto do sklearn).
+
+Uso (conversão):
+    python floresta_compilada.py models/modelo_randomforest.pkl models/modelo_randomforest.arrow
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+
+# Linhas percorridas por vez (o estado temporário é árvores × linhas e deve caber no cache)
+LINHAS_BLOCO_FLORESTA = 512
+
+
+def _limiar_float32(limiares):
+    """
+    Limiares em float32 arredondados para baixo.
+
+    O sklearn compara `float32(x) <= limiar (float64)`; com o maior float32
+    que não passa do limiar a comparação em float32 dá exatamente o mesmo lado.
+    """
+    convertido = limiares.astype('float32')
+    acima = convertido.astype('float64') > limiares
+    convertido[acima] = np.nextafter(convertido[acima], np.float32(-np.inf))
+    return convertido
+
+
+def _renumerar_em_largura(filhos_esquerda, filhos_direita):
+    """
+    Ordem dos nós em largura, com os dois filhos de cada nó em posições consecutivas.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Nó original de cada nova posição e a nova
+        posição do filho esquerdo (a própria posição, nas folhas)
+    """
+    ordem = [0]
+    esquerda = []
+    for posicao, no in enumerate(ordem):
+        if filhos_esquerda[no] == -1:
+            esquerda.append(posicao)
+        else:
+            esquerda.append(len(ordem))
+            ordem.extend((filhos_esquerda[no], filhos_direita[no]))
+    return np.asarray(ordem), np.asarray(esquerda)
+
+
+def compilar_floresta(modelo):
+    """
+    Converte um RandomForestClassifier binário treinado na tabela Arrow da floresta compilada.
+
+    Returns:
+        pa.Table: Colunas feature, limiar, esquerda e valor, com as raízes,
+        a profundidade e os nomes das features nos metadados
+
+    Raises:
+        ValueError: Se o modelo não for binário ou tiver features demais para int16
+    """
+    if len(modelo.classes_) != 2:
+        raise ValueError("Apenas classificadores binários podem ser compilados")
+    if modelo.n_features_in_ > np.iinfo('int16').max:
+        raise ValueError("Número de features acima do suportado (int16)")
+
+    partes = {'feature': [], 'limiar': [], 'esquerda': [], 'valor': []}
+    raizes = []
+    deslocamento = 0
+    for estimador in modelo.estimators_:
+        arvore = estimador.tree_
+        ordem, esquerda = _renumerar_em_largura(arvore.children_left, arvore.children_right)
+        folha = arvore.children_left[ordem] == -1
+        valores = arvore.value[ordem, 0, :]
+        raizes.append(deslocamento)
+        partes['feature'].append(np.where(folha, 0, arvore.feature[ordem]).astype('int16'))
+        partes['limiar'].append(np.where(folha, np.float32(np.inf), _limiar_float32(arvore.threshold[ordem])).astype('float32'))
+        partes['esquerda'].append((esquerda + deslocamento).astype('int32'))
+        partes['valor'].append((valores[:, 1] / valores.sum(axis=1)).astype('float32'))
+        deslocamento += arvore.node_count
+
+    metadados = {
+        'raizes': raizes,
+        'profundidade': max(estimador.tree_.max_depth for estimador in modelo.estimators_),
+        'n_features': int(modelo.n_features_in_),
+        'features': list(getattr(modelo, 'feature_names_in_', [])),
+        'classes': [c.item() if hasattr(c, 'item') else c for c in modelo.classes_],
+    }
+    return pa.table(
+        {nome: np.concatenate(valores) for nome, valores in partes.items()},
+        metadata={'floresta': json.dumps(metadados)},
+    )
+
+
+def salvar_floresta(tabela, destino):
+    """Grava a floresta compilada (Arrow IPC sem compressão, escrita atômica)"""
+    temporario = f"{destino}.tmp"
+    with pa.OSFile(temporario, 'wb') as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(temporario, destino)
+
+
+class FlorestaCompilada:
+    """
+    Inferência da floresta compilada, com a mesma interface de `predict_proba` do sklearn.
+
+    Args:
+        tabela (pa.Table): Tabela gerada por `compilar_floresta` (normalmente mapeada em memória)
+        linhas_bloco (int): Linhas percorridas por vez
+    """
+
+    def __init__(self, tabela, linhas_bloco=LINHAS_BLOCO_FLORESTA):
+        metadados = json.loads(tabela.schema.metadata[b'floresta'])
+        # Vetores sem cópia: apontam direto para o arquivo mapeado em memória
+        vetores = {nome: tabela.column(nome).chunk(0).to_numpy(zero_copy_only=True) for nome in tabela.column_names}
+        # Só `feature` é copiado, de int16 para o int32 usado no cálculo dos índices
+        self.feature = vetores['feature'].astype('int32')
+        self.limiar = vetores['limiar']
+        self.esquerda = vetores['esquerda']
+        self.valor = vetores['valor']
+        self.raizes = np.asarray(metadados['raizes'], dtype='int32')
+        self.profundidade = metadados['profundidade']
+        self.n_features_in_ = metadados['n_features']
+        self.feature_names_in_ = np.asarray(metadados['features'], dtype=object) if metadados['features'] else None
+        self.classes_ = np.asarray(metadados['classes'])
+        self.linhas_bloco = linhas_bloco
+
+    def _matriz(self, X):
+        """Features em float32, na ordem usada no treino"""
+        if self.feature_names_in_ is not None and hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)]
+        X = np.ascontiguousarray(np.asarray(X, dtype='float32'))
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Esperadas {self.n_features_in_} features, recebidas {X.shape[-1]}")
+        return X
+
+    def _probabilidade_bloco(self, X):
+        """Probabilidade da classe 1 de um bloco: todas as árvores avançam um nível por passo"""
+        linhas = len(X)
+        X_colunas = np.ascontiguousarray(X.T).ravel()
+        nos = np.repeat(self.raizes[:, None], linhas, axis=1)
+        coluna = np.arange(linhas, dtype='int32')
+        # Buffers reaproveitados a cada nível (np.take com `out` evita alocações)
+        indice = np.empty_like(nos)
+        valor_x = np.empty(nos.shape, dtype='float32')
+        limiar_no = np.empty(nos.shape, dtype='float32')
+        direita = np.empty(nos.shape, dtype=bool)
+        for _ in range(self.profundidade):
+            np.take(self.feature, nos, out=indice, mode='clip')
+            indice *= linhas
+            indice += coluna
+            np.take(X_colunas, indice, out=valor_x, mode='clip')
+            np.take(self.limiar, nos, out=limiar_no, mode='clip')
+            np.greater(valor_x, limiar_no, out=direita)
+            np.take(self.esquerda, nos, out=nos, mode='clip')
+            nos += direita
+        return np.take(self.valor, nos).sum(axis=0, dtype='float64') / len(self.raizes)
+
+    def predict_proba(self, X):
+        """Probabilidades (n, 2) das classes 0 e 1"""
+        X = self._matriz(X)
+        probabilidade = np.empty(len(X), dtype='float64')
+        for inicio in range(0, len(X), self.linhas_bloco):
+            probabilidade[inicio:inicio + self.linhas_bloco] = self._probabilidade_bloco(X[inicio:inicio + self.linhas_bloco])
+        return np.column_stack([1.0 - probabilidade, probabilidade])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+
+def carregar_floresta(caminho):
+    """
+    Carrega a floresta compilada mapeando o arquivo em memória.
+
+    Raises:
+        FileNotFoundError: Se o arquivo não existir
+    """
+    with pa.memory_map(caminho, 'r') as arquivo:
+        return FlorestaCompilada(pa.ipc.open_file(arquivo).read_all())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modelo', help='RandomForestClassifier treinado (.pkl via joblib)')
+    parser.add_argument('destino', help='Arquivo da floresta compilada (.arrow)')
+    args = parser.parse_args(argv)
+
+    import joblib
+
+    tabela = compilar_floresta(joblib.load(args.modelo))
+    salvar_floresta(tabela, args.destino)
+    print(f"{tabela.num_rows} nós gravados em {args.destino} "
+          f"({os.path.getsize(args.destino) / 1024:,.0f} KiB; original {os.path.getsize(args.modelo) / 1024:,.0f} KiB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Índice ordenado de probabilidades de compra para o Modelo 2
+
+As probabilidades são calculadas uma única vez por dataset e modelo e
+guardadas como histogramas acumulados em faixas de 1/DIVISOES_PROBABILIDADE:
+um global (quantidade e soma das probabilidades) e um por marca, categoria e
+dia da semana, com chave (código da classe, faixa) ordenada. Para qualquer
+limiar, contagens de conversão, precisão e cobertura saem de buscas binárias
+nesses vetores, sem voltar às linhas nem chamar o modelo novamente. A
+memória depende do número de faixas e de classes, não do número de sessões.
+
+Limiares múltiplos de 1/DIVISOES_PROBABILIDADE (como os do slider da página)
+dão exatamente as mesmas contagens que `probabilidade >= limiar`.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from modelos import CLASSE_BAIXO_POTENCIAL, CLASSE_CONVERSAO
+
+DIVISOES_PROBABILIDADE = 10_000
+_NUM_FAIXAS = DIVISOES_PROBABILIDADE + 1
+DIMENSOES_CONVERSAO = ['brand', 'main_category', 'weekday']
+
+
+class IndiceDimensao(NamedTuple):
+    """Chaves (código × _NUM_FAIXAS + faixa) ordenadas e quantidades acumuladas"""
+    chaves: np.ndarray
+    acumulado: np.ndarray
+    categorias: pd.Index
+
+
+class IndiceConversao(NamedTuple):
+    """Quantidade e soma das probabilidades acumuladas por faixa, e os índices por dimensão"""
+    quantidade_acumulada: np.ndarray
+    soma_acumulada: np.ndarray
+    dimensoes: dict
+
+
+class ParcialConversao(NamedTuple):
+    """Histogramas de um bloco (mescláveis), antes do acúmulo"""
+    quantidade: np.ndarray
+    soma: np.ndarray
+    dimensoes: dict
+
+
+class ContagensConversao(NamedTuple):
+    contagem_classificacao: pd.Series
+    marcas_conversao: pd.Series
+    categorias_conversao: pd.Series
+    dias_classificacao: pd.Series
+
+
+def faixa_probabilidade(probabilidades):
+    """Faixa (0 .. DIVISOES_PROBABILIDADE) de cada probabilidade"""
+    faixas = np.floor(np.asarray(probabilidades, dtype='float64') * DIVISOES_PROBABILIDADE)
+    return np.clip(faixas, 0, DIVISOES_PROBABILIDADE).astype('int64')
+
+
+def _faixa_limiar(limiar):
+    """Primeira faixa considerada conversão para o limiar informado"""
+    return int(np.clip(np.ceil(round(limiar * DIVISOES_PROBABILIDADE, 6)), 0, _NUM_FAIXAS))
+
+
+def histograma_bloco(probabilidades, decodificado):
+    """
+    Histogramas de um bloco: global e por (classe, faixa) de cada dimensão decodificada.
+
+    Args:
+        probabilidades (np.ndarray): Probabilidade de compra de cada sessão
+        decodificado (pd.DataFrame): Colunas categóricas de DIMENSOES_CONVERSAO
+
+    Returns:
+        ParcialConversao: Histogramas do bloco
+    """
+    faixas = faixa_probabilidade(probabilidades)
+    dimensoes = {}
+    for dimensao in DIMENSOES_CONVERSAO:
+        codigos = decodificado[dimensao].cat.codes.to_numpy().astype('int64')
+        validos = codigos >= 0
+        chaves, quantidades = np.unique(codigos[validos] * _NUM_FAIXAS + faixas[validos], return_counts=True)
+        dimensoes[dimensao] = (pd.Series(quantidades, index=chaves), decodificado[dimensao].cat.categories)
+    return ParcialConversao(
+        np.bincount(faixas, minlength=_NUM_FAIXAS),
+        np.bincount(faixas, weights=probabilidades, minlength=_NUM_FAIXAS),
+        dimensoes,
+    )
+
+
+def mesclar_parciais(a, b):
+    """Soma os histogramas de dois blocos"""
+    if a is None:
+        return b
+    return ParcialConversao(
+        a.quantidade + b.quantidade,
+        a.soma + b.soma,
+        {
+            dimensao: (contagens.add(b.dimensoes[dimensao][0], fill_value=0), categorias)
+            for dimensao, (contagens, categorias) in a.dimensoes.items()
+        },
+    )
+
+
+def finalizar_indice(parcial):
+    """Acumula os histogramas mesclados no índice consultado pela página"""
+    dimensoes = {}
+    for dimensao, (contagens, categorias) in parcial.dimensoes.items():
+        contagens = contagens.sort_index()
+        dimensoes[dimensao] = IndiceDimensao(
+            contagens.index.to_numpy(dtype='int64'),
+            np.concatenate([[0], np.cumsum(contagens.to_numpy(dtype='int64'))]),
+            categorias,
+        )
+    return IndiceConversao(
+        np.concatenate([[0], np.cumsum(parcial.quantidade)]),
+        np.concatenate([[0.0], np.cumsum(parcial.soma)]),
+        dimensoes,
+    )
+
+
+def _acima_do_limiar(indice_dimensao, faixa):
+    """Quantidade de sessões por classe da dimensão: total e com faixa >= `faixa`"""
+    base = np.arange(len(indice_dimensao.categorias), dtype='int64') * _NUM_FAIXAS
+    chaves, acumulado = indice_dimensao.chaves, indice_dimensao.acumulado
+    inicio = acumulado[np.searchsorted(chaves, base, side='left')]
+    corte = acumulado[np.searchsorted(chaves, base + faixa, side='left')]
+    fim = acumulado[np.searchsorted(chaves, base + _NUM_FAIXAS, side='left')]
+    return fim - inicio, fim - corte
+
+
+def total_sessoes(indice):
+    """Número de sessões indexadas"""
+    return int(indice.quantidade_acumulada[-1])
+
+
+def contagens_no_limiar(indice, limiar):
+    """
+    Contagens exibidas pela página para um limiar (O(classes × log n), sem reler as linhas).
+
+    Returns:
+        ContagensConversao: Sessões por classificação, marcas/categorias em
+        potencial conversão e classificação por dia da semana
+    """
+    faixa = _faixa_limiar(limiar)
+    total = total_sessoes(indice)
+    conversoes = int(total - indice.quantidade_acumulada[faixa])
+    contagem = pd.Series(
+        {CLASSE_BAIXO_POTENCIAL: total - conversoes, CLASSE_CONVERSAO: conversoes}, name='count'
+    ).rename_axis('classificacao')
+    contagem = contagem[contagem > 0]
+
+    por_dimensao = {}
+    for dimensao, indice_dimensao in indice.dimensoes.items():
+        totais, acima = _acima_do_limiar(indice_dimensao, faixa)
+        por_dimensao[dimensao] = pd.DataFrame(
+            {CLASSE_BAIXO_POTENCIAL: totais - acima, CLASSE_CONVERSAO: acima},
+            index=pd.Index(indice_dimensao.categorias.astype(str), name=dimensao),
+        )
+
+    def conversao(dimensao):
+        contagens = por_dimensao[dimensao][CLASSE_CONVERSAO].rename('count')
+        return contagens[contagens > 0].sort_values(ascending=False, kind='stable')
+
+    dias = por_dimensao['weekday'].rename_axis(columns='classificacao').stack().rename('count')
+    return ContagensConversao(contagem, conversao('brand'), conversao('main_category'), dias[dias > 0])
+
+
+def curva_limiar(indice, limiares):
+    """
+    Cobertura, precisão e recall esperados para cada limiar.
+
+    Sem rótulos reais, a precisão esperada é a probabilidade média das
+    sessões selecionadas e o recall esperado é a fração da soma das
+    probabilidades (conversões esperadas) capturada pelo limiar.
+
+    Returns:
+        pd.DataFrame: limiar, sessoes_selecionadas, cobertura, precisao_esperada e recall_esperado
+    """
+    faixas = np.array([_faixa_limiar(limiar) for limiar in limiares])
+    total = indice.quantidade_acumulada[-1]
+    soma_total = indice.soma_acumulada[-1]
+    selecionadas = total - indice.quantidade_acumulada[faixas]
+    soma_selecionada = soma_total - indice.soma_acumulada[faixas]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({
+            'limiar': np.asarray(limiares, dtype='float64'),
+            'sessoes_selecionadas': selecionadas.astype(int),
+            'cobertura': selecionadas / total if total else np.nan,
+            'precisao_esperada': np.where(selecionadas > 0, soma_selecionada / np.maximum(selecionadas, 1), np.nan),
+            'recall_esperado': soma_selecionada / soma_total if soma_total else np.nan,
+        })
@@ -0,0 +1,330 @@
+"""
+Leitura de CSV em blocos com validação antecipada das colunas obrigatórias
+
+O parsing é feito pelo leitor CSV multithread do Arrow, aplicando o esquema
+de cada modelo (ver `modelos.ESQUEMAS`): apenas as colunas usadas são lidas,
+numéricas na precisão do arquivo (float64/int64) e colunas de texto como
+`category`. Valores que não podem ser convertidos viram `DadosInvalidosError`.
+As mesmas funções leem a cópia colunar (Arrow IPC/Feather) mantida por
+`cache_datasets`, mapeada em memória em vez de reprocessar o CSV.
+
+Os pontos de entrada (app, páginas, CLIs e benchmarks) chamam
+`ativar_copy_on_write` ao iniciar; importar este módulo não altera opções
+globais do pandas.
+"""
+import csv
+import functools
+import hashlib
+import io
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# Bytes de CSV por bloco: limita o pico de memória independentemente do tamanho do arquivo
+TAMANHO_BLOCO = 16 * 1024 * 1024
+# Linhas por bloco na leitura da cópia colunar (fatias dos lotes gravados)
+LINHAS_LOTE_COLUNAR = int(os.environ.get("COLUMNAR_BATCH_ROWS", 131_072))
+_TAMANHO_LEITURA_HASH = 8 * 1024 * 1024
+EXTENSAO_COLUNAR = ".arrow"
+# Mensagem de conversão do leitor CSV do Arrow (a coluna é a posição no cabeçalho, a partir de 0)
+_ERRO_CONVERSAO = re.compile(
+    r"In CSV column #(\d+): (?:Row #(\d+): )?CSV conversion error to (\w+): invalid value '(.*)'", re.S
+)
+
+
+def ativar_copy_on_write():
+    """
+    Liga o copy-on-write do pandas no processo.
+
+    Com ele, colunas novas (`assign`, `concat(axis=1)`), conversões de parte
+    das colunas (`astype`) e seleções de colunas compartilham os buffers do
+    bloco em vez de copiá-lo por inteiro. Vetores obtidos com `to_numpy()`
+    sem conversão de tipo passam a ser somente leitura. Os blocos produzidos
+    aqui funcionam (com mais cópias) também sem a opção.
+    """
+    pd.set_option("mode.copy_on_write", True)
+
+
+_TIPOS_ARROW = {
+    'float32': pa.float32(),
+    'float64': pa.float64(),
+    'int32': pa.int32(),
+    'int64': pa.int64(),
+    'string': pa.string(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+}
+
+
+class ColunasFaltandoError(ValueError):
+    """O CSV não possui todas as colunas exigidas pelo modelo"""
+
+    def __init__(self, colunas_faltando):
+        self.colunas_faltando = list(colunas_faltando)
+        super().__init__(f"Colunas obrigatórias ausentes: {', '.join(self.colunas_faltando)}")
+
+
+class DadosInvalidosError(ValueError):
+    """O CSV possui valores que não podem ser convertidos para os tipos do esquema do modelo"""
+
+
+def _erro_leitura(erro, colunas):
+    """Traduz um erro de parsing do Arrow em `DadosInvalidosError`, com a coluna e o valor inválido"""
+    conversao = _ERRO_CONVERSAO.search(str(erro))
+    if conversao is None:
+        return DadosInvalidosError(f"Não foi possível ler o CSV: {erro}")
+    posicao, linha, tipo, valor = conversao.groups()
+    posicao = int(posicao)
+    coluna = colunas[posicao] if posicao < len(colunas) else f"#{posicao + 1}"
+    esperado = "números inteiros" if tipo.startswith("int") else "números"
+    onde = f" na linha {linha}" if linha else ""
+    return DadosInvalidosError(f"A coluna `{coluna}` deve conter apenas {esperado}; valor inválido{onde}: '{valor}'")
+
+
+def _traduzir_erros(lotes, colunas):
+    """Repassa os lotes do leitor CSV, traduzindo os erros de conversão (ver `_erro_leitura`)"""
+    try:
+        yield from lotes
+    except pa.ArrowInvalid as erro:
+        raise _erro_leitura(erro, colunas) from erro
+
+
+def _rebobinar(fonte):
+    """Volta arquivos enviados (file-like) ao início para permitir nova leitura"""
+    if hasattr(fonte, "seek"):
+        fonte.seek(0)
+    return fonte
+
+
+@functools.lru_cache(maxsize=64)
+def _hash_arquivo(caminho, tamanho, modificado_ns):
+    """SHA-256 de um arquivo em disco (memorizado por caminho, tamanho e data de modificação)"""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for parte in iter(lambda: arquivo.read(_TAMANHO_LEITURA_HASH), b""):
+            sha.update(parte)
+    return sha.hexdigest()
+
+
+def hash_conteudo(fonte):
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo, lendo-o em partes.
+
+    Para arquivos em disco o hash é memorizado enquanto o arquivo não muda,
+    evitando reler datasets grandes a cada execução da página.
+
+    Args:
+        fonte (str | file-like): Caminho do CSV ou arquivo enviado pelo usuário
+
+    Returns:
+        str: Hash hexadecimal do conteúdo
+    """
+    if not hasattr(fonte, "read"):
+        info = os.stat(fonte)
+        return _hash_arquivo(os.path.abspath(fonte), info.st_size, info.st_mtime_ns)
+    sha = hashlib.sha256()
+    _rebobinar(fonte)
+    for parte in iter(lambda: fonte.read(_TAMANHO_LEITURA_HASH), b""):
+        sha.update(parte)
+    _rebobinar(fonte)
+    return sha.hexdigest()
+
+
+def eh_colunar(fonte):
+    """Indica se a fonte é uma cópia colunar (Arrow IPC/Feather) do dataset"""
+    return isinstance(fonte, str) and fonte.endswith(EXTENSAO_COLUNAR)
+
+
+def ler_cabecalho(fonte):
+    """Lê apenas o cabeçalho (CSV) ou o esquema (colunar) e devolve os nomes das colunas"""
+    if eh_colunar(fonte):
+        with pa.memory_map(fonte, "r") as arquivo:
+            return pa.ipc.open_file(arquivo).schema.names
+    if hasattr(fonte, "read"):
+        _rebobinar(fonte)
+        linha = fonte.readline()
+        _rebobinar(fonte)
+    else:
+        with open(fonte, "rb") as arquivo:
+            linha = arquivo.readline()
+    if isinstance(linha, bytes):
+        linha = linha.decode("utf-8-sig")
+    return next(csv.reader(io.StringIO(linha)), [])
+
+
+def validar_colunas(colunas, colunas_necessarias):
+    """
+    Garante que todas as colunas obrigatórias estão presentes.
+
+    Raises:
+        ColunasFaltandoError: Se alguma coluna obrigatória estiver ausente
+    """
+    colunas_faltando = [col for col in colunas_necessarias if col not in colunas]
+    if colunas_faltando:
+        raise ColunasFaltandoError(colunas_faltando)
+
+
+def tipos_arrow(esquema, colunas):
+    """Tipo Arrow de cada coluna, na ordem do arquivo: os do esquema e texto para as demais"""
+    tipos = {coluna: pa.string() for coluna in colunas}
+    tipos.update({coluna: _TIPOS_ARROW[tipo] for coluna, tipo in esquema.items()})
+    return tipos
+
+
+def _opcoes_conversao(esquema, colunas, todas_colunas):
+    """
+    Opções do leitor Arrow: colunas lidas (usecols) e seus tipos.
+
+    As colunas fora do esquema são lidas como texto: inferido a partir do
+    primeiro bloco, o tipo de uma coluna vazia no início do arquivo e com
+    texto mais adiante falharia no meio da leitura (e mudaria de bloco
+    para bloco ou de shard para shard).
+    """
+    return pa_csv.ConvertOptions(
+        include_columns=None if todas_colunas else list(esquema),
+        column_types=tipos_arrow(esquema, colunas if todas_colunas else ()),
+    )
+
+
+def _para_pandas(tabela, esquema, liberar=False):
+    """
+    Converte Arrow -> pandas mantendo os tipos do esquema.
+
+    Colunas numéricas sem nulos são convertidas sem cópia (no caso colunar,
+    apontam direto para o arquivo mapeado em memória); as colunas `category`
+    do esquema viram pandas Categorical.
+    """
+    categorias = [coluna for coluna, tipo in esquema.items() if tipo == 'category']
+    return tabela.to_pandas(split_blocks=True, self_destruct=liberar, categories=categorias)
+
+
+def bloco_vazio(esquema):
+    """Bloco sem linhas com as colunas e os tipos do esquema (arquivo só com o cabeçalho)"""
+    tabela = pa.schema([(coluna, _TIPOS_ARROW[tipo]) for coluna, tipo in esquema.items()]).empty_table()
+    return _para_pandas(tabela, esquema)
+
+
+def ler_csv_tipado(fonte, esquema, todas_colunas=False):
+    """
+    Lê o CSV completo com o leitor multithread do Arrow aplicando o esquema.
+
+    Args:
+        fonte (str | file-like): Caminho do CSV ou arquivo enviado pelo usuário
+        esquema (dict[str, str]): Coluna -> tipo ('float64', 'int64', 'string', 'category', ...)
+        todas_colunas (bool): Se True, lê também as colunas fora do esquema (como texto)
+
+    Returns:
+        pd.DataFrame: Dados com os tipos do esquema
+
+    Raises:
+        ColunasFaltandoError: Se alguma coluna do esquema estiver ausente
+        DadosInvalidosError: Se algum valor não puder ser convertido para o tipo da coluna
+    """
+    colunas = ler_cabecalho(fonte)
+    validar_colunas(colunas, esquema)
+    try:
+        tabela = pa_csv.read_csv(
+            _rebobinar(fonte),
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            convert_options=_opcoes_conversao(esquema, colunas, todas_colunas),
+        )
+    except pa.ArrowInvalid as erro:
+        raise _erro_leitura(erro, colunas) from erro
+    finally:
+        _rebobinar(fonte)
+    return _para_pandas(tabela, esquema, liberar=True)
+
+
+def ler_lotes_arrow(fonte, esquema, tamanho_bloco=TAMANHO_BLOCO, todas_colunas=False):
+    """
+    Lê o CSV (ou a cópia colunar) como lotes Arrow, validando as colunas na chamada.
+
+    Returns:
+        Iterator[pa.RecordBatch]: Lotes de aproximadamente `tamanho_bloco` bytes de CSV
+
+    Raises:
+        ColunasFaltandoError: Se alguma coluna obrigatória estiver ausente
+        DadosInvalidosError: Se algum valor não puder ser convertido para o tipo da coluna
+            (no primeiro bloco, na chamada; nos seguintes, durante a iteração)
+    """
+    colunas = ler_cabecalho(fonte)
+    validar_colunas(colunas, esquema)
+    if eh_colunar(fonte):
+        return _lotes_colunares(fonte, None if todas_colunas else list(esquema))
+    try:
+        leitor = pa_csv.open_csv(
+            _rebobinar(fonte),
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=tamanho_bloco),
+            convert_options=_opcoes_conversao(esquema, colunas, todas_colunas),
+        )
+    except pa.ArrowInvalid as erro:
+        raise _erro_leitura(erro, colunas) from erro
+    return _traduzir_erros(leitor, colunas)
+
+
+def _lotes_colunares(caminho, colunas, linhas_lote=LINHAS_LOTE_COLUNAR):
+    """
+    Percorre os lotes do arquivo Arrow IPC mapeado em memória (sem cópia).
+
+    Os lotes gravados (16 MiB de CSV cada) são fatiados em até `linhas_lote`
+    linhas: a fatia é só uma vista do arquivo, e os vetores intermediários de
+    cada bloco (pontuação, decodificação, agregação) passam a ter um tamanho
+    fixo, em vez de uma fração do arquivo.
+    """
+    with pa.memory_map(caminho, "r") as arquivo:
+        leitor = pa.ipc.open_file(arquivo)
+        for i in range(leitor.num_record_batches):
+            lote = leitor.get_batch(i)
+            if colunas is not None:
+                lote = lote.select(colunas)
+            for inicio in range(0, lote.num_rows, linhas_lote):
+                yield lote.slice(inicio, linhas_lote)
+
+
+def ler_csv_em_blocos(fonte, esquema, tamanho_bloco=TAMANHO_BLOCO, todas_colunas=False):
+    """
+    Lê um CSV (ou sua cópia colunar em cache) em blocos tipados.
+
+    A validação das colunas acontece na chamada (e não na primeira
+    iteração), de forma que arquivos inválidos falham antes de qualquer
+    processamento.
+
+    Args:
+        fonte (str | file-like): Caminho do CSV/arquivo colunar ou arquivo enviado pelo usuário
+        esquema (dict[str, str]): Colunas exigidas pelo modelo e seus tipos
+        tamanho_bloco (int): Tamanho aproximado de cada bloco, em bytes de CSV
+        todas_colunas (bool): Se True, mantém também as colunas fora do esquema
+
+    Returns:
+        Iterator[pd.DataFrame]: Blocos tipados, com índice contínuo entre blocos
+
+    Raises:
+        ColunasFaltandoError: Se alguma coluna obrigatória estiver ausente
+        DadosInvalidosError: Se algum valor não puder ser convertido para o tipo da coluna
+    """
+    lotes = ler_lotes_arrow(fonte, esquema, tamanho_bloco, todas_colunas)
+    liberar = not eh_colunar(fonte)
+
+    def blocos():
+        inicio = 0
+        for lote in lotes:
+            bloco = _para_pandas(pa.Table.from_batches([lote]), esquema, liberar)
+            bloco.index = pd.RangeIndex(inicio, inicio + len(bloco))
+            inicio += len(bloco)
+            yield bloco
+
+    return blocos()
+
+
+def ler_amostra(fonte, linhas=5):
+    """Lê apenas as primeiras linhas do dataset (para a pré-visualização dos dados)"""
+    if eh_colunar(fonte):
+        primeiro_lote = next(_lotes_colunares(fonte, None), None)
+        if primeiro_lote is None:
+            return pd.DataFrame()
+        return primeiro_lote.slice(0, linhas).to_pandas()
+    amostra = pd.read_csv(_rebobinar(fonte), nrows=linhas)
+    _rebobinar(fonte)
+    return amostra
@@ -0,0 +1,33 @@
+"""
+Inicia o dashboard com os modelos aquecidos em segundo plano
+
+Dispara `aquecimento.iniciar_aquecimento` (carregamento e validação dos
+modelos e encoders e import do Plotly, em uma thread) e, no mesmo processo,
+sobe o servidor Streamlit com `app.py`. Enquanto o servidor abre a porta e
+espera a primeira conexão, os artefatos já estão sendo carregados.
+
+Uso (as opções são repassadas ao `streamlit run`):
+    python iniciar_servidor.py --server.port 8501
+"""
+import os
+import sys
+
+from aquecimento import iniciar_aquecimento
+from ingestao import ativar_copy_on_write
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None):
+    argumentos = sys.argv[1:] if argv is None else argv
+    # O Streamlit (que importa o Plotly) vem antes da thread de aquecimento
+    from streamlit.web import cli
+
+    ativar_copy_on_write()
+    iniciar_aquecimento()
+    sys.argv = ["streamlit", "run", os.path.join(RAIZ_PROJETO, "app.py"), *argumentos]
+    return cli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Instrumentação das etapas das páginas: tempo, CPU, memória e linhas
+
+Cada execução de página abre um coletor (`iniciar_coleta`) e marca suas
+etapas com o gerenciador de contexto `etapa` (ou o decorador `medido`).
+Etapas aninhadas ganham o nome do caminho (`processamento/pontuacao`) e
+etapas repetidas (uma por bloco) são somadas. Os pipelines usam as mesmas
+marcações; fora de uma página (scripts, servidor) elas não fazem nada.
+
+Para cada etapa são registrados:
+
+- tempo de parede e CPU da thread da sessão (`time.thread_time`, sem as
+  threads internas do Arrow/NumPy);
+- pico de memória rastreada pelo `tracemalloc`, apenas com
+  `STAGE_TRACE_MEMORY=1` (o rastreamento é global: com várias sessões
+  simultâneas, o pico inclui as alocações das outras sessões);
+- linhas processadas.
+
+Ao fim de cada etapa de primeiro nível, as medições são emitidas como uma
+linha JSON por etapa no logger `instrumentacao` (desligável com
+`STAGE_LOG=0`), e `painel_diagnostico` as exibe na barra lateral.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+LOG_ETAPAS = os.environ.get("STAGE_LOG", "1") != "0"
+RASTREAR_MEMORIA = os.environ.get("STAGE_TRACE_MEMORY", "0") == "1"
+
+logger = logging.getLogger("instrumentacao")
+if not logger.handlers:
+    _saida = logging.StreamHandler(sys.stderr)
+    _saida.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_saida)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+if RASTREAR_MEMORIA and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+@dataclass
+class MedicaoEtapa:
+    etapa: str
+    chamadas: int = 0
+    linhas: int = 0
+    segundos: float = 0.0
+    cpu_segundos: float = 0.0
+    pico_bytes: int | None = None
+
+
+@dataclass
+class _Quadro:
+    """Etapa em execução (o chamador pode preencher `linhas`)"""
+    nome: str
+    linhas: int | None = None
+    base_memoria: int = 0
+    pico_absoluto: int = 0
+
+
+class ColetorEtapas:
+    """Medições de uma execução de página, por caminho da etapa"""
+
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.medicoes = {}
+        self._pilha = []
+        self._pendentes = {}
+
+    def tabela(self):
+        """
+        Returns:
+            pd.DataFrame: etapa, chamadas, linhas, segundos, cpu_segundos e pico_bytes
+        """
+        import pandas as pd
+
+        colunas = ["etapa", "chamadas", "linhas", "segundos", "cpu_segundos", "pico_bytes"]
+        return pd.DataFrame([asdict(medicao) for medicao in self.medicoes.values()], columns=colunas)
+
+    def _emitir(self):
+        if LOG_ETAPAS:
+            for medicao in self._pendentes.values():
+                logger.info(json.dumps({"evento": "etapa", "pagina": self.pagina, **asdict(medicao)}))
+        self._pendentes.clear()
+
+
+_coletor = contextvars.ContextVar("coletor_etapas", default=None)
+
+
+def iniciar_coleta(pagina):
+    """Abre o coletor da execução atual da página (substitui o da execução anterior na mesma thread)"""
+    coletor = ColetorEtapas(pagina)
+    _coletor.set(coletor)
+    return coletor
+
+
+@contextlib.contextmanager
+def etapa(nome, linhas=None):
+    """
+    Mede uma etapa da execução atual (sem coletor ativo, não faz nada).
+
+    Args:
+        nome (str): Nome da etapa (aninhada, vira `pai/nome`)
+        linhas (int | None): Linhas processadas; também pode ser definido em `quadro.linhas`
+
+    Yields:
+        _Quadro | None: Quadro da etapa, ou None sem coletor ativo
+    """
+    coletor = _coletor.get()
+    if coletor is None:
+        yield None
+        return
+    quadro = _Quadro(nome, linhas)
+    if RASTREAR_MEMORIA:
+        atual, pico = tracemalloc.get_traced_memory()
+        if coletor._pilha:
+            pai = coletor._pilha[-1]
+            pai.pico_absoluto = max(pai.pico_absoluto, pico)
+        tracemalloc.reset_peak()
+        quadro.base_memoria = quadro.pico_absoluto = atual
+    caminho = "/".join([q.nome for q in coletor._pilha] + [nome])
+    coletor._pilha.append(quadro)
+    inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield quadro
+    finally:
+        segundos, cpu = time.perf_counter() - inicio, time.thread_time() - inicio_cpu
+        coletor._pilha.pop()
+        medicao = coletor.medicoes.setdefault(caminho, MedicaoEtapa(caminho))
+        medicao.chamadas += 1
+        medicao.linhas += quadro.linhas or 0
+        medicao.segundos += segundos
+        medicao.cpu_segundos += cpu
+        if RASTREAR_MEMORIA:
+            _, pico = tracemalloc.get_traced_memory()
+            quadro.pico_absoluto = max(quadro.pico_absoluto, pico)
+            medicao.pico_bytes = max(medicao.pico_bytes or 0, quadro.pico_absoluto - quadro.base_memoria)
+            if coletor._pilha:
+                pai = coletor._pilha[-1]
+                pai.pico_absoluto = max(pai.pico_absoluto, quadro.pico_absoluto)
+        coletor._pendentes[caminho] = medicao
+        if not coletor._pilha:
+            coletor._emitir()
+
+
+def medido(nome):
+    """Decorador: mede cada chamada da função como a etapa `nome`"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with etapa(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def iterar_medido(nome, iteravel):
+    """Mede cada `next()` do iterável como a etapa `nome` (linhas = tamanho de cada item)"""
+    iterador = iter(iteravel)
+    while True:
+        with etapa(nome) as quadro:
+            item = next(iterador, None)
+            if item is not None and quadro is not None:
+                quadro.linhas = len(item)
+        if item is None:
+            return
+        yield item
+
+
+def painel_diagnostico(coletor):
+    """Tabela de etapas da execução atual na barra lateral"""
+    import streamlit as st
+
+    with st.sidebar.expander(":material/speed: Diagnóstico de Desempenho", expanded=True):
+        tabela = coletor.tabela()
+        if tabela.empty:
+            st.caption("Nenhuma etapa medida nesta execução.")
+            return
+        tabela["pico_mib"] = tabela.pop("pico_bytes") / 1024 ** 2
+        st.dataframe(
+            tabela,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "segundos": st.column_config.NumberColumn("tempo (s)", format="%.3f"),
+                "cpu_segundos": st.column_config.NumberColumn("CPU (s)", format="%.3f"),
+                "pico_mib": st.column_config.NumberColumn("pico (MiB)", format="%.1f"),
+            },
+        )
+        if not RASTREAR_MEMORIA:
+            st.caption("Memória não rastreada (defina STAGE_TRACE_MEMORY=1).")
@@ -0,0 +1,305 @@
+"""
+Features, carregamento e funções de predição compartilhados pelos três modelos
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cubo_precos import STATUS_FORA, STATUS_NORMAL
+from floresta_compilada import carregar_floresta
+
+RAIZ_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+CAMINHO_KMEANS = os.path.join(RAIZ_PROJETO, "models", "modelo_kmeans.pkl")
+CAMINHO_RANDOMFOREST = os.path.join(RAIZ_PROJETO, "models", "modelo_randomforest.pkl")
+# Floresta compilada por `floresta_compilada.py` (preferida quando existe)
+CAMINHO_FLORESTA_COMPILADA = os.path.join(RAIZ_PROJETO, "models", "modelo_randomforest.arrow")
+CAMINHO_REGLOG = os.path.join(RAIZ_PROJETO, "models", "modelo_reglog.pkl")
+CAMINHOS_ENCODERS = {
+    "le_main_category": os.path.join(RAIZ_PROJETO, "encoders", "le_main_category.pkl"),
+    "le_brand": os.path.join(RAIZ_PROJETO, "encoders", "le_brand.pkl"),
+    "le_weekday": os.path.join(RAIZ_PROJETO, "encoders", "le_weekday.pkl"),
+}
+
+# ===============================
+# Modelo 1 - Clusterização (K-Means)
+# ===============================
+FEATURES_CLUSTER = ["total_spent", "frequency", "recency_days"]
+ESQUEMA_MODELO_1 = {
+    "user_id": "int64",
+    "total_spent": "float64",
+    "frequency": "int64",
+    "recency_days": "int64",
+}
+COLUNAS_MODELO_1 = list(ESQUEMA_MODELO_1)
+# Linhas por sub-bloco na atribuição de clusters (limita as matrizes temporárias em float32)
+LINHAS_BLOCO_CLUSTERS = 65_536
+
+# ===============================
+# Modelo 2 - Probabilidade de Compra
+# ===============================
+FEATURES_CONVERSAO = [
+    "price", "brand_encoded", "main_category_encoded", "sub_category_encoded",
+    "hour", "weekday_encoded", "add_to_cart_count", "views_count"
+]
+ESQUEMA_MODELO_2 = {
+    "price": "float64",
+    "brand_encoded": "int64",
+    "main_category_encoded": "int64",
+    "sub_category_encoded": "int64",
+    "hour": "int64",
+    "weekday_encoded": "int64",
+    "add_to_cart_count": "int64",
+    "views_count": "int64",
+}
+COLUNAS_MODELO_2 = list(ESQUEMA_MODELO_2)
+LIMIAR_CONVERSAO = 0.3
+# Coluna decodificada -> (coluna com o código, encoder)
+COLUNAS_CODIFICADAS = {
+    'brand': ('brand_encoded', 'le_brand'),
+    'main_category': ('main_category_encoded', 'le_main_category'),
+    'weekday': ('weekday_encoded', 'le_weekday'),
+}
+CLASSE_CONVERSAO = "Potencial Conversão"
+CLASSE_BAIXO_POTENCIAL = "Baixo Potencial"
+
+# ===============================
+# Modelo 3 - Preços fora do Padrão
+# ===============================
+FEATURES_PRECOS = ['price', 'price_ratio_cat']
+ESQUEMA_MODELO_3 = {
+    'price': 'float64',
+    'price_ratio_cat': 'float64',
+    'main_category': 'category',
+    'brand': 'category',
+}
+COLUNAS_MODELO_3 = list(ESQUEMA_MODELO_3)
+STATUS_PRECO = {
+    0: STATUS_NORMAL,
+    1: STATUS_FORA
+}
+
+# ===============================
+# Registro de esquemas (colunas lidas e seus tipos, na precisão do arquivo: as colunas
+# voltam iguais na exportação; a conversão para float32 do K-Means e da floresta
+# acontece só dentro das funções de predição)
+# ===============================
+ESQUEMAS = {
+    "modelo_1": ESQUEMA_MODELO_1,
+    "modelo_2": ESQUEMA_MODELO_2,
+    "modelo_3": ESQUEMA_MODELO_3,
+}
+
+
+# ===============================
+# Carregamento dos modelos
+# ===============================
+def carregar_kmeans(path=CAMINHO_KMEANS, mmap_mode=None):
+    """
+    Carrega o artefato de clusterização (.pkl via joblib): Pipeline com as etapas
+    `scaler` (StandardScaler) e `kmeans` (KMeans), gerado por `empacotar_kmeans.py`.
+
+    Com `mmap_mode` (ex.: 'r'), os arrays do artefato são mapeados em memória em vez de copiados.
+
+    Raises:
+        FileNotFoundError: Se o arquivo do modelo não existir
+        ValueError: Se o arquivo contiver apenas o K-Means, sem o escalonamento
+    """
+    import joblib
+
+    model = joblib.load(path, mmap_mode=mmap_mode)
+    if not hasattr(model, 'named_steps') or not {'scaler', 'kmeans'} <= set(model.named_steps):
+        raise ValueError(f"{path} não contém o escalonamento; gere o artefato com empacotar_kmeans.py")
+    return model
+
+
+def caminho_modelo_conversao():
+    """Caminho da floresta compilada, se existir; senão o do RandomForest do sklearn"""
+    if os.path.exists(CAMINHO_FLORESTA_COMPILADA):
+        return CAMINHO_FLORESTA_COMPILADA
+    return CAMINHO_RANDOMFOREST
+
+
+def carregar_assets_conversao(model_path=None, encoder_paths=CAMINHOS_ENCODERS, mmap_mode=None):
+    """
+    Carrega o modelo de classificação e os encoders (.pkl via joblib).
+
+    O modelo é a floresta compilada (`.arrow`, mapeada em memória) ou o
+    RandomForest do sklearn (`.pkl`); por padrão, o de `caminho_modelo_conversao`.
+    `mmap_mode` é repassado ao joblib na carga dos `.pkl`.
+
+    As classes de cada encoder são convertidas uma única vez em tipos
+    categóricos (`assets['categorias']`), usados na decodificação.
+
+    Returns:
+        dict: Modelo em 'model', cada encoder pelo nome e os tipos categóricos em 'categorias'
+
+    Raises:
+        FileNotFoundError: Se algum dos arquivos não existir
+    """
+    import joblib
+
+    model_path = model_path or caminho_modelo_conversao()
+    if model_path.endswith(".arrow"):
+        assets = {'model': carregar_floresta(model_path)}
+    else:
+        assets = {'model': joblib.load(model_path, mmap_mode=mmap_mode)}
+    for name, path in encoder_paths.items():
+        assets[name] = joblib.load(path, mmap_mode=mmap_mode)
+    assets['categorias'] = {
+        coluna: pd.CategoricalDtype(assets[encoder].classes_)
+        for coluna, (_, encoder) in COLUNAS_CODIFICADAS.items()
+        if encoder in assets
+    }
+    return assets
+
+
+def carregar_reglog(path=CAMINHO_REGLOG, mmap_mode=None):
+    """
+    Carrega o modelo de regressão logística (.pkl via joblib, que também lê pickles comuns).
+
+    Raises:
+        FileNotFoundError: Se o arquivo do modelo não existir
+    """
+    import joblib
+
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+# ===============================
+# Predição
+# ===============================
+def parametros_clusterizacao(kmeans_pipeline):
+    """
+    Extrai do artefato o escalonamento e os centroides, em float32.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Média (d,), inverso do desvio (d,) e centroides (k, d)
+    """
+    scaler = kmeans_pipeline.named_steps['scaler']
+    kmeans = kmeans_pipeline.named_steps['kmeans']
+    return (
+        scaler.mean_.astype('float32'),
+        (1.0 / scaler.scale_).astype('float32'),
+        kmeans.cluster_centers_.astype('float32'),
+    )
+
+
+def atribuir_clusters(df, kmeans_pipeline, linhas_bloco=LINHAS_BLOCO_CLUSTERS):
+    """
+    Atribui o cluster de cada cliente (centroide mais próximo no espaço padronizado).
+
+    O escalonamento vem do próprio artefato, então o rótulo de um cliente não
+    depende do lote em que ele chega. O cálculo é feito em float32, em
+    sub-blocos de `linhas_bloco` linhas, acumulando a menor distância
+    centroide a centroide: a matriz n × k de distâncias nunca é criada.
+
+    Args:
+        df (pd.DataFrame): Dados com as colunas de FEATURES_CLUSTER
+        kmeans_pipeline: Artefato carregado por `carregar_kmeans`
+        linhas_bloco (int): Linhas processadas por vez
+
+    Returns:
+        np.ndarray: Cluster (int32) de cada linha
+    """
+    media, inverso_desvio, centroides = parametros_clusterizacao(kmeans_pipeline)
+    X = df[FEATURES_CLUSTER].to_numpy(dtype='float32')
+    clusters = np.empty(len(X), dtype='int32')
+    for inicio in range(0, len(X), linhas_bloco):
+        bloco = (X[inicio:inicio + linhas_bloco] - media) * inverso_desvio
+        menor = np.full(len(bloco), np.inf, dtype='float32')
+        melhor = clusters[inicio:inicio + linhas_bloco]
+        melhor[:] = 0
+        for k, centroide in enumerate(centroides):
+            diferenca = bloco - centroide
+            distancia = np.einsum('ij,ij->i', diferenca, diferenca)
+            mais_perto = distancia < menor
+            menor[mais_perto] = distancia[mais_perto]
+            melhor[mais_perto] = k
+    return clusters
+
+
+def probabilidades_conversao(df, classification_model):
+    """Probabilidade de compra (classe 1) de cada sessão (o modelo converte as features para float32)"""
+    return classification_model.predict_proba(df[FEATURES_CONVERSAO])[:, 1]
+
+
+def prever_conversao(df, classification_model, threshold=LIMIAR_CONVERSAO):
+    """
+    Calcula a probabilidade de compra e a classificação de cada sessão.
+
+    Returns:
+        pd.DataFrame: Colunas `prob_compra`, `predicao` e `classificacao`
+    """
+    y_probs = probabilidades_conversao(df, classification_model)
+    predicao = (y_probs >= threshold).astype(int)
+    return pd.DataFrame({
+        'prob_compra': y_probs,
+        'predicao': predicao,
+        'classificacao': np.where(predicao == 1, CLASSE_CONVERSAO, CLASSE_BAIXO_POTENCIAL),
+    }, index=df.index)
+
+
+def _codigos(df, coluna_codigo):
+    """Códigos inteiros da coluna (valores não numéricos/nulos viram -1)"""
+    return pd.to_numeric(df[coluna_codigo], errors='coerce').fillna(-1).to_numpy(dtype='int64')
+
+
+def decodificar_categorias(df, assets):
+    """
+    Decodifica marca, categoria e dia da semana para Categorical a partir dos códigos.
+
+    Os códigos inteiros são usados diretamente como códigos do Categorical (as
+    classes de cada encoder são compartilhadas, sem criar strings por linha).
+    Códigos fora do intervalo das classes viram nulos; use `codigos_invalidos`
+    para localizá-los.
+
+    Returns:
+        pd.DataFrame: Colunas `brand`, `main_category` e `weekday` (category)
+    """
+    decodificado = {}
+    for coluna, (coluna_codigo, _) in COLUNAS_CODIFICADAS.items():
+        tipo = assets['categorias'][coluna]
+        codigos = _codigos(df, coluna_codigo)
+        # Novo vetor: com copy-on-write, o de `_codigos` pode ser a própria coluna (somente leitura)
+        codigos = np.where((codigos < 0) | (codigos >= len(tipo.categories)), -1, codigos).astype('int32')
+        decodificado[coluna] = pd.Categorical.from_codes(codigos, dtype=tipo)
+    return pd.DataFrame(decodificado, index=df.index)
+
+
+def codigos_invalidos(df, assets):
+    """
+    Linhas cujos códigos não correspondem a nenhuma classe do encoder.
+
+    Returns:
+        pd.DataFrame: Colunas `coluna`, `linha` (índice da linha) e `codigo`
+    """
+    partes = []
+    for coluna, (coluna_codigo, _) in COLUNAS_CODIFICADAS.items():
+        codigos = _codigos(df, coluna_codigo)
+        invalidos = (codigos < 0) | (codigos >= len(assets['categorias'][coluna].categories))
+        if invalidos.any():
+            partes.append(pd.DataFrame({
+                'coluna': coluna_codigo,
+                'linha': df.index[invalidos],
+                'codigo': df[coluna_codigo].to_numpy()[invalidos],
+            }))
+    if not partes:
+        return pd.DataFrame({'coluna': pd.Series(dtype=object), 'linha': pd.Series(dtype='int64'), 'codigo': pd.Series(dtype=object)})
+    return pd.concat(partes, ignore_index=True)
+
+
+def classificar_precos(df, model):
+    """
+    Classifica os preços como normais (0) ou fora do padrão (1).
+
+    Returns:
+        pd.DataFrame: Colunas `classificacao` e `status_preco`
+    """
+    # O sklearn não aceita zero linhas (bloco de um arquivo só com o cabeçalho)
+    classificacao = model.predict(df[FEATURES_PRECOS]) if len(df) else np.empty(0, dtype='int64')
+    return pd.DataFrame({
+        'classificacao': classificacao,
+        'status_preco': pd.Series(classificacao, index=df.index).map(STATUS_PRECO),
+    }, index=df.index)
@@ -1,13 +1,20 @@
-from sklearn.preprocessing import StandardScaler
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import joblib
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utils import formatar_moeda, formatar_numero
+from ingestao import ColunasFaltandoError, ativar_copy_on_write, hash_conteudo, ler_amostra, ler_cabecalho
+from cache_datasets import obter_dataset_colunar
+from cache_resultados import chave_resultado, obter_resultado
+from exportacao import FORMATOS_EXPORTACAO, chave_exportacao
+from modelos import ESQUEMA_MODELO_1
+from registro_artefatos import obter_artefato
+from pipelines import VERSOES_PIPELINE, exportar_clusters, processar_clusters
+from rfm_eventos import VERSAO_RFM, eh_log_eventos, obter_rfm
+from agregados_clusters import amostra_outliers, pontos_densidade, quantis_recencia
+from dados_graficos import fatias
+from instrumentacao import etapa, iniciar_coleta, painel_diagnostico
 
 st.set_page_config(
     page_title="Análise de Clientes",
@@ -15,6 +22,9 @@ st.set_page_config(
     layout="wide"
 )
 
+ativar_copy_on_write()
+coletor = iniciar_coleta("modelo_1")
+
 # ===============================
 # Upload CSV em Acordeon
 # ===============================
@@ -30,85 +40,123 @@ with st.sidebar.expander(":material/upload: Upload de CSV", expanded=False):
       - `recency_days` (numérica)
     - Os valores não podem estar vazios nessas colunas.
     - Arquivo no formato **CSV** com separador padrão `,`.
+
+    **Ou um log de eventos brutos**, com `event_time`, `user_id`, `price`
+    e (opcional) `event_type`: a tabela RFM é construída a partir das compras.
     """)
 
 # ===============================
 # Carregar dataset
 # ===============================
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
-    
-    colunas_necessarias = ["user_id", "total_spent", "frequency", "recency_days"]
-    colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
-    if colunas_faltando:
-        st.error(f":material/error: O arquivo enviado não possui as colunas necessárias: {', '.join(colunas_faltando)}")
-        st.stop()
-    else:
-        st.success(":material/check_circle: Dataset válido! Todas as colunas obrigatórias estão presentes.")
+    fonte = uploaded_file
 else:
-    df = pd.read_csv("./datasets/cluster_test.csv")
-    st.info(":material/info: Nenhum arquivo enviado. Usando dataset padrão **cluster_test.csv**.")
-
-
-st.markdown('<h1 style="color:#1a73e8;">Modelo 1 - Análise de Clientes - Clusterização</h1>', unsafe_allow_html=True)
-
-with st.expander("Visualizar Amostra dos Dados"):
-    st.dataframe(df.head(5))
+    fonte = "./datasets/cluster_test.csv"
 
 # ===============================
 # 2. Pré-processamento + Clusterização
 # ===============================
-@st.cache_resource
-def load_model(path):
-    """Carrega o modelo K-Means a partir de um arquivo .pkl"""
+def load_model():
+    """Versão atual do K-Means no registro de artefatos (normalmente já carregada pelo aquecimento do servidor)"""
     try:
-        model = joblib.load(path)
-        return model
+        return obter_artefato("kmeans")
     except FileNotFoundError:
         return None
 
-# Carrega o modelo treinado pelo seu amigo
-kmeans_model = load_model("./models/modelo_kmeans.pkl")
+@st.cache_data(show_spinner="Aplicando a clusterização...")
+def clusterizar(chave, _fonte, _modelo):
+    """Clusteriza o arquivo bloco a bloco, uma única vez por conteúdo e modelo (cache em disco compartilhado)"""
+    return obter_resultado(chave, lambda: processar_clusters(_fonte, _modelo))
 
-# Validação para ver se o modelo foi carregado corretamente
-if kmeans_model is None:
-    st.error(":material/error: Arquivo 'modelo_kmeans.pkl' não encontrado. Por favor, adicione o arquivo do modelo na pasta do projeto e atualize a página.")
+# Carrega o modelo treinado pelo seu amigo (a versão fica fixa durante esta execução da página)
+versao_modelo = load_model()
+kmeans_model = versao_modelo.objeto if versao_modelo is not None else None
+
+try:
+    with etapa("leitura"):
+        chave_dataset = hash_conteudo(fonte)
+        log_eventos = eh_log_eventos(ler_cabecalho(fonte))
+        if log_eventos:
+            # Tabela RFM construída a partir das compras (em cache, como a cópia colunar)
+            with etapa("rfm"):
+                fonte = obter_rfm(fonte, chave_dataset)
+            chave_dataset = f"{chave_dataset}-rfm{VERSAO_RFM}"
+        else:
+            # Cópia colunar em cache (mapeada em memória): o CSV só é processado na primeira vez
+            fonte = obter_dataset_colunar(fonte, ESQUEMA_MODELO_1, chave_dataset)
+    with etapa("processamento") as quadro:
+        chave = chave_resultado(
+            "modelo_1", VERSOES_PIPELINE["modelo_1"], chave_dataset,
+            versao_modelo.hash if versao_modelo is not None else None
+        )
+        resultado = clusterizar(chave, fonte, kmeans_model) if kmeans_model is not None else None
+        if resultado is not None:
+            quadro.linhas = int(resultado.resumo["customers"].sum())
+except ColunasFaltandoError as e:
+    st.error(f":material/error: O arquivo enviado não possui as colunas necessárias: {', '.join(e.colunas_faltando)}")
+    st.stop()
+except ValueError as e:
+    st.error(f":material/error: {e}")
     st.stop()
+
+if uploaded_file is not None and log_eventos:
+    st.success(":material/check_circle: Log de eventos recebido! A tabela RFM foi construída a partir das compras.")
+elif uploaded_file is not None:
+    st.success(":material/check_circle: Dataset válido! Todas as colunas obrigatórias estão presentes.")
 else:
-    st.success(":material/check_circle: Modelo de clusterização `modelo_kmeans.pkl` carregado com sucesso!")
+    st.info(":material/info: Nenhum arquivo enviado. Usando dataset padrão **cluster_test.csv**.")
 
-# Escalonamento de Features
-scaler = StandardScaler()
 
-X = df[["total_spent", "frequency", "recency_days"]]
+st.markdown('<h1 style="color:#1a73e8;">Modelo 1 - Análise de Clientes - Clusterização</h1>', unsafe_allow_html=True)
 
-X_scaled = scaler.fit_transform(X)
+with st.expander("Visualizar Amostra dos Dados"):
+    st.dataframe(ler_amostra(fonte, 5))
 
-df["cluster"] = kmeans_model.predict(X_scaled)
+# Validação para ver se o modelo foi carregado corretamente
+if kmeans_model is None:
+    st.error(":material/error: Arquivo 'modelo_kmeans.pkl' não encontrado. Por favor, adicione o arquivo do modelo na pasta do projeto e atualize a página.")
+    st.stop()
+else:
+    st.success(":material/check_circle: Modelo de clusterização `modelo_kmeans.pkl` carregado com sucesso!")
 
-# Resumo por cluster
-cluster_summary = df.groupby("cluster").agg(
-    avg_spent=("total_spent", "mean"),
-    total_spent=("total_spent", "sum"),
-    customers=("user_id", "count")
-).reset_index()
+# Resumo por cluster e agregados dos gráficos (reduzidos bloco a bloco; nenhum cliente linha a linha)
+cluster_summary = resultado.resumo
+if cluster_summary.empty:
+    st.warning(":material/warning: O arquivo não possui nenhum cliente para clusterizar.")
+    st.stop()
 
 # ===============================
 # 3. Sidebar
 # ===============================
 st.sidebar.header(":material/search: Filtros de Análise")
 
-clusters_disponiveis = ["Todos"] + sorted(df["cluster"].unique().tolist())
+clusters_disponiveis = ["Todos"] + sorted(cluster_summary["cluster"].tolist())
 cluster_selecionado = st.sidebar.selectbox("Selecione o Cluster:", clusters_disponiveis)
+mostrar_outliers = st.sidebar.checkbox("Destacar outliers (amostra por cluster)", value=True)
+mostrar_diagnostico = st.sidebar.checkbox("Diagnóstico de desempenho", key="diagnostico_modelo_1")
+
+with etapa("dados_grafico"):
+    # Gráficos a partir dos agregados: faixas de densidade, quartis e amostra de outliers
+    # (o tamanho das figuras não cresce com o número de clientes)
+    pontos_filtrados = pontos_densidade(resultado.agregados)
+    quantis = quantis_recencia(resultado.agregados)
+    outliers = amostra_outliers(resultado.agregados, quantis) if mostrar_outliers else None
+    participacao_clusters = fatias(cluster_summary.set_index("cluster")["customers"], "cluster", "customers")
 
-df_filtrado = df.copy()
+resumo_filtrado = cluster_summary
 if cluster_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado["cluster"] == cluster_selecionado]
+    resumo_filtrado = cluster_summary[cluster_summary["cluster"] == cluster_selecionado]
+    pontos_filtrados = pontos_filtrados[pontos_filtrados["cluster"] == cluster_selecionado]
+    quantis = quantis[quantis["cluster"] == cluster_selecionado]
+    if outliers is not None:
+        outliers = outliers[outliers["cluster"] == cluster_selecionado]
+
+total_clientes = int(resumo_filtrado["customers"].sum())
 
 if cluster_selecionado != "Todos":
-    st.info(f":material/search: Filtro aplicado: Cluster {cluster_selecionado} | Total clientes: {formatar_numero(len(df_filtrado))}")
+    st.info(f":material/search: Filtro aplicado: Cluster {cluster_selecionado} | Total clientes: {formatar_numero(total_clientes)}")
 else:
-    st.info(f":material/search: Filtro aplicado: Todos os Clusters | Total clientes: {formatar_numero(len(df_filtrado))}")
+    st.info(f":material/search: Filtro aplicado: Todos os Clusters | Total clientes: {formatar_numero(total_clientes)}")
 
 # ===============================
 # 4. Métricas Principais
@@ -116,11 +164,10 @@ else:
 st.subheader(":material/insights: Métricas Gerais")
 st.markdown("Visão geral dos principais indicadores de comportamento do cliente, com base nos filtros selecionados. Essas métricas nos ajudam a ter um panorama rápido e a aprofundar a análise.")
 
-total_clientes = len(df_filtrado)
-total_spent = df_filtrado["total_spent"].sum()
-gasto_medio = df_filtrado["total_spent"].mean()
-freq_media = df_filtrado["frequency"].mean()
-recencia_media = df_filtrado["recency_days"].mean()
+total_spent = resumo_filtrado["total_spent"].sum()
+gasto_medio = total_spent / total_clientes if total_clientes > 0 else float("nan")
+freq_media = resumo_filtrado["soma_frequency"].sum() / total_clientes if total_clientes > 0 else float("nan")
+recencia_media = resumo_filtrado["soma_recency_days"].sum() / total_clientes if total_clientes > 0 else float("nan")
 
 col1, col2, col3 = st.columns(3)
 col1.metric("Total Clientes", formatar_numero(total_clientes))
@@ -132,44 +179,71 @@ st.divider()
 # ===============================
 # 5. Gráficos 
 # ===============================
+# Plotly só é importado quando os gráficos são montados (métricas já exibidas);
+# com o aquecimento do servidor, o import já foi feito na inicialização
+import plotly.express as px
+import plotly.graph_objects as go
+
 st.subheader(":material/bar_chart: Gasto Total por Cluster")
 st.markdown("**História de Negócio:** Como gerente de vendas, busco entender a contribuição de cada cluster para a receita total. Este gráfico nos permite identificar os grupos de clientes mais lucrativos, direcionando os investimentos de forma mais estratégica e otimizando o retorno sobre o marketing.")
-fig1 = px.bar(
-    cluster_summary.sort_values("total_spent", ascending=False),
-    x="cluster", y="total_spent",
-    text_auto=".2s",
-    labels={"cluster": "Cluster", "total_spent": "Gasto Total"},
-    color="cluster"
-)
-st.plotly_chart(fig1, use_container_width=True)
+with etapa("grafico_gasto_total"):
+    fig1 = px.bar(
+        cluster_summary.sort_values("total_spent", ascending=False),
+        x="cluster", y="total_spent",
+        text_auto=".2s",
+        labels={"cluster": "Cluster", "total_spent": "Gasto Total"},
+        color="cluster"
+    )
+    st.plotly_chart(fig1, use_container_width=True)
 
 st.subheader(":material/pie_chart: Distribuição de Clientes por Cluster")
 st.markdown("**História de Negócio:** Como gerente de marketing, preciso visualizar a distribuição dos nossos clientes entre os diferentes clusters. Compreender o tamanho de cada segmento é fundamental para o planejamento de campanhas de marketing personalizadas e a alocação de recursos, garantindo que nossas mensagens alcancem o público certo.")
-fig2 = px.pie(
-    cluster_summary,
-    values="customers", names="cluster",
-    title="Participação de Clientes por Cluster"
-)
-st.plotly_chart(fig2, use_container_width=True)
+with etapa("grafico_clientes"):
+    fig2 = px.pie(
+        participacao_clusters,
+        values="customers", names="cluster",
+        title="Participação de Clientes por Cluster"
+    )
+    st.plotly_chart(fig2, use_container_width=True)
 
 st.subheader(":material/scatter_plot: Relação Gasto x Frequência")
 st.markdown("**História de Negócio:** Como analista de CRM, meu objetivo é identificar padrões de comportamento que definem nossos clientes de maior valor. Este gráfico de dispersão cruza o valor gasto com a frequência de compra, nos ajudando a visualizar e a entender quem são os clientes que sustentam o negócio e como podemos criar programas de fidelidade mais eficazes.")
-fig3 = px.scatter(
-    df_filtrado, x="frequency", y="total_spent",
-    color="cluster", hover_data=["user_id"],
-    title="Dispersão de Clientes"
-)
-st.plotly_chart(fig3, use_container_width=True)
+with etapa("grafico_dispersao"):
+    st.caption("Cada ponto representa uma faixa de gasto x frequência, com tamanho proporcional ao número de clientes.")
+    fig3 = px.scatter(
+        pontos_filtrados, x="frequency", y="total_spent",
+        color="cluster", size="quantidade", hover_data=["quantidade"],
+        title="Dispersão de Clientes (densidade)"
+    )
+    if outliers is not None:
+        fig3.add_trace(go.Scatter(
+            x=outliers["frequency"], y=outliers["total_spent"], mode="markers",
+            marker=dict(symbol="x", color="black", size=7), name="Outliers",
+            customdata=outliers[["user_id", "cluster", "motivo"]],
+            hovertemplate="user_id=%{customdata[0]}<br>cluster=%{customdata[1]}<br>%{customdata[2]}<extra></extra>"
+        ))
+    st.plotly_chart(fig3, use_container_width=True)
 
 # Boxplot - recência por cluster
 st.subheader(":material/bar_chart: Distribuição de Recência por Cluster")
 st.markdown("**História de Negócio:** Como gerente de vendas, preciso monitorar a 'saúde' do relacionamento com nossos clientes. Este gráfico mostra há quanto tempo os clientes de cada cluster fizeram sua última compra. Identificar clusters com alta recência (muito tempo desde a última compra) é crucial para desenvolvermos campanhas de reativação e prevenirmos a perda de clientes.")
-fig4 = px.box(
-    df_filtrado, x="cluster", y="recency_days",
-    color="cluster", points="all",
-    title="Distribuição da Recência"
-)
-st.plotly_chart(fig4, use_container_width=True)
+with etapa("grafico_recencia"):
+    # Quartis e cercas pré-calculados: o navegador recebe 5 números por cluster
+    fig4 = go.Figure()
+    for linha in quantis.itertuples():
+        fig4.add_trace(go.Box(
+            x=[linha.cluster], name=str(linha.cluster), q1=[linha.q1], median=[linha.mediana], q3=[linha.q3],
+            lowerfence=[linha.cerca_inferior], upperfence=[linha.cerca_superior]
+        ))
+    if outliers is not None:
+        fora = outliers[outliers["motivo"] == "Recência fora das cercas"]
+        fig4.add_trace(go.Scatter(
+            x=fora["cluster"], y=fora["recency_days"], mode="markers",
+            marker=dict(color="black", size=5), name="Outliers",
+            customdata=fora[["user_id"]], hovertemplate="user_id=%{customdata[0]}<br>recência=%{y}<extra></extra>"
+        ))
+    fig4.update_layout(title="Distribuição da Recência", xaxis_title="cluster", yaxis_title="recency_days")
+    st.plotly_chart(fig4, use_container_width=True)
 
 st.divider()
 
@@ -177,10 +251,22 @@ st.divider()
 # 6. Download
 # ===============================
 st.subheader(":material/download: Download dos Resultados")
-csv = df.to_csv(index=False)
-st.download_button(
-    label=":material/file_download: Baixar Dados com Clusters (CSV)",
-    data=csv,
-    file_name="customer_clusters_resultados.csv",
-    mime="text/csv"
-)
\ No newline at end of file
+formato = st.selectbox(
+    "Formato do arquivo", list(FORMATOS_EXPORTACAO),
+    format_func=lambda f: FORMATOS_EXPORTACAO[f][0], key="formato_modelo_1"
+)
+# O arquivo completo só é gerado quando solicitado; depois fica em cache em disco para novos downloads
+if st.button(":material/description: Gerar Arquivo com Clusters"):
+    caminho = exportar_clusters(fonte, kmeans_model, chave_exportacao(chave, formato), formato)
+    rotulo, mime, extensao = FORMATOS_EXPORTACAO[formato]
+    with open(caminho, "rb") as arquivo:
+        st.download_button(
+            label=f":material/file_download: Baixar Dados com Clusters ({rotulo})",
+            data=arquivo,
+            file_name="customer_clusters_resultados" + extensao,
+            mime=mime,
+            on_click="ignore"
+        )
+
+if mostrar_diagnostico:
+    painel_diagnostico(coletor)
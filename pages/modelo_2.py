@@ -1,12 +1,19 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import joblib
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utils import  formatar_inteiro
+from ingestao import ColunasFaltandoError, DadosInvalidosError, ativar_copy_on_write, hash_conteudo, ler_amostra
+from cache_datasets import obter_dataset_colunar
+from cache_resultados import chave_resultado, obter_resultado
+from exportacao import FORMATOS_EXPORTACAO, chave_exportacao
+from modelos import CLASSE_BAIXO_POTENCIAL, CLASSE_CONVERSAO, ESQUEMA_MODELO_2, FEATURES_CONVERSAO, LIMIAR_CONVERSAO
+from registro_artefatos import obter_artefato
+from pipelines import VERSOES_PIPELINE, exportar_conversao, processar_conversao
+from indice_conversao import contagens_no_limiar, curva_limiar
+from dados_graficos import fatias, percentuais, top_n
+from instrumentacao import etapa, iniciar_coleta, painel_diagnostico
 
 # ===============================
 # Configuração da Página
@@ -17,28 +24,25 @@ st.set_page_config(
     layout="wide"
 )
 
+ativar_copy_on_write()
+coletor = iniciar_coleta("modelo_2")
+
 # ===============================
 # Carregamento do Modelo e Encoders
 # ===============================
-@st.cache_resource
-def load_assets(model_path, encoder_paths):
-    """Carrega o modelo de classificação e os encoders a partir de arquivos .pkl"""
-    assets = {}
+def load_assets():
+    """Versão atual do modelo de classificação e dos encoders no registro de artefatos (normalmente já aquecida)"""
     try:
-        assets['model'] = joblib.load(model_path)
-        for name, path in encoder_paths.items():
-            assets[name] = joblib.load(path)
-        return assets
+        return obter_artefato("assets_conversao")
     except FileNotFoundError as e:
         st.error(f":material/error: Arquivo não encontrado: {e.filename}. Por favor, adicione o arquivo na pasta do projeto e atualize a página.")
         st.stop()
 
-ENCODER_PATHS = {
-    "le_main_category": "./encoders/le_main_category.pkl",
-    "le_brand": "./encoders/le_brand.pkl",
-    "le_weekday": "./encoders/le_weekday.pkl"
-}
-assets = load_assets("./models/modelo_randomforest.pkl", ENCODER_PATHS)
+# Floresta compilada (mapeada em memória) quando disponível, senão o RandomForest do sklearn;
+# a versão fica fixa durante esta execução da página
+with etapa("carregamento_modelo"):
+    versao_assets = load_assets()
+assets = versao_assets.objeto
 classification_model = assets['model']
 
 # ===============================
@@ -54,77 +58,94 @@ with st.sidebar:
         - Ex: `price`, `brand_encoded`, `main_category_encoded`, `sub_category_encoded`, `hour`, `weekday_encoded`, `add_to_cart_count`, `views_count`.
         """)
 
+    # Só reaplica o limiar sobre as probabilidades já calculadas (o modelo não é executado de novo)
+    limiar = st.slider(
+        "Limiar de Conversão", min_value=0.01, max_value=0.99, value=LIMIAR_CONVERSAO, step=0.01,
+        help="Sessões com probabilidade de compra maior ou igual ao limiar são classificadas como Potencial Conversão."
+    )
+    mostrar_diagnostico = st.checkbox("Diagnóstico de desempenho", key="diagnostico_modelo_2")
+
 # ===============================
 # Carregamento dos Dados
 # ===============================
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    fonte = uploaded_file
 else:
     # Carregando dados de exemplo de um arquivo CSV
-    try:
-        df = pd.read_csv("./datasets/randomforest_test.csv")
-        st.info(":material/info: Nenhum arquivo enviado. Usando dados de exemplo do arquivo df_tratado_streamlit.csv.")
-    except FileNotFoundError:
+    fonte = "./datasets/randomforest_test.csv"
+    if not os.path.exists(fonte):
         st.error(":material/error: Arquivo de exemplo não encontrado. Por favor, faça upload de um arquivo CSV.")
         st.stop()
+    st.info(":material/info: Nenhum arquivo enviado. Usando dados de exemplo do arquivo df_tratado_streamlit.csv.")
+
+@st.cache_data(show_spinner=False)
+def prever_dataset(chave, _fonte, _assets):
+    """Calcula as probabilidades uma única vez por conteúdo e versão do modelo (cache em disco compartilhado)"""
+    return obter_resultado(chave, lambda: processar_conversao(_fonte, _assets['model'], _assets))
 
 # ===============================
 # Título e Amostra dos Dados
 # ===============================
 st.markdown('<h1 style="color:#1a73e8;">Modelo 2 - Previsão de Probabilidade de Compra</h1>', unsafe_allow_html=True)
 with st.expander("Visualizar Amostra dos Dados "):
-    st.dataframe(df.head(5))
+    st.dataframe(ler_amostra(fonte, 5))
 
 # ===============================
 # 2. Predição e Decodificação para Gráficos
 # ===============================
 with st.spinner('Aplicando o modelo e preparando visualizações...'):
-    df_processed = df.copy()
-
-    # 1. Seleção de Features para o Modelo
-    features = [
-        "price", "brand_encoded", "main_category_encoded", "sub_category_encoded",
-        "hour", "weekday_encoded", "add_to_cart_count", "views_count"
-    ]
-    # Validação se as colunas existem
-    if not all(col in df_processed.columns for col in features):
-        st.error(f":material/error: O CSV precisa conter todas as colunas necessárias: {', '.join(features)}")
-        st.stop()
-
-    X = df_processed[features]
-
-    # 2. Predição com o Modelo
-    y_probs = classification_model.predict_proba(X)[:, 1]
-    df_processed['prob_compra'] = y_probs
-    
-    threshold = 0.3
-    df_processed['predicao'] = (df_processed['prob_compra'] >= threshold).astype(int)
-    df_processed['classificacao'] = df_processed['predicao'].apply(lambda x: "Potencial Conversão" if x == 1 else "Baixo Potencial")
-
-    # 3. DECODIFICAÇÃO (inverse_transform): Criando colunas de texto para os gráficos
     try:
-        df_processed['brand'] = assets['le_brand'].inverse_transform(df_processed['brand_encoded'])
-        df_processed['main_category'] = assets['le_main_category'].inverse_transform(df_processed['main_category_encoded'])
-        df_processed['weekday'] = assets['le_weekday'].inverse_transform(df_processed['weekday_encoded'])
-    except Exception as e:
-        st.error(f":material/error: Erro ao decodificar os dados para os gráficos: **{e}**")
-        st.warning("Isso pode acontecer se os códigos numéricos no seu CSV não corresponderem aos códigos usados no treinamento do modelo.")
+        with etapa("leitura"):
+            chave_dataset = hash_conteudo(fonte)
+            # Cópia colunar em cache (mapeada em memória): o CSV só é processado na primeira vez
+            fonte = obter_dataset_colunar(fonte, ESQUEMA_MODELO_2, chave_dataset)
+        with etapa("processamento") as quadro:
+            # Predição e decodificação (códigos -> Categorical) bloco a bloco, reduzidas às contagens dos gráficos
+            chave = chave_resultado(
+                "modelo_2", VERSOES_PIPELINE["modelo_2"], chave_dataset, versao_assets.hash
+            )
+            resultado = prever_dataset(chave, fonte, assets)
+            quadro.linhas = int(resultado.indice.quantidade_acumulada[-1])
+    except ColunasFaltandoError:
+        st.error(f":material/error: O CSV precisa conter todas as colunas necessárias: {', '.join(FEATURES_CONVERSAO)}")
+        st.stop()
+    except DadosInvalidosError as e:
+        st.error(f":material/error: {e}")
         st.stop()
 
 st.success(":material/check_circle: Predição concluída! Gráficos gerados com sucesso.")
 
+# Códigos sem classe correspondente nos encoders: as linhas são previstas normalmente,
+# mas ficam fora dos gráficos de marca, categoria e dia da semana
+if len(resultado.total_codigos_invalidos):
+    resumo_invalidos = ", ".join(
+        f"`{coluna}`: {formatar_inteiro(total)}" for coluna, total in resultado.total_codigos_invalidos.items()
+    )
+    st.warning(f":material/warning: Códigos que não correspondem aos usados no treinamento do modelo ({resumo_invalidos} linhas). Essas linhas ficam fora dos gráficos de marca, categoria e dia da semana.")
+    with st.expander("Ver linhas com códigos inválidos"):
+        st.dataframe(
+            resultado.codigos_invalidos.rename(columns={'coluna': 'Coluna', 'linha': 'Linha (índice)', 'codigo': 'Código'}),
+            hide_index=True
+        )
+
 
 st.divider()
 st.subheader(":material/analytics: Análise de Conversão")
 
-df_conversao = df_processed[df_processed['classificacao'] == "Potencial Conversão"]
+# Contagens do limiar atual via busca binária no índice ordenado de probabilidades
+with etapa("dados_grafico"):
+    contagens = contagens_no_limiar(resultado.indice, limiar)
+contagem_classificacao = contagens.contagem_classificacao
 
 
 # --- INÍCIO DO CÓDIGO DOS GRÁFICOS
+# Plotly só é importado quando os gráficos são montados; com o aquecimento do servidor, já foi na inicialização
+import plotly.express as px
+
 st.markdown("**História de Negócio:** Como gerente de vendas, quero analisar os registros de sessões para classificá-las como possibilidade de conversão, permitindo focar esforços de marketing e vendas nos clientes mais promissores.")
 
-total_sessoes = len(df_processed)
-sessoes_potenciais = len(df_conversao)
+total_sessoes = int(contagem_classificacao.sum())
+sessoes_potenciais = int(contagem_classificacao.get(CLASSE_CONVERSAO, 0))
 perc_potencial = (sessoes_potenciais / total_sessoes) * 100 if total_sessoes > 0 else 0
 
 col1, col2 = st.columns([1, 2])
@@ -134,14 +155,28 @@ with col1:
     st.metric("Taxa de Potencial de Conversão", f"{perc_potencial:.2f}%")
 
 with col2:
-    fig_pie = px.pie(
-        df_processed,
-        names='classificacao',
-        title='Distribuição das Sessões por Potencial de Conversão',
-        color='classificacao',
-        color_discrete_map={'Potencial Conversão': 'lightgreen', 'Baixo Potencial': 'lightcoral'}
+    with etapa("grafico_classificacao"):
+        fig_pie = px.pie(
+            fatias(contagem_classificacao, 'classificacao'),
+            names='classificacao',
+            values='count',
+            title='Distribuição das Sessões por Potencial de Conversão',
+            color='classificacao',
+            color_discrete_map={'Potencial Conversão': 'lightgreen', 'Baixo Potencial': 'lightcoral'}
+        )
+        st.plotly_chart(fig_pie, use_container_width=True)
+
+st.markdown("#### :material/tune: Precisão e Cobertura por Limiar")
+st.markdown("**História de Negócio:** Como gerente de vendas, quero entender o efeito do limiar antes de escolhê-lo: limiares baixos alcançam mais sessões (cobertura), limiares altos concentram as sessões mais prováveis (precisão). Sem a compra real das sessões, a precisão esperada é a probabilidade média das sessões selecionadas.")
+with etapa("grafico_limiar"):
+    curva = curva_limiar(resultado.indice, [round(x / 100, 2) for x in range(1, 100)])
+    fig_curva = px.line(
+        curva, x='limiar', y=['precisao_esperada', 'recall_esperado', 'cobertura'],
+        labels={'limiar': 'Limiar', 'value': 'Proporção', 'variable': 'Métrica'},
+        title='Precisão Esperada, Recall Esperado e Cobertura'
     )
-    st.plotly_chart(fig_pie, use_container_width=True)
+    fig_curva.add_vline(x=limiar, line_dash='dash', line_color='gray')
+    st.plotly_chart(fig_curva, use_container_width=True)
 
 st.markdown("#### :material/shopping_cart: Marcas e Categorias com Maior Potencial de Venda")
 st.markdown("**História de Negócio:** Como gerente de vendas, quero visualizar as marcas e categorias com a maior possibilidade de conversão para direcionar campanhas, otimizar estoques e negociar com fornecedores estratégicos.")
@@ -149,70 +184,86 @@ st.markdown("**História de Negócio:** Como gerente de vendas, quero visualizar
 col3, col4 = st.columns(2)
 
 with col3:
-    top_marcas = df_conversao['brand'].value_counts().nlargest(10).reset_index()
-    fig_marcas = px.bar(
-        top_marcas,
-        x='count',
-        y='brand',
-        orientation='h',
-        title='Top 10 Marcas em Sessões de Potencial Conversão',
-        labels={'count': 'Nº de Sessões', 'brand': 'Marca'},
-        text='count'
-    )
-    fig_marcas.update_layout(yaxis={'categoryorder':'total ascending'})
-    st.plotly_chart(fig_marcas, use_container_width=True)
+    with etapa("grafico_marcas"):
+        top_marcas = top_n(contagens.marcas_conversao, 10, 'brand')
+        fig_marcas = px.bar(
+            top_marcas,
+            x='count',
+            y='brand',
+            orientation='h',
+            title='Top 10 Marcas em Sessões de Potencial Conversão',
+            labels={'count': 'Nº de Sessões', 'brand': 'Marca'},
+            text='count'
+        )
+        fig_marcas.update_layout(yaxis={'categoryorder':'total ascending'})
+        st.plotly_chart(fig_marcas, use_container_width=True)
 
 with col4:
-    top_categorias = df_conversao['main_category'].value_counts().nlargest(10).reset_index()
-    fig_categorias = px.bar(
-        top_categorias,
-        x='count',
-        y='main_category',
-        orientation='h',
-        title='Top 10 Categorias em Sessões de Potencial Conversão',
-        labels={'count': 'Nº de Sessões', 'main_category': 'Categoria'},
-        text='count'
-    )
-    fig_categorias.update_layout(yaxis={'categoryorder':'total ascending'})
-    st.plotly_chart(fig_categorias, use_container_width=True)
+    with etapa("grafico_categorias"):
+        top_categorias = top_n(contagens.categorias_conversao, 10, 'main_category')
+        fig_categorias = px.bar(
+            top_categorias,
+            x='count',
+            y='main_category',
+            orientation='h',
+            title='Top 10 Categorias em Sessões de Potencial Conversão',
+            labels={'count': 'Nº de Sessões', 'main_category': 'Categoria'},
+            text='count'
+        )
+        fig_categorias.update_layout(yaxis={'categoryorder':'total ascending'})
+        st.plotly_chart(fig_categorias, use_container_width=True)
 
 st.markdown("#### :material/calendar_today: Dias da Semana Mais Propensos à Conversão")
 st.markdown("**História de Negócio:** Como gerente de vendas, quero saber quais dias da semana são mais propensos a resultar em uma compra para otimizar o agendamento de campanhas de marketing, promoções e a escala da equipe de atendimento.")
 
-# Análise completa por dia da semana (conversão e não conversão)
-analise_dias = df_processed.groupby(['weekday', 'classificacao']).size().unstack(fill_value=0)
-ordem_dias = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-
-# Garantir que todos os dias da semana estejam presentes
-analise_dias = analise_dias.reindex(ordem_dias, fill_value=0)
-
-# Calcular percentuais
-analise_dias_pct = analise_dias.div(analise_dias.sum(axis=1), axis=0) * 100
-
-# Criar gráfico de barras empilhadas com percentuais
-fig_dias = px.bar(
-    analise_dias_pct.reset_index(),
-    x='weekday',
-    y=['Baixo Potencial', 'Potencial Conversão'],
-    title='Distribuição de Conversão por Dia da Semana (%)',
-    labels={'value': 'Percentual (%)', 'weekday': 'Dia da Semana', 'variable': 'Classificação'},
-    color_discrete_map={
-        'Baixo Potencial': '#ff7f7f',
-        'Potencial Conversão': '#90ee90'
-    }
-)
-fig_dias.update_layout(
-    yaxis=dict(range=[0, 100]),
-    barmode='stack'
-)
-st.plotly_chart(fig_dias, use_container_width=True)
+with etapa("grafico_dias"):
+    # Análise completa por dia da semana (conversão e não conversão)
+    ordem_dias = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+    # Percentuais por dia, com todos os dias da semana presentes
+    analise_dias_pct = percentuais(
+        contagens.dias_classificacao.unstack(fill_value=0),
+        linhas=ordem_dias, colunas=[CLASSE_BAIXO_POTENCIAL, CLASSE_CONVERSAO]
+    )
+
+    # Criar gráfico de barras empilhadas com percentuais
+    fig_dias = px.bar(
+        analise_dias_pct.reset_index(),
+        x='weekday',
+        y=['Baixo Potencial', 'Potencial Conversão'],
+        title='Distribuição de Conversão por Dia da Semana (%)',
+        labels={'value': 'Percentual (%)', 'weekday': 'Dia da Semana', 'variable': 'Classificação'},
+        color_discrete_map={
+            'Baixo Potencial': '#ff7f7f',
+            'Potencial Conversão': '#90ee90'
+        }
+    )
+    fig_dias.update_layout(
+        yaxis=dict(range=[0, 100]),
+        barmode='stack'
+    )
+    st.plotly_chart(fig_dias, use_container_width=True)
 
 st.divider()
 st.subheader(":material/download: Download dos Resultados")
-csv = df_processed.to_csv(index=False).encode('utf-8')
-st.download_button(
-    label=":material/save: Baixar Dados com Predições (CSV)",
-    data=csv,
-    file_name="purchase_predictions_resultados.csv",
-    mime="text/csv"
+formato = st.selectbox(
+    "Formato do arquivo", list(FORMATOS_EXPORTACAO),
+    format_func=lambda f: FORMATOS_EXPORTACAO[f][0], key="formato_modelo_2"
 )
+# O arquivo completo só é gerado quando solicitado; depois fica em cache em disco para novos downloads
+if st.button(":material/description: Gerar Arquivo com Predições"):
+    caminho = exportar_conversao(
+        fonte, classification_model, assets, chave_exportacao(chave, formato, limiar), formato, threshold=limiar
+    )
+    rotulo, mime, extensao = FORMATOS_EXPORTACAO[formato]
+    with open(caminho, "rb") as arquivo:
+        st.download_button(
+            label=f":material/save: Baixar Dados com Predições ({rotulo})",
+            data=arquivo,
+            file_name="purchase_predictions_resultados" + extensao,
+            mime=mime,
+            on_click="ignore"
+        )
+
+if mostrar_diagnostico:
+    painel_diagnostico(coletor)
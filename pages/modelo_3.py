@@ -1,13 +1,21 @@
 import streamlit as st
-import pandas as pd
-import pickle
-import plotly.express as px
-import plotly.graph_objects as go
 import sys
 import os
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils import formatar_moeda, formatar_numero, formatar_percentual
+from utils import formatar_numero, formatar_percentual, formatar_tabela
+from armazem_resultados import ARMAZEM
+from cubo_precos import STATUS_FORA, contagem_por_status, estatisticas_por_categoria, filtrar_cubo
+from ingestao import ColunasFaltandoError, DadosInvalidosError, ativar_copy_on_write, hash_conteudo, ler_amostra
+from cache_datasets import obter_dataset_colunar
+from cache_resultados import chave_resultado, obter_resultado
+from exportacao import FORMATOS_EXPORTACAO, chave_exportacao
+from dados_graficos import fatias, top_n
+from modelos import ESQUEMA_MODELO_3
+from registro_artefatos import obter_artefato
+from pipelines import VERSOES_PIPELINE, exportar_precos, processar_precos
+from instrumentacao import etapa, iniciar_coleta, painel_diagnostico
 
 st.set_page_config(
     page_title="Classificação - Preços fora do Padrão",
@@ -15,6 +23,9 @@ st.set_page_config(
     layout="wide"
 )
 
+ativar_copy_on_write()
+coletor = iniciar_coleta("modelo_3")
+
 with st.sidebar.expander(":material/upload: Upload de CSV", expanded=False):
     uploaded_file = st.file_uploader("Escolha um arquivo CSV", type="csv")
 
@@ -29,112 +40,149 @@ with st.sidebar.expander(":material/upload: Upload de CSV", expanded=False):
     - O arquivo deve estar no formato **CSV** com separador padrão (`,`).
     """)
 
+# ===============================
+# Carregamento do Modelo
+# ===============================
+def load_model():
+    """Versão atual da regressão logística no registro de artefatos (normalmente já carregada pelo aquecimento)"""
+    try:
+        return obter_artefato("reglog")
+    except FileNotFoundError:
+        return None
+
+def classificar_dataset(chave, _fonte, _modelo):
+    """
+    Classifica o arquivo completo bloco a bloco, uma única vez por conteúdo e modelo.
+
+    O cubo categoria × marca × status fica uma única vez na memória do
+    processo (armazém compartilhado entre as sessões, com teto de memória) e
+    no cache de resultados em disco; a sessão guarda apenas a `chave` e os
+    filtros, que passam a ser apenas recortes do cubo. Se o cubo tiver sido
+    removido do armazém, ele é recarregado do disco sem chamar o modelo.
+    """
+    def calcular():
+        with st.spinner("Classificando os preços..."):
+            return obter_resultado(chave, lambda: processar_precos(_fonte, _modelo))
+
+    contexto = get_script_run_ctx()
+    sessao = contexto.session_id if contexto is not None else "local"
+    return ARMAZEM.obter(sessao, "modelo_3", chave, calcular)
+
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    fonte = uploaded_file
     st.success(f":material/check_circle: Arquivo **{uploaded_file.name}** carregado com sucesso!")
+else:
+    fonte = './datasets/classific_test.csv'
+
+versao_modelo = load_model()
+if versao_modelo is None:
+    st.error(":material/error: Arquivo 'modelo_reglog.pkl' não encontrado. Por favor, adicione o arquivo do modelo na pasta do projeto e atualize a página.")
+    st.stop()
+# A versão fica fixa durante esta execução da página
+model = versao_modelo.objeto
+
+# ===============================
+# Validação do Dataset (no primeiro bloco) e classificação
+# ===============================
+try:
+    with etapa("leitura"):
+        chave_dataset = hash_conteudo(fonte)
+        # Cópia colunar em cache (mapeada em memória): o CSV só é processado na primeira vez
+        fonte = obter_dataset_colunar(fonte, ESQUEMA_MODELO_3, chave_dataset)
+    st.session_state.resultado_modelo_3 = chave_resultado(
+        "modelo_3", VERSOES_PIPELINE["modelo_3"], chave_dataset, versao_modelo.hash
+    )
+    with etapa("processamento") as quadro:
+        cubo_completo = classificar_dataset(st.session_state.resultado_modelo_3, fonte, model)
+        quadro.linhas = int(cubo_completo.grupos['quantidade'].sum())
+except ColunasFaltandoError as e:
+    st.error(f":material/error: O arquivo enviado não possui as colunas necessárias: {', '.join(e.colunas_faltando)}")
+    st.stop()
+except DadosInvalidosError as e:
+    st.error(f":material/error: {e}")
+    st.stop()
 
-    # ===============================
-    # Validação do Dataset
-    # ===============================
-    colunas_necessarias = ['price', 'price_ratio_cat', 'main_category', 'brand']
-    colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
-
-    if colunas_faltando:
-        st.error(f":material/error: O arquivo enviado não possui as colunas necessárias: {', '.join(colunas_faltando)}")
-        st.stop()
-    else:
-        st.success(":material/check_circle: Dataset válido! Todas as colunas obrigatórias estão presentes.")
-
+if uploaded_file is not None:
+    st.success(":material/check_circle: Dataset válido! Todas as colunas obrigatórias estão presentes.")
 else:
-    df = pd.read_csv('./datasets/classific_test.csv')
     st.info(":material/info: Nenhum arquivo enviado. Usando dataset padrão **classific_test.csv**.")
 
 
 st.markdown('<h1 style="color:#1a73e8;">Modelo 3 - Preços fora do Padrão - Classificação</h1>', unsafe_allow_html=True)
 
 with st.expander("Visualizar Amostra dos Dados"):
-    st.dataframe(df.head(4))
+    st.dataframe(ler_amostra(fonte, 4))
+
+if cubo_completo.grupos.empty:
+    st.warning(":material/warning: O arquivo não possui nenhum produto para classificar.")
+    st.stop()
 
 # Sidebar para filtros
 st.sidebar.header(":material/search: Filtros de Análise")
 
 # Obter valores únicos para filtros
-categorias_disponiveis = ['Todas'] + sorted(df['main_category'].unique().tolist())
-marcas_disponiveis = ['Todas'] + sorted(df['brand'].unique().tolist())
+categorias_disponiveis = ['Todas'] + sorted(cubo_completo.grupos['main_category'].unique().tolist())
+marcas_disponiveis = ['Todas'] + sorted(cubo_completo.grupos['brand'].unique().tolist())
 
 # Filtros
 categoria_selecionada = st.sidebar.selectbox(
     "Selecione a Categoria:",
-    categorias_disponiveis
+    categorias_disponiveis,
+    key="categoria_modelo_3"
 )
 
 marca_selecionada = st.sidebar.selectbox(
     "Selecione a Marca:",
-    marcas_disponiveis
+    marcas_disponiveis,
+    key="marca_modelo_3"
 )
 
-# Aplicar filtros
-df_filtrado = df.copy()
+mostrar_diagnostico = st.sidebar.checkbox("Diagnóstico de desempenho", key="diagnostico_modelo_3")
 
-if categoria_selecionada != 'Todas':
-    df_filtrado = df_filtrado[df_filtrado['main_category'] == categoria_selecionada]
+# Memória dos resultados compartilhados (visão para operadores)
+with st.sidebar.expander(":material/memory: Memória por Sessão", expanded=False):
+    resumo_armazem = ARMAZEM.resumo()
+    st.caption(
+        f"{resumo_armazem['resultados']} resultado(s) em memória para {resumo_armazem['sessoes']} sessão(ões): "
+        f"{resumo_armazem['bytes'] / 1024 ** 2:,.1f} MiB de {resumo_armazem['limite_bytes'] / 1024 ** 2:,.0f} MiB"
+    )
+    st.dataframe(ARMAZEM.uso_por_sessao(), hide_index=True, use_container_width=True)
 
-if marca_selecionada != 'Todas':
-    df_filtrado = df_filtrado[df_filtrado['brand'] == marca_selecionada]
+# Aplicar filtros (recorte do cubo, sem tocar nas linhas de produtos)
+with etapa("dados_grafico"):
+    cubo = filtrar_cubo(cubo_completo, categoria_selecionada, marca_selecionada)
+    contagem_status = contagem_por_status(cubo)
+total_filtrado = int(contagem_status.sum())
 
 # Mostrar informações dos filtros aplicados
 if categoria_selecionada != 'Todas' or marca_selecionada != 'Todas':
     st.info(f":material/bar_chart: Filtros aplicados: Categoria: {categoria_selecionada} | Marca: {marca_selecionada}")
-    st.info(f":material/trending_up: Total de produtos após filtros: {len(df_filtrado):,}")
+    st.info(f":material/trending_up: Total de produtos após filtros: {total_filtrado:,}")
 else:
-    st.info(f":material/bar_chart: Filtros aplicados: Nenhum (Todos os produtos)")
-    st.info(f":material/trending_up: Total de produtos: {len(df_filtrado):,}")
+    st.info(":material/bar_chart: Filtros aplicados: Nenhum (Todos os produtos)")
+    st.info(f":material/trending_up: Total de produtos: {total_filtrado:,}")
 
 # Layout em colunas para o botão e estatísticas
 col1, col2, col3 = st.columns([2, 1, 1])
 
 with col2:
-    if len(df_filtrado) == 0:
+    if total_filtrado == 0:
         st.button(":material/refresh: Analisar Preços", type="primary", use_container_width=True, disabled=True)
     else:
         if st.button(":material/refresh: Analisar Preços", type="primary", use_container_width=True):
-            # Carregar o modelo
-            with open("./models/modelo_reglog.pkl", 'rb') as file:
-                model = pickle.load(file)
-            
-            # Selecionar apenas as colunas que o modelo foi treinado
-            df_model = df_filtrado[['price', 'price_ratio_cat']]
-            
-            # Aplicar o modelo aos dados filtrados
-            predictions = model.predict(df_model)
-            
-            # Adicionar predições ao DataFrame filtrado
-            df_resultado = df_filtrado.copy()
-            df_resultado['classificacao'] = predictions
-            df_resultado['status_preco'] = df_resultado['classificacao'].map({
-                0: 'Preço Normal',
-                1: 'Preço fora do Padrão'
-            })
-            
-            # Armazenar resultado no session_state
-            st.session_state.df_resultado = df_resultado
             st.session_state.analise_feita = True
 
 with col3:
     if st.button(":material/clear: Limpar Análise", type="secondary", use_container_width=True):
-        if 'df_resultado' in st.session_state:
-            del st.session_state.df_resultado
         if 'analise_feita' in st.session_state:
             del st.session_state.analise_feita
         st.rerun()
 
 # Verificar se análise foi feita
 if 'analise_feita' in st.session_state and st.session_state.analise_feita:
-    df_resultado = st.session_state.df_resultado
-    
     # Métricas principais
-    total_produtos = len(df_resultado)
-    produtos_fora_padrao = len(df_resultado[df_resultado['classificacao'] == 1])
+    total_produtos = total_filtrado
+    produtos_fora_padrao = int(contagem_status.get(STATUS_FORA, 0))
     percentual_fora_padrao = (produtos_fora_padrao / total_produtos * 100) if total_produtos > 0 else 0
 
     # Exibir métricas
@@ -152,48 +200,53 @@ if 'analise_feita' in st.session_state and st.session_state.analise_feita:
         st.metric("% fora do Padrão", formatar_percentual(percentual_fora_padrao))
     
     st.divider()
-    
+
+    # Plotly só é importado quando os gráficos são montados; com o aquecimento do servidor, já foi na inicialização
+    import plotly.express as px
+
     # Análise por categoria - Gráfico de colunas
     st.subheader(":material/bar_chart: Produtos fora do Padrão por Categoria")
 
     st.markdown("**História de Negócio:** Como gerente de portfólio, preciso identificar rapidamente as categorias com maior incidência de preços fora do padrão. Este gráfico nos ajuda a visualizar onde as distorções de preço são mais críticas, permitindo focar nossos esforços de revisão e ajuste de forma mais eficaz para garantir a competitividade.")
 
     
-    analise_categoria = df_resultado.groupby(['main_category', 'status_preco']).size().unstack(fill_value=0)
+    analise_categoria = contagem_por_status(cubo, 'main_category')
     
     if 'Preço fora do Padrão' in analise_categoria.columns:
         analise_categoria_sorted = analise_categoria.sort_values('Preço fora do Padrão', ascending=False)
         
-        fig_categoria = px.bar(
-            analise_categoria_sorted.reset_index(), 
-            x='main_category', 
-            y=['Preço Normal', 'Preço fora do Padrão'],
-            title="Distribuição de Preços por Categoria",
-            labels={'main_category': 'Categoria', 'value': 'Quantidade de Produtos'},
-            color_discrete_map={
-                'Preço Normal': '#2E8B57',
-                'Preço fora do Padrão': '#DC143C'
-            }
-        )
-        fig_categoria.update_layout(height=500, xaxis_tickangle=-45)
-        st.plotly_chart(fig_categoria, use_container_width=True)
+        with etapa("grafico_categorias"):
+            fig_categoria = px.bar(
+                analise_categoria_sorted.reset_index(), 
+                x='main_category', 
+                y=['Preço Normal', 'Preço fora do Padrão'],
+                title="Distribuição de Preços por Categoria",
+                labels={'main_category': 'Categoria', 'value': 'Quantidade de Produtos'},
+                color_discrete_map={
+                    'Preço Normal': '#2E8B57',
+                    'Preço fora do Padrão': '#DC143C'
+                }
+            )
+            fig_categoria.update_layout(height=500, xaxis_tickangle=-45)
+            st.plotly_chart(fig_categoria, use_container_width=True)
         
         # Tabela de análise detalhada por categoria
         st.subheader(":material/search: Análise Detalhada por Categoria")
 
         st.markdown("**História de Negócio:** Como analista de pricing, meu objetivo é aprofundar a investigação sobre as variações de preço. Esta tabela detalha as estatísticas por categoria, permitindo comparar não apenas a quantidade de produtos fora do padrão, mas também o comportamento dos preços (médio, mediano) e sua dispersão. Isso é fundamental para entender a causa raiz das anomalias.")
 
-        analise_detalhada = df_resultado.groupby('main_category').agg({
-            'classificacao': ['count', 'sum'],
-            'price': ['mean', 'median', 'std']
-        }).round(2)
-        
-        # Renomear colunas
-        analise_detalhada.columns = ['Total Produtos', 'Produtos fora Padrão', 'Preço Médio', 'Preço Mediano', 'Desvio Padrão']
-        analise_detalhada['% fora Padrão'] = (analise_detalhada['Produtos fora Padrão'] / analise_detalhada['Total Produtos'] * 100).round(1)
-        analise_detalhada = analise_detalhada.sort_values('% fora Padrão', ascending=False)
+        # Estatísticas mescladas a partir do cubo (mediana via sketch de histograma)
+        with etapa("tabela_categorias"):
+            analise_detalhada = estatisticas_por_categoria(cubo)
+            analise_detalhada['% fora Padrão'] = (analise_detalhada['Produtos fora Padrão'] / analise_detalhada['Total Produtos'] * 100).round(1)
+            analise_detalhada = analise_detalhada.sort_values('% fora Padrão', ascending=False)
+            # Formatação brasileira coluna a coluna (sem uma chamada Python por célula)
+            analise_detalhada, configuracao = formatar_tabela(analise_detalhada, {
+                'Total Produtos': 'numero', 'Produtos fora Padrão': 'numero', 'Preço Médio': 'moeda',
+                'Preço Mediano': 'moeda', 'Desvio Padrão': 'moeda', '% fora Padrão': 'percentual',
+            })
         
-        st.dataframe(analise_detalhada, use_container_width=True)
+        st.dataframe(analise_detalhada, column_config=configuracao, use_container_width=True)
     
     # Análise por marca (se não filtrada)
     if marca_selecionada == 'Todas':
@@ -202,56 +255,72 @@ if 'analise_feita' in st.session_state and st.session_state.analise_feita:
         st.markdown("**História de Negócio:** Como gerente comercial, é crucial monitorar o posicionamento de preço das nossas marcas parceiras. Este gráfico destaca as marcas que mais apresentam produtos com preços fora do padrão, fornecendo insights valiosos para iniciar conversas estratégicas com fornecedores sobre alinhamento de preços e políticas comerciais.")
 
         
-        analise_marca = df_resultado.groupby(['brand', 'status_preco']).size().unstack(fill_value=0)
+        analise_marca = contagem_por_status(cubo, 'brand')
         
         if 'Preço fora do Padrão' in analise_marca.columns:
             # Pegar apenas as top 10 marcas com mais produtos fora do padrão
-            top_marcas = analise_marca.sort_values('Preço fora do Padrão', ascending=False).head(10)
+            top_marcas = top_n(analise_marca, 10, 'brand', por='Preço fora do Padrão')
             
-            fig_marca = px.bar(
-                top_marcas.reset_index(), 
-                x='brand', 
-                y=['Preço Normal', 'Preço fora do Padrão'],
-                title="Top 10 Marcas - Distribuição de Preços",
-                labels={'brand': 'Marca', 'value': 'Quantidade de Produtos'},
-                color_discrete_map={
-                    'Preço Normal': '#2E8B57',
-                    'Preço fora do Padrão': '#DC143C'
-                }
-            )
-            fig_marca.update_layout(height=500, xaxis_tickangle=-45)
-            st.plotly_chart(fig_marca, use_container_width=True)
+            with etapa("grafico_marcas"):
+                fig_marca = px.bar(
+                    top_marcas, 
+                    x='brand', 
+                    y=['Preço Normal', 'Preço fora do Padrão'],
+                    title="Top 10 Marcas - Distribuição de Preços",
+                    labels={'brand': 'Marca', 'value': 'Quantidade de Produtos'},
+                    color_discrete_map={
+                        'Preço Normal': '#2E8B57',
+                        'Preço fora do Padrão': '#DC143C'
+                    }
+                )
+                fig_marca.update_layout(height=500, xaxis_tickangle=-45)
+                st.plotly_chart(fig_marca, use_container_width=True)
     
     # Gráfico de pizza original (distribuição geral)
     st.subheader(":material/trending_up: Distribuição Geral dos Preços")
 
     st.markdown("**História de Negócio:** Como diretor de pricing, necessito de uma visão macro sobre a saúde da nossa estratégia de precificação. Este gráfico de pizza oferece um panorama claro da proporção de produtos com preços adequados versus aqueles que estão fora do padrão, servindo como um termômetro para avaliar o risco geral e a consistência do nosso portfólio.")
 
-    counts = df_resultado['status_preco'].value_counts()
+    distribuicao_status = fatias(contagem_status, 'status_preco')
     
-    fig_pizza = px.pie(
-        values=counts.values, 
-        names=counts.index, 
-        title="Distribuição da Classificação de Preços",
-        color_discrete_map={
-            'Preço Normal': '#2E8B57',
-            'Preço fora do Padrão': '#DC143C'
-        }
-    )
-    st.plotly_chart(fig_pizza, use_container_width=True)
+    with etapa("grafico_status"):
+        fig_pizza = px.pie(
+            distribuicao_status,
+            values='count',
+            names='status_preco',
+            color='status_preco',
+            title="Distribuição da Classificação de Preços",
+            color_discrete_map={
+                'Preço Normal': '#2E8B57',
+                'Preço fora do Padrão': '#DC143C'
+            }
+        )
+        st.plotly_chart(fig_pizza, use_container_width=True)
     
     # Download dos dados analisados
     st.subheader(":material/download: Download dos Resultados")
 
     st.markdown("**História de Negócio:** Como analista de dados, preciso disponibilizar os resultados da classificação para que outras equipes possam utilizá-los em suas próprias ferramentas e análises. A exportação dos dados permite integrar esses insights em outros relatórios, compartilhar com áreas de negócio e realizar investigações mais profundas offline.")
 
-    csv = df_resultado.to_csv(index=False)
-    st.download_button(
-        label=":material/file_download: Baixar Dados Analisados (CSV)",
-        data=csv,
-        file_name=f"analise_precos_{categoria_selecionada}_{marca_selecionada}.csv",
-        mime="text/csv"
+    formato = st.selectbox(
+        "Formato do arquivo", list(FORMATOS_EXPORTACAO),
+        format_func=lambda f: FORMATOS_EXPORTACAO[f][0], key="formato_modelo_3"
     )
+    # O arquivo completo só é gerado quando solicitado; depois fica em cache em disco para novos downloads
+    if st.button(":material/description: Gerar Arquivo Analisado"):
+        chave_arquivo = chave_exportacao(
+            st.session_state.resultado_modelo_3, formato, categoria_selecionada, marca_selecionada
+        )
+        caminho = exportar_precos(fonte, model, chave_arquivo, formato, categoria_selecionada, marca_selecionada)
+        rotulo, mime, extensao = FORMATOS_EXPORTACAO[formato]
+        with open(caminho, "rb") as arquivo:
+            st.download_button(
+                label=f":material/file_download: Baixar Dados Analisados ({rotulo})",
+                data=arquivo,
+                file_name=f"analise_precos_{categoria_selecionada}_{marca_selecionada}" + extensao,
+                mime=mime,
+                on_click="ignore"
+            )
 
 else:
     # Mostrar informações iniciais
@@ -262,10 +331,11 @@ else:
     col_info1, col_info2, col_info3 = st.columns(3)
     
     with col_info1:
-        st.metric("Total de Produtos", formatar_numero(len(df_filtrado)))
+        st.metric("Total de Produtos", formatar_numero(total_filtrado))
     with col_info2:
-        st.metric("Categorias", formatar_numero(len(df_filtrado['main_category'].unique())))
+        st.metric("Categorias", formatar_numero(cubo.grupos['main_category'].nunique()))
     with col_info3:
-        st.metric("Marcas", formatar_numero(len(df_filtrado['brand'].unique())))
-
+        st.metric("Marcas", formatar_numero(cubo.grupos['brand'].nunique()))
 
+if mostrar_diagnostico:
+    painel_diagnostico(coletor)
@@ -0,0 +1,240 @@
+"""
+Pipelines das páginas processados bloco a bloco
+
+Cada bloco do CSV é pontuado pelo modelo e imediatamente reduzido aos
+agregados exibidos pela página, de forma que o pico de memória depende do
+tamanho do bloco e não do tamanho do arquivo. A saída completa pontuada só
+é gerada pelas funções `exportar_*`, quando o usuário pede o download, e
+fica no cache de exportações (ver `exportacao.py`).
+"""
+from typing import NamedTuple
+
+import pandas as pd
+
+from agregados_clusters import AgregadosClusters, agregar_bloco, mesclar_agregados
+from cubo_precos import construir_cubo, mesclar_cubos
+from exportacao import obter_exportacao
+from indice_conversao import IndiceConversao, finalizar_indice, histograma_bloco, mesclar_parciais
+from ingestao import TAMANHO_BLOCO, bloco_vazio, ler_csv_em_blocos
+from instrumentacao import etapa, iterar_medido, medido
+from modelos import (
+    ESQUEMA_MODELO_1, ESQUEMA_MODELO_2, ESQUEMA_MODELO_3, FEATURES_CLUSTER, LIMIAR_CONVERSAO,
+    atribuir_clusters, classificar_precos, codigos_invalidos, decodificar_categorias, prever_conversao,
+    probabilidades_conversao
+)
+
+# Versão da redução de cada página (parte da chave do cache de resultados):
+# incrementar sempre que a forma ou o cálculo dos resultados mudar
+VERSOES_PIPELINE = {"modelo_1": 3, "modelo_2": 2, "modelo_3": 3}
+# Linhas com código inválido listadas por coluna no Modelo 2 (o total é sempre contado)
+LIMITE_CODIGOS_INVALIDOS = 1000
+
+
+def _ao_menos_um_bloco(blocos, esquema):
+    """Os blocos lidos ou, se o arquivo só tiver o cabeçalho, um bloco vazio (os resultados saem vazios)"""
+    vazio = True
+    for bloco in blocos:
+        vazio = False
+        yield bloco
+    if vazio:
+        yield bloco_vazio(esquema)
+
+
+def _com_saidas(bloco, *saidas):
+    """O bloco com as colunas de saída; as que o arquivo já tiver são substituídas no lugar"""
+    for saida in saidas:
+        bloco = bloco.assign(**saida)
+    return bloco
+
+
+def _somar(acumulado, parcial):
+    """Soma contagens parciais (Series/DataFrame) alinhando os índices"""
+    if acumulado is None:
+        return parcial
+    return acumulado.add(parcial, fill_value=0)
+
+
+# ===============================
+# Modelo 1 - Clusterização
+# ===============================
+class ResultadoClusters(NamedTuple):
+    resumo: pd.DataFrame
+    agregados: AgregadosClusters
+
+
+def resumir_bloco_clusters(bloco):
+    """Clientes, gasto total e somas de frequência/recência por cluster de um bloco pontuado"""
+    # Somas acumuladas em float64, também para as colunas inteiras (médias por cluster)
+    return bloco.astype({coluna: "float64" for coluna in FEATURES_CLUSTER}).groupby("cluster").agg(
+        customers=("user_id", "count"),
+        total_spent=("total_spent", "sum"),
+        soma_frequency=("frequency", "sum"),
+        soma_recency_days=("recency_days", "sum")
+    )
+
+
+def processar_clusters(fonte, kmeans_model, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Atribui clusters bloco a bloco (passagem única) e reduz ao resumo por cluster.
+
+    Returns:
+        ResultadoClusters: Resumo por cluster e os agregados dos gráficos (vazios se o
+        arquivo só tiver o cabeçalho)
+    """
+    resumo = agregados = None
+    blocos = _ao_menos_um_bloco(ler_csv_em_blocos(fonte, ESQUEMA_MODELO_1, tamanho_bloco), ESQUEMA_MODELO_1)
+    for bloco in iterar_medido("parsing", blocos):
+        with etapa("pontuacao", linhas=len(bloco)):
+            bloco = bloco.assign(cluster=atribuir_clusters(bloco, kmeans_model))
+        with etapa("agregacao", linhas=len(bloco)):
+            resumo = _somar(resumo, resumir_bloco_clusters(bloco))
+            agregados = mesclar_agregados(agregados, agregar_bloco(bloco))
+
+    resumo['customers'] = resumo['customers'].astype(int)
+    resumo['avg_spent'] = resumo['total_spent'] / resumo['customers']
+    return ResultadoClusters(resumo.reset_index(), agregados)
+
+
+def blocos_pontuados_clusters(fonte, kmeans_model, tamanho_bloco=TAMANHO_BLOCO):
+    """Blocos com todas as colunas do arquivo e a coluna `cluster`"""
+    return (
+        bloco.assign(cluster=atribuir_clusters(bloco, kmeans_model))
+        for bloco in ler_csv_em_blocos(fonte, ESQUEMA_MODELO_1, tamanho_bloco, todas_colunas=True)
+    )
+
+
+@medido("exportacao")
+def exportar_clusters(fonte, kmeans_model, chave, formato="csv", tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Arquivo completo com a coluna `cluster` (gerado bloco a bloco, em cache por `chave` e formato).
+
+    Returns:
+        str: Caminho do arquivo exportado
+    """
+    return obter_exportacao(chave, formato, lambda: blocos_pontuados_clusters(fonte, kmeans_model, tamanho_bloco))
+
+
+# ===============================
+# Modelo 2 - Probabilidade de Compra
+# ===============================
+class ResultadoConversao(NamedTuple):
+    indice: IndiceConversao
+    codigos_invalidos: pd.DataFrame
+    total_codigos_invalidos: pd.Series
+
+
+def processar_conversao(fonte, classification_model, assets, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Calcula as probabilidades bloco a bloco e as reduz ao índice ordenado de probabilidades.
+
+    O resultado não depende do limiar: as contagens para qualquer limiar saem
+    de `indice_conversao.contagens_no_limiar` sem chamar o modelo novamente.
+    Códigos que não correspondem a nenhuma classe dos encoders não interrompem
+    o processamento: ficam fora dos índices por marca/categoria/dia e são
+    listados (até LIMITE_CODIGOS_INVALIDOS linhas por coluna) no resultado.
+    Um arquivo só com o cabeçalho resulta em um índice sem sessões.
+
+    Raises:
+        ColunasFaltandoError: Se alguma feature do modelo estiver ausente
+    """
+    parcial = total_invalidos = None
+    invalidos = []
+    blocos = _ao_menos_um_bloco(ler_csv_em_blocos(fonte, ESQUEMA_MODELO_2, tamanho_bloco), ESQUEMA_MODELO_2)
+    for bloco in iterar_medido("parsing", blocos):
+        with etapa("pontuacao", linhas=len(bloco)):
+            probabilidades = probabilidades_conversao(bloco, classification_model)
+        with etapa("decodificacao", linhas=len(bloco)):
+            decodificado = decodificar_categorias(bloco, assets)
+            invalidos_bloco = codigos_invalidos(bloco, assets)
+            total_invalidos = _somar(total_invalidos, invalidos_bloco['coluna'].value_counts())
+            invalidos.append(invalidos_bloco.groupby('coluna').head(LIMITE_CODIGOS_INVALIDOS))
+        with etapa("agregacao", linhas=len(bloco)):
+            parcial = mesclar_parciais(parcial, histograma_bloco(probabilidades, decodificado))
+
+    invalidos = pd.concat(invalidos, ignore_index=True)
+    return ResultadoConversao(
+        finalizar_indice(parcial),
+        invalidos.groupby('coluna').head(LIMITE_CODIGOS_INVALIDOS).reset_index(drop=True),
+        total_invalidos.astype(int),
+    )
+
+
+def blocos_pontuados_conversao(fonte, classification_model, assets, threshold=LIMIAR_CONVERSAO, tamanho_bloco=TAMANHO_BLOCO):
+    """Blocos com todas as colunas do arquivo, probabilidades, classificação e colunas decodificadas"""
+    return (
+        _com_saidas(
+            bloco,
+            prever_conversao(bloco, classification_model, threshold),
+            decodificar_categorias(bloco, assets)
+        )
+        for bloco in ler_csv_em_blocos(fonte, ESQUEMA_MODELO_2, tamanho_bloco, todas_colunas=True)
+    )
+
+
+@medido("exportacao")
+def exportar_conversao(fonte, classification_model, assets, chave, formato="csv", threshold=LIMIAR_CONVERSAO,
+                       tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Arquivo completo com probabilidades, classificação e colunas decodificadas (em cache por `chave` e formato).
+
+    Returns:
+        str: Caminho do arquivo exportado
+    """
+    return obter_exportacao(
+        chave, formato,
+        lambda: blocos_pontuados_conversao(fonte, classification_model, assets, threshold, tamanho_bloco)
+    )
+
+
+# ===============================
+# Modelo 3 - Preços fora do Padrão
+# ===============================
+def processar_precos(fonte, model, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Classifica os preços bloco a bloco, mesclando o cubo de cada bloco.
+    Um arquivo só com o cabeçalho resulta em um cubo sem grupos.
+
+    Returns:
+        CuboPrecos: Cubo categoria × marca × status do arquivo completo
+    """
+    cubo = None
+    blocos = _ao_menos_um_bloco(ler_csv_em_blocos(fonte, ESQUEMA_MODELO_3, tamanho_bloco), ESQUEMA_MODELO_3)
+    for bloco in iterar_medido("parsing", blocos):
+        with etapa("pontuacao", linhas=len(bloco)):
+            classificado = _com_saidas(bloco, classificar_precos(bloco, model))
+        with etapa("agregacao", linhas=len(bloco)):
+            parcial = construir_cubo(classificado)
+            cubo = parcial if cubo is None else mesclar_cubos([cubo, parcial])
+    return cubo
+
+
+def blocos_pontuados_precos(fonte, model, categoria='Todas', marca='Todas', tamanho_bloco=TAMANHO_BLOCO):
+    """Blocos classificados (todas as colunas + `classificacao`/`status_preco`) que atendem aos filtros"""
+    blocos = ler_csv_em_blocos(fonte, ESQUEMA_MODELO_3, tamanho_bloco, todas_colunas=True)
+
+    def filtrados():
+        for bloco in blocos:
+            # Uma única máscara para os dois filtros: o bloco filtrado é alocado uma vez
+            selecao = None
+            if categoria != 'Todas':
+                selecao = (bloco['main_category'] == categoria).to_numpy()
+            if marca != 'Todas':
+                por_marca = (bloco['brand'] == marca).to_numpy()
+                selecao = por_marca if selecao is None else selecao & por_marca
+            if selecao is not None:
+                bloco = bloco[selecao]
+            if len(bloco):
+                yield _com_saidas(bloco, classificar_precos(bloco, model))
+
+    return filtrados()
+
+
+@medido("exportacao")
+def exportar_precos(fonte, model, chave, formato="csv", categoria='Todas', marca='Todas', tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Arquivo dos produtos classificados que atendem aos filtros (em cache por `chave` e formato).
+
+    Returns:
+        str: Caminho do arquivo exportado
+    """
+    return obter_exportacao(chave, formato, lambda: blocos_pontuados_precos(fonte, model, categoria, marca, tamanho_bloco))
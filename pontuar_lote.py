@@ -0,0 +1,231 @@
+"""
+Pontuação em lote (sem navegador) dos três modelos
+
+Usa o mesmo carregamento de modelos/encoders e a mesma seleção de features
+das páginas (`modelos` e `pipelines`). Cada arquivo de entrada é dividido em
+shards (faixas de bytes alinhadas em quebras de linha) distribuídos entre um
+pool de processos; cada processo lê o seu shard em blocos e grava uma parte
+da saída em CSV ou Parquet.
+
+Uso:
+    python pontuar_lote.py modelo_3 dados1.csv dados2.csv --saida resultados/ --formato parquet --processos 8
+
+Observação: a divisão em shards supõe que os campos do CSV não contêm
+quebras de linha entre aspas (o caso de todos os exports do projeto).
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ingestao import TAMANHO_BLOCO, ativar_copy_on_write, ler_cabecalho, tipos_arrow
+from modelos import ESQUEMAS
+from pipelines import blocos_pontuados_clusters, blocos_pontuados_conversao, blocos_pontuados_precos
+from registro_artefatos import obter_artefato
+
+MODELOS = ("modelo_1", "modelo_2", "modelo_3")
+ARTEFATO_MODELO = {"modelo_1": "kmeans", "modelo_2": "assets_conversao", "modelo_3": "reglog"}
+TAMANHO_SHARD = 256 * 1024 * 1024
+# Colunas acrescentadas pela pontuação (ver `pipelines.blocos_pontuados_*`) e seus tipos no Parquet
+TIPOS_SAIDA = {
+    "modelo_1": {"cluster": pa.int32()},
+    "modelo_2": {
+        "prob_compra": pa.float64(), "predicao": pa.int64(), "classificacao": pa.string(),
+        "brand": pa.string(), "main_category": pa.string(), "weekday": pa.string(),
+    },
+    "modelo_3": {"classificacao": pa.int64(), "status_preco": pa.string()},
+}
+
+# Versão de cada modelo fixada na primeira carga do processo (todos os shards com a mesma versão)
+_modelos_carregados = {}
+
+
+def inicializar_worker():
+    """Um thread de BLAS/Arrow por processo: o paralelismo vem do pool, sem disputa de núcleos"""
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    pa.set_cpu_count(1)
+    # Processos "spawn" não herdam as opções do pandas do processo principal
+    ativar_copy_on_write()
+
+
+def _carregar(modelo):
+    """
+    Carrega (uma vez por processo, pelo registro de artefatos) o modelo e, no Modelo 2, os encoders.
+
+    Os arrays são mapeados em memória: os processos do pool compartilham as páginas dos arquivos.
+    """
+    if modelo not in _modelos_carregados:
+        _modelos_carregados[modelo] = obter_artefato(ARTEFATO_MODELO[modelo]).objeto
+    return _modelos_carregados[modelo]
+
+
+def dividir_em_shards(caminho, tamanho_shard=TAMANHO_SHARD):
+    """
+    Divide um CSV em faixas de bytes de ~`tamanho_shard`, alinhadas em quebras de linha.
+
+    Returns:
+        list[tuple[str, int, int]]: (caminho, início, fim) de cada shard, sem o cabeçalho
+    """
+    tamanho = os.path.getsize(caminho)
+    shards = []
+    with open(caminho, "rb") as arquivo:
+        arquivo.readline()
+        inicio = arquivo.tell()
+        while inicio < tamanho:
+            arquivo.seek(min(inicio + tamanho_shard, tamanho))
+            arquivo.readline()
+            fim = min(arquivo.tell(), tamanho)
+            shards.append((caminho, inicio, fim))
+            inicio = fim
+    return shards
+
+
+def ler_shard(caminho, inicio, fim):
+    """Conteúdo do shard precedido do cabeçalho do CSV, pronto para a leitura em blocos"""
+    with open(caminho, "rb") as arquivo:
+        cabecalho = arquivo.readline()
+        arquivo.seek(inicio)
+        return io.BytesIO(cabecalho + arquivo.read(fim - inicio))
+
+
+def esquema_saida(modelo, caminho):
+    """
+    Esquema único das partes Parquet de um arquivo, definido antes da divisão em shards.
+
+    Colunas do CSV na ordem do cabeçalho (as do modelo com os tipos do esquema,
+    as demais como texto), seguidas das colunas da pontuação; as que o arquivo
+    já tiver são substituídas no lugar. Categorias são gravadas como texto.
+    """
+    tipos = tipos_arrow(ESQUEMAS[modelo], ler_cabecalho(caminho))
+    tipos.update(TIPOS_SAIDA[modelo])
+    return pa.schema([
+        (coluna, tipo.value_type if pa.types.is_dictionary(tipo) else tipo) for coluna, tipo in tipos.items()
+    ])
+
+
+def _escrever(blocos, destino, formato, esquema):
+    """Grava os blocos pontuados em CSV ou Parquet (com o esquema do arquivo) e devolve o número de linhas"""
+    linhas = 0
+    if formato == "csv":
+        with open(destino, "wb") as arquivo:
+            for i, bloco in enumerate(blocos):
+                bloco.to_csv(arquivo, index=False, header=(i == 0), encoding="utf-8")
+                linhas += len(bloco)
+        return linhas
+
+    # O escritor é aberto antes do primeiro bloco: um shard sem linhas também gera uma parte válida
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for bloco in blocos:
+            escritor.write_table(pa.Table.from_pandas(bloco, preserve_index=False).cast(esquema))
+            linhas += len(bloco)
+    return linhas
+
+
+def _pontuar_shard(tarefa):
+    """Pontua um shard e grava a parte correspondente da saída"""
+    modelo, caminho, inicio, fim, destino, formato, esquema, tamanho_bloco = tarefa
+    comeco = time.perf_counter()
+    fonte = ler_shard(caminho, inicio, fim)
+    if modelo == "modelo_1":
+        blocos = blocos_pontuados_clusters(fonte, _carregar(modelo), tamanho_bloco)
+    elif modelo == "modelo_2":
+        assets = _carregar(modelo)
+        blocos = blocos_pontuados_conversao(fonte, assets['model'], assets, tamanho_bloco=tamanho_bloco)
+    else:
+        blocos = blocos_pontuados_precos(fonte, _carregar(modelo), tamanho_bloco=tamanho_bloco)
+    linhas = _escrever(blocos, destino, formato, esquema)
+    return {"pid": os.getpid(), "linhas": linhas, "segundos": time.perf_counter() - comeco, "saida": destino}
+
+
+def pontuar_arquivos(modelo, entradas, saida, formato="csv", processos=None,
+                     tamanho_shard=TAMANHO_SHARD, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Pontua os arquivos de entrada em paralelo e grava uma parte de saída por shard.
+
+    Args:
+        modelo (str): 'modelo_1', 'modelo_2' ou 'modelo_3'
+        entradas (list[str]): Caminhos dos CSVs de entrada
+        saida (str): Diretório de saída
+        formato (str): 'csv' ou 'parquet'
+        processos (int | None): Tamanho do pool (padrão: número de CPUs)
+
+    Returns:
+        dict: Relatório com linhas, tempo total e linhas/s por worker
+    """
+    os.makedirs(saida, exist_ok=True)
+    shards = [shard for caminho in entradas for shard in dividir_em_shards(caminho, tamanho_shard)]
+    contexto = multiprocessing.get_context("spawn")
+    comeco = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto, initializer=inicializar_worker) as pool:
+        esquemas = {caminho: esquema_saida(modelo, caminho) for caminho in entradas}
+        tarefas = []
+        for i, (caminho, inicio, fim) in enumerate(shards):
+            nome = os.path.splitext(os.path.basename(caminho))[0]
+            destino = os.path.join(saida, f"{nome}.part-{i:05d}.{formato}")
+            tarefas.append((modelo, caminho, inicio, fim, destino, formato, esquemas[caminho], tamanho_bloco))
+        resultados = list(pool.map(_pontuar_shard, tarefas))
+    total_segundos = time.perf_counter() - comeco
+
+    por_worker = defaultdict(lambda: {"shards": 0, "linhas": 0, "segundos": 0.0})
+    for resultado in resultados:
+        worker = por_worker[resultado["pid"]]
+        worker["shards"] += 1
+        worker["linhas"] += resultado["linhas"]
+        worker["segundos"] += resultado["segundos"]
+    for worker in por_worker.values():
+        worker["linhas_por_segundo"] = worker["linhas"] / worker["segundos"] if worker["segundos"] else 0.0
+
+    total_linhas = sum(resultado["linhas"] for resultado in resultados)
+    return {
+        "modelo": modelo,
+        "shards": len(shards),
+        "linhas": total_linhas,
+        "segundos": total_segundos,
+        "linhas_por_segundo": total_linhas / total_segundos if total_segundos else 0.0,
+        "workers": {str(pid): dados for pid, dados in por_worker.items()},
+        "saidas": [resultado["saida"] for resultado in resultados],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modelo", choices=MODELOS)
+    parser.add_argument("entradas", nargs="+", help="CSVs de entrada")
+    parser.add_argument("--saida", required=True, help="Diretório de saída")
+    parser.add_argument("--formato", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--processos", type=int, default=None, help="Tamanho do pool (padrão: número de CPUs)")
+    parser.add_argument("--tamanho-shard", type=int, default=TAMANHO_SHARD, help="Bytes de CSV por shard")
+    parser.add_argument("--relatorio", help="Grava o relatório em JSON neste arquivo")
+    args = parser.parse_args(argv)
+    ativar_copy_on_write()
+
+    try:
+        relatorio = pontuar_arquivos(
+            args.modelo, args.entradas, args.saida, args.formato, args.processos, args.tamanho_shard
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+
+    for pid, worker in sorted(relatorio["workers"].items()):
+        print(f"worker {pid}: {worker['shards']} shards, {worker['linhas']} linhas, "
+              f"{worker['linhas_por_segundo']:,.0f} linhas/s")
+    print(f"total: {relatorio['linhas']} linhas em {relatorio['segundos']:.2f}s "
+          f"({relatorio['linhas_por_segundo']:,.0f} linhas/s, {relatorio['shards']} shards)")
+    if args.relatorio:
+        with open(args.relatorio, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
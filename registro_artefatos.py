@@ -0,0 +1,264 @@
+"""
+Registro central dos artefatos (modelos e encoders)
+
+Cada artefato é descrito uma única vez em `ARTEFATOS`: os arquivos que o
+compõem, as features que ele espera e a função de carga. `obter_artefato`
+devolve a versão carregada (`VersaoArtefato`: o objeto, o hash do conteúdo
+dos arquivos e a assinatura tamanho/data de modificação), compartilhada por
+todas as sessões, páginas e threads do processo. O hash é o mesmo de
+`cache_resultados.hash_artefatos` e entra nas chaves dos resultados, de
+forma que um resultado sempre corresponde à versão que o calculou.
+
+Mapeamento em memória: os `.pkl` são carregados pelo joblib com
+`mmap_mode` (`ARTIFACT_MMAP_MODE`, padrão `r`). Os arrays NumPy gravados sem
+compressão (escalonamento, centroides, coeficientes) passam a apontar para
+o arquivo, e os processos do servidor compartilham as mesmas páginas do
+cache do sistema em vez de cada um manter a sua cópia. A floresta compilada
+(`.arrow`) já é mapeada por `floresta_compilada`. Objetos Python (árvores
+do sklearn, classes de texto dos encoders) continuam no heap de cada processo.
+
+Recarga a quente: no máximo a cada `ARTIFACT_RELOAD_INTERVAL_S` segundos,
+uma chamada compara a assinatura dos arquivos com a da versão carregada.
+Se mudou e o conteúdo também, uma única thread carrega e valida a nova
+versão enquanto as demais continuam recebendo a anterior (nunca há duas
+cargas simultâneas do mesmo artefato); a troca é a substituição de uma
+referência. Se a carga ou a validação falhar (arquivo incompleto, features
+diferentes), a versão anterior continua em uso e a falha é registrada.
+`ARTIFACT_HOT_RELOAD=0` desliga a verificação.
+
+Os arquivos devem ser substituídos atomicamente (gravação em um temporário
+no mesmo diretório + rename, como em `publicar_artefato`): com o
+mapeamento em memória, sobrescrever o arquivo no lugar alteraria os arrays
+da versão em uso.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, NamedTuple
+
+from cache_resultados import hash_artefatos
+from instrumentacao import LOG_ETAPAS, logger
+from modelos import (
+    CAMINHO_KMEANS, CAMINHO_REGLOG, CAMINHOS_ENCODERS, COLUNAS_CODIFICADAS, FEATURES_CLUSTER,
+    FEATURES_CONVERSAO, FEATURES_PRECOS, atribuir_clusters, caminho_modelo_conversao, carregar_assets_conversao,
+    carregar_kmeans, carregar_reglog, classificar_precos, probabilidades_conversao
+)
+
+MMAP_ARTEFATOS = os.environ.get("ARTIFACT_MMAP_MODE", "r") or None
+RECARREGAR = os.environ.get("ARTIFACT_HOT_RELOAD", "1") != "0"
+INTERVALO_VERIFICACAO_S = float(os.environ.get("ARTIFACT_RELOAD_INTERVAL_S", 2.0))
+# Tentativas de carga quando os arquivos mudam durante a própria carga
+_TENTATIVAS_CARGA = 3
+
+
+class ArtefatoInvalidoError(ValueError):
+    """O artefato carregado não é compatível com as features dos pipelines"""
+
+
+class DescricaoArtefato(NamedTuple):
+    nome: str
+    arquivos: Callable[[], tuple]
+    features: list
+    carregar: Callable[[tuple], object]
+    modelo: Callable[[object], object]
+
+
+class VersaoArtefato(NamedTuple):
+    nome: str
+    objeto: object
+    hash: str
+    assinatura: tuple
+    carregado_em: float
+
+
+def _carregar_conversao(arquivos):
+    caminho_modelo, *encoders = arquivos
+    return carregar_assets_conversao(caminho_modelo, dict(zip(CAMINHOS_ENCODERS, encoders)), MMAP_ARTEFATOS)
+
+
+ARTEFATOS = {
+    "kmeans": DescricaoArtefato(
+        "kmeans",
+        lambda: (CAMINHO_KMEANS,),
+        FEATURES_CLUSTER,
+        lambda arquivos: carregar_kmeans(arquivos[0], MMAP_ARTEFATOS),
+        lambda objeto: objeto,
+    ),
+    "assets_conversao": DescricaoArtefato(
+        "assets_conversao",
+        # Floresta compilada quando existe (passa a ser usada assim que aparece), senão o .pkl
+        lambda: (caminho_modelo_conversao(), *CAMINHOS_ENCODERS.values()),
+        FEATURES_CONVERSAO,
+        _carregar_conversao,
+        lambda objeto: objeto['model'],
+    ),
+    "reglog": DescricaoArtefato(
+        "reglog",
+        lambda: (CAMINHO_REGLOG,),
+        FEATURES_PRECOS,
+        lambda arquivos: carregar_reglog(arquivos[0], MMAP_ARTEFATOS),
+        lambda objeto: objeto,
+    ),
+}
+
+_versoes = {}
+_verificado_em = {}
+_erros = {}
+_assinaturas_invalidas = {}
+_travas = {nome: threading.Lock() for nome in ARTEFATOS}
+
+
+def _assinatura(arquivos):
+    """(caminho, tamanho, data de modificação) de cada arquivo"""
+    assinatura = []
+    for caminho in arquivos:
+        info = os.stat(caminho)
+        assinatura.append((caminho, info.st_size, info.st_mtime_ns))
+    return tuple(assinatura)
+
+
+def validar_artefato(descricao, objeto):
+    """
+    Confere as features declaradas pelo modelo e pontua uma linha sintética (o que também
+    deixa prontos os caminhos de predição: imports tardios do sklearn, pools de threads).
+
+    Raises:
+        ArtefatoInvalidoError: Se o modelo esperar outras features
+    """
+    import pandas as pd
+
+    modelo = descricao.modelo(objeto)
+    nomes = getattr(modelo, 'feature_names_in_', None)
+    if nomes is not None and list(nomes) != list(descricao.features):
+        raise ArtefatoInvalidoError(f"{descricao.nome}: features {list(nomes)}, esperadas {descricao.features}")
+    quantidade = getattr(modelo, 'n_features_in_', None)
+    if quantidade is not None and quantidade != len(descricao.features):
+        raise ArtefatoInvalidoError(f"{descricao.nome}: {quantidade} features, esperadas {len(descricao.features)}")
+
+    linha = pd.DataFrame([[1.0] * len(descricao.features)], columns=descricao.features)
+    if descricao.nome == "kmeans":
+        atribuir_clusters(linha, objeto)
+    elif descricao.nome == "assets_conversao":
+        faltando = [coluna for coluna in COLUNAS_CODIFICADAS if coluna not in objeto['categorias']]
+        if faltando:
+            raise ArtefatoInvalidoError(f"Encoders ausentes para: {', '.join(faltando)}")
+        probabilidades_conversao(linha, modelo)
+    else:
+        classificar_precos(linha, objeto)
+
+
+def _carregar_versao(descricao):
+    """Carrega e valida a versão atual dos arquivos (hash e assinatura conferidos antes e depois da carga)"""
+    for _ in range(_TENTATIVAS_CARGA):
+        arquivos = descricao.arquivos()
+        assinatura = _assinatura(arquivos)
+        hash_conteudo = hash_artefatos(*arquivos)
+        objeto = descricao.carregar(arquivos)
+        if _assinatura(arquivos) == assinatura:
+            validar_artefato(descricao, objeto)
+            return VersaoArtefato(descricao.nome, objeto, hash_conteudo, assinatura, time.time())
+    raise OSError(f"{descricao.nome}: arquivos alterados durante a carga")
+
+
+def _registrar(evento, nome, **dados):
+    if LOG_ETAPAS:
+        logger.info(json.dumps({"evento": evento, "artefato": nome, **dados}))
+
+
+def _verificar(descricao, atual):
+    """Recarrega o artefato se os arquivos mudaram (chamada com a trava do artefato)"""
+    assinatura = None
+    try:
+        arquivos = descricao.arquivos()
+        assinatura = _assinatura(arquivos)
+        if assinatura in (atual.assinatura, _assinaturas_invalidas.get(descricao.nome)):
+            return
+        if hash_artefatos(*arquivos) == atual.hash:
+            # Só a data de modificação mudou: o objeto carregado continua valendo
+            _versoes[descricao.nome] = atual._replace(assinatura=assinatura)
+            return
+        inicio = time.perf_counter()
+        nova = _carregar_versao(descricao)
+    except Exception as e:
+        # Versão anterior continua em uso; a carga só é tentada de novo quando os arquivos mudarem outra vez
+        _assinaturas_invalidas[descricao.nome] = assinatura
+        _erros[descricao.nome] = f"{type(e).__name__}: {e}"
+        _registrar("recarga_artefato", descricao.nome, erro=_erros[descricao.nome], hash=atual.hash)
+        return
+    _versoes[descricao.nome] = nova
+    _erros.pop(descricao.nome, None)
+    _assinaturas_invalidas.pop(descricao.nome, None)
+    _registrar("recarga_artefato", descricao.nome, erro=None, hash=nova.hash, hash_anterior=atual.hash,
+               segundos=time.perf_counter() - inicio)
+
+
+def obter_artefato(nome):
+    """
+    Versão atual do artefato, carregada uma única vez por processo e recarregada quando os arquivos mudam.
+
+    Args:
+        nome (str): 'kmeans', 'assets_conversao' ou 'reglog'
+
+    Returns:
+        VersaoArtefato: O objeto em `objeto` (em 'assets_conversao', o dicionário de
+        `modelos.carregar_assets_conversao`) e o hash do conteúdo em `hash`
+
+    Raises:
+        FileNotFoundError: Se algum arquivo não existir na primeira carga (nada fica registrado;
+            a próxima chamada tenta de novo)
+        ArtefatoInvalidoError: Se, na primeira carga, o modelo esperar outras features
+    """
+    descricao = ARTEFATOS[nome]
+    trava = _travas[nome]
+    atual = _versoes.get(nome)
+    if atual is None:
+        with trava:
+            atual = _versoes.get(nome)
+            if atual is None:
+                atual = _versoes[nome] = _carregar_versao(descricao)
+                _verificado_em[nome] = time.monotonic()
+        return atual
+
+    if not RECARREGAR or time.monotonic() - _verificado_em.get(nome, 0.0) < INTERVALO_VERIFICACAO_S:
+        return atual
+    # Só uma thread verifica e recarrega; as demais seguem com a versão atual sem esperar
+    if not trava.acquire(blocking=False):
+        return atual
+    try:
+        _verificado_em[nome] = time.monotonic()
+        _verificar(descricao, _versoes[nome])
+    finally:
+        trava.release()
+    return _versoes[nome]
+
+
+def estado_artefatos():
+    """
+    Returns:
+        dict: Nome -> hash, arquivos e horário da versão carregada e o último erro de recarga
+    """
+    return {
+        nome: {
+            "hash": versao.hash,
+            "arquivos": [caminho for caminho, _, _ in versao.assinatura],
+            "carregado_em": versao.carregado_em,
+            "erro_recarga": _erros.get(nome),
+        }
+        for nome, versao in _versoes.items()
+    }
+
+
+def publicar_artefato(objeto, destino):
+    """Grava um artefato com joblib de forma atômica (temporário no mesmo diretório + rename)"""
+    import joblib
+
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destino)), suffix=".tmp")
+    os.close(descritor)
+    try:
+        joblib.dump(objeto, temporario)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
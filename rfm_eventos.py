@@ -0,0 +1,459 @@
+"""
+Tabela RFM do Modelo 1 construída a partir dos eventos brutos de compra
+
+A partir de um log de eventos (`event_time`, `user_id`, `price` e, se
+existir, `event_type`, do qual só as linhas `purchase` são usadas), calcula
+por `user_id` as colunas de `cluster_test.csv`:
+
+- `total_spent`: soma de `price` das compras;
+- `frequency`: número de compras;
+- `last_purchase`: instante da última compra (UTC);
+- `recency_days`: dias inteiros entre `last_purchase` e a última compra do
+  log inteiro (a data de referência).
+
+Os eventos são lidos em blocos e cada bloco é reduzido por agregação hash
+(`group_by` do Arrow) a uma linha por usuário. Os parciais ficam em memória
+e são recompactados; quando o número de usuários passa de
+`RFM_MAX_USERS_IN_MEMORY`, o parcial é dividido por hash do `user_id` em
+`RFM_PARTITIONS` partições e derramado em arquivos Arrow IPC no disco. No
+fim, cada partição é mesclada separadamente (um usuário nunca aparece em
+duas partições), de forma que o pico de memória depende do orçamento e do
+número de usuários por partição, e não do tamanho do log.
+
+Com vários processos, os arquivos são divididos em shards (como em
+`pontuar_lote`); cada worker agrega o seu shard e derrama as suas partições,
+e o processo principal mescla as partições de todos os shards.
+
+A saída (Arrow IPC ou CSV) tem o esquema do Modelo 1 e pode ser pontuada
+diretamente pelos pipelines da página.
+
+Uso:
+    python rfm_eventos.py eventos_2019-12.csv eventos_2020-01.csv --saida rfm.arrow --processos 4
+    python rfm_eventos.py eventos.csv --saida rfm.csv --clusters clientes_clusterizados.parquet
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from cache_datasets import DIRETORIO_CACHE, LIMITE_BYTES_CACHE, limitar_cache
+from ingestao import EXTENSAO_COLUNAR, TAMANHO_BLOCO, ativar_copy_on_write, ler_cabecalho, ler_lotes_arrow, validar_colunas
+from instrumentacao import etapa
+from pontuar_lote import TAMANHO_SHARD, dividir_em_shards, inicializar_worker, ler_shard
+
+COLUNAS_EVENTOS = ['event_time', 'user_id', 'price']
+EVENTO_COMPRA = 'purchase'
+DIRETORIO_RFM = os.environ.get("RFM_SPILL_DIR", "./.cache/rfm")
+LIMITE_USUARIOS_MEMORIA = int(os.environ.get("RFM_MAX_USERS_IN_MEMORY", 2_000_000))
+PARTICOES_RFM = int(os.environ.get("RFM_PARTITIONS", 64))
+# Versão do cálculo da tabela RFM (parte do nome do arquivo em cache)
+VERSAO_RFM = 2
+
+SEGUNDOS_DIA = 86_400
+_TIPO_INSTANTE = pa.timestamp('s', tz='UTC')
+_ESQUEMA_PARCIAL = pa.schema([
+    ('user_id', pa.int64()),
+    ('total_spent', pa.float64()),
+    ('frequency', pa.int64()),
+    ('last_purchase', _TIPO_INSTANTE),
+])
+# Constante da hash multiplicativa (Fibonacci): espalha ids sequenciais entre as partições
+_MULTIPLICADOR_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def eh_log_eventos(colunas):
+    """Indica se as colunas são de um log de eventos (e não de uma tabela RFM pronta)"""
+    return all(coluna in colunas for coluna in COLUNAS_EVENTOS) and 'total_spent' not in colunas
+
+
+def _esquema_eventos(fonte):
+    """Colunas lidas do log; `event_type` é opcional (sem ela, todas as linhas são compras)"""
+    esquema = {'event_time': 'string', 'user_id': 'int64', 'price': 'float64'}
+    if 'event_type' in ler_cabecalho(fonte):
+        esquema['event_type'] = 'category'
+    return esquema
+
+
+def _instantes(textos):
+    """
+    Converte os textos de `event_time` para timestamp UTC.
+
+    Aceita os formatos dos exports do projeto: `2019-12-01 00:00:02 UTC`,
+    `2020-04-01 03:37:05+00:00` e ISO 8601 com `T`/`Z` ou outro fuso.
+    """
+    textos = pc.replace_substring_regex(textos, r' UTC$|Z$', '+00:00')
+    textos = pc.replace_substring_regex(textos, r'^(\d{4}-\d\d-\d\d)T', r'\1 ')
+    textos = pc.replace_substring_regex(textos, r'([+-]\d\d):?(\d\d)$', r'\1\2')
+    return pc.strptime(textos, format='%Y-%m-%d %H:%M:%S%z', unit='s')
+
+
+def _reagregar(tabela):
+    """Mescla parciais: soma gasto e compras e mantém a última compra de cada usuário"""
+    agregado = tabela.group_by('user_id').aggregate([
+        ('total_spent', 'sum'), ('frequency', 'sum'), ('last_purchase', 'max'),
+    ])
+    return agregado.select(['user_id', 'total_spent_sum', 'frequency_sum', 'last_purchase_max']).rename_columns(
+        _ESQUEMA_PARCIAL.names
+    )
+
+
+def agregar_lote(lote):
+    """
+    Reduz um lote de eventos a uma linha por usuário (agregação hash).
+
+    Args:
+        lote (pa.RecordBatch): Eventos com `event_time` (texto), `user_id`, `price` e opcionalmente `event_type`
+
+    Returns:
+        pa.Table: Parcial com `user_id`, `total_spent`, `frequency` e `last_purchase`
+    """
+    tabela = pa.Table.from_batches([lote])
+    if 'event_type' in tabela.column_names:
+        tabela = tabela.filter(pc.equal(tabela['event_type'], EVENTO_COMPRA))
+    compras = pa.table({
+        'user_id': tabela['user_id'],
+        'price': tabela['price'],
+        'instante': _instantes(tabela['event_time']),
+    })
+    compras = compras.filter(pc.and_(pc.is_valid(compras['user_id']), pc.is_valid(compras['instante'])))
+    agregado = compras.group_by('user_id').aggregate([
+        ('price', 'sum', pc.ScalarAggregateOptions(min_count=0)),
+        ([], 'count_all'),
+        ('instante', 'max'),
+    ])
+    return agregado.select(['user_id', 'price_sum', 'count_all', 'instante_max']).rename_columns(
+        _ESQUEMA_PARCIAL.names
+    ).cast(_ESQUEMA_PARCIAL)
+
+
+def particao_usuarios(user_ids, particoes):
+    """Partição (0 a `particoes` - 1) de cada `user_id`"""
+    ids = np.asarray(user_ids).astype(np.uint64)
+    return ((ids * _MULTIPLICADOR_HASH) >> np.uint64(32)) % np.uint64(particoes)
+
+
+class AgregadorRFM:
+    """
+    Agrega os lotes de eventos de um processo dentro de um orçamento de usuários em memória.
+
+    Os parciais de cada lote são acumulados e recompactados quando passam de
+    `limite_usuarios` linhas; se, mesmo compactado, o parcial ocupar mais da
+    metade do orçamento, ele é derramado em `diretorio` (um arquivo Arrow IPC
+    por partição, ao qual os derramamentos seguintes são acrescentados).
+    """
+
+    def __init__(self, diretorio, limite_usuarios=LIMITE_USUARIOS_MEMORIA, particoes=PARTICOES_RFM):
+        self.diretorio = diretorio
+        self.limite_usuarios = limite_usuarios
+        self.particoes = particoes
+        self.eventos = 0
+        self.derramamentos = 0
+        self.ultima_compra = None
+        self._pendentes = []
+        self._linhas_pendentes = 0
+        self._escritores = {}
+
+    def adicionar(self, lote):
+        with etapa("agregacao_rfm", linhas=lote.num_rows):
+            parcial = agregar_lote(lote)
+        self.eventos += lote.num_rows
+        if parcial.num_rows == 0:
+            return
+        maximo = pc.max(parcial['last_purchase']).value
+        self.ultima_compra = maximo if self.ultima_compra is None else max(self.ultima_compra, maximo)
+        self._pendentes.append(parcial)
+        self._linhas_pendentes += parcial.num_rows
+        if self._linhas_pendentes > self.limite_usuarios:
+            compactado = self._compactar()
+            if compactado.num_rows > self.limite_usuarios // 2:
+                self._derramar(compactado)
+            else:
+                self._pendentes, self._linhas_pendentes = [compactado], compactado.num_rows
+
+    def _compactar(self):
+        with etapa("compactacao_rfm", linhas=self._linhas_pendentes):
+            compactado = _reagregar(pa.concat_tables(self._pendentes))
+        self._pendentes, self._linhas_pendentes = [], 0
+        return compactado
+
+    def _derramar(self, tabela):
+        """Grava o parcial dividido por partição (ordenado pela partição, uma fatia por arquivo)"""
+        with etapa("derramamento_rfm", linhas=tabela.num_rows):
+            particao = particao_usuarios(tabela['user_id'], self.particoes)
+            ordem = np.argsort(particao, kind='stable')
+            tabela = tabela.take(ordem)
+            limites = np.searchsorted(particao[ordem], np.arange(self.particoes + 1, dtype=np.uint64))
+            for p in range(self.particoes):
+                inicio, fim = int(limites[p]), int(limites[p + 1])
+                if fim > inicio:
+                    self._escritor(p).write_table(tabela.slice(inicio, fim - inicio))
+        self.derramamentos += 1
+
+    def _escritor(self, particao):
+        if particao not in self._escritores:
+            caminho = os.path.join(self.diretorio, f"particao-{particao:04d}.arrows")
+            self._escritores[particao] = pa.ipc.new_stream(caminho, _ESQUEMA_PARCIAL)
+        return self._escritores[particao]
+
+    def finalizar(self, derramar=False):
+        """
+        Encerra a agregação.
+
+        Args:
+            derramar (bool): Grava também o que ainda está em memória (usado pelos workers)
+
+        Returns:
+            pa.Table | None: O parcial em memória, quando nada foi derramado; senão None
+            (as partições ficam em `arquivos_particoes`)
+        """
+        restante = self._compactar() if self._pendentes else None
+        if restante is not None and (derramar or self._escritores):
+            self._derramar(restante)
+            restante = None
+        for escritor in self._escritores.values():
+            escritor.close()
+        if restante is None and not self._escritores:
+            return _ESQUEMA_PARCIAL.empty_table()
+        return restante
+
+    def arquivos_particoes(self):
+        """Partição -> arquivo derramado"""
+        return {p: os.path.join(self.diretorio, f"particao-{p:04d}.arrows") for p in sorted(self._escritores)}
+
+
+def _agregar_fonte(agregador, fonte, tamanho_bloco):
+    for lote in ler_lotes_arrow(fonte, _esquema_eventos(fonte), tamanho_bloco):
+        agregador.adicionar(lote)
+
+
+def _agregar_shard(tarefa):
+    """Agrega um shard em um worker e derrama todas as suas partições"""
+    caminho, inicio, fim, diretorio, limite_usuarios, particoes, tamanho_bloco = tarefa
+    os.makedirs(diretorio, exist_ok=True)
+    agregador = AgregadorRFM(diretorio, limite_usuarios, particoes)
+    _agregar_fonte(agregador, ler_shard(caminho, inicio, fim), tamanho_bloco)
+    agregador.finalizar(derramar=True)
+    return {
+        "eventos": agregador.eventos,
+        "derramamentos": agregador.derramamentos,
+        "ultima_compra": agregador.ultima_compra,
+        "particoes": agregador.arquivos_particoes(),
+    }
+
+
+def _mesclar_particao(caminhos):
+    """Lê os arquivos de uma partição (de um ou mais shards) e reagrega os usuários"""
+    tabelas = []
+    for caminho in caminhos:
+        with pa.OSFile(caminho, "rb") as arquivo:
+            tabelas.append(pa.ipc.open_stream(arquivo).read_all())
+    return _reagregar(pa.concat_tables(tabelas))
+
+
+def tabela_rfm(parcial, ultima_compra):
+    """
+    Tabela final no esquema do Modelo 1, com a recência em relação a `ultima_compra`.
+
+    Args:
+        parcial (pa.Table): Agregado por usuário (`user_id`, `total_spent`, `frequency`, `last_purchase`)
+        ultima_compra (int): Última compra do log inteiro, em segundos desde a época (UTC)
+
+    Returns:
+        pa.Table: `user_id`, `total_spent`, `frequency`, `last_purchase` e `recency_days`, ordenada por `user_id`
+    """
+    parcial = parcial.sort_by('user_id')
+    segundos = pc.cast(parcial['last_purchase'], pa.int64()).to_numpy()
+    return pa.table({
+        'user_id': parcial['user_id'],
+        'total_spent': pc.round(parcial['total_spent'], 2),
+        'frequency': parcial['frequency'],
+        'last_purchase': parcial['last_purchase'],
+        'recency_days': pa.array((ultima_compra - segundos) // SEGUNDOS_DIA, pa.int64()),
+    })
+
+
+def _gravar(tabelas, destino):
+    """Grava as tabelas em Arrow IPC (`.arrow`) ou CSV, com escrita atômica; devolve o número de usuários"""
+    usuarios = 0
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(destino)), suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            escritor = None
+            for i, tabela in enumerate(tabelas):
+                if destino.endswith(EXTENSAO_COLUNAR):
+                    if escritor is None:
+                        escritor = pa.ipc.new_file(arquivo, tabela.schema)
+                    escritor.write_table(tabela)
+                else:
+                    # Mesmo formato de `cluster_test.csv` (last_purchase como 2020-04-01 03:37:05+00:00)
+                    tabela.to_pandas().to_csv(arquivo, index=False, header=(i == 0), encoding="utf-8")
+                usuarios += tabela.num_rows
+            if escritor is not None:
+                escritor.close()
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+    return usuarios
+
+
+def construir_rfm(entradas, destino, processos=1, limite_usuarios=LIMITE_USUARIOS_MEMORIA,
+                  particoes=PARTICOES_RFM, diretorio_trabalho=DIRETORIO_RFM,
+                  tamanho_shard=TAMANHO_SHARD, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Constrói a tabela RFM a partir de um ou mais logs de eventos.
+
+    Args:
+        entradas (list[str | file-like]): Logs de eventos (arquivos enviados só com `processos=1`)
+        destino (str): Arquivo de saída (`.arrow` para Arrow IPC; qualquer outra extensão grava CSV)
+        processos (int | None): 1 agrega no próprio processo; mais de 1 (ou None, um por CPU)
+            divide os arquivos em shards agregados por um pool de processos
+        limite_usuarios (int): Usuários mantidos em memória (por processo) antes de derramar em disco
+        particoes (int): Número de partições por hash do `user_id`
+        diretorio_trabalho (str): Onde os parciais são derramados (removidos ao final)
+
+    Returns:
+        dict: Eventos lidos, usuários, derramamentos, shards e tempo total
+
+    Raises:
+        ColunasFaltandoError: Se algum log não tiver `event_time`, `user_id` ou `price`
+        ValueError: Se nenhum evento de compra for encontrado
+    """
+    comeco = time.perf_counter()
+    os.makedirs(diretorio_trabalho, exist_ok=True)
+    trabalho = tempfile.mkdtemp(dir=diretorio_trabalho, prefix="rfm-")
+    try:
+        if processos == 1:
+            agregador = AgregadorRFM(trabalho, limite_usuarios, particoes)
+            for fonte in entradas:
+                _agregar_fonte(agregador, fonte, tamanho_bloco)
+            em_memoria = agregador.finalizar()
+            resultados = [{
+                "eventos": agregador.eventos,
+                "derramamentos": agregador.derramamentos,
+                "ultima_compra": agregador.ultima_compra,
+                "particoes": agregador.arquivos_particoes(),
+            }]
+        else:
+            for caminho in entradas:
+                # Arquivos inválidos falham antes de abrir o pool
+                validar_colunas(ler_cabecalho(caminho), COLUNAS_EVENTOS)
+            shards = [shard for caminho in entradas for shard in dividir_em_shards(caminho, tamanho_shard)]
+            tarefas = [
+                (caminho, inicio, fim, os.path.join(trabalho, f"shard-{i:05d}"), limite_usuarios, particoes, tamanho_bloco)
+                for i, (caminho, inicio, fim) in enumerate(shards)
+            ]
+            contexto = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=processos, mp_context=contexto, initializer=inicializar_worker) as pool:
+                resultados = list(pool.map(_agregar_shard, tarefas))
+            em_memoria = None
+
+        instantes = [r["ultima_compra"] for r in resultados if r["ultima_compra"] is not None]
+        if not instantes:
+            raise ValueError("Nenhum evento de compra encontrado nos arquivos")
+        ultima_compra = max(instantes)
+
+        if em_memoria is not None:
+            tabelas = [tabela_rfm(em_memoria, ultima_compra)]
+        else:
+            por_particao = {}
+            for resultado in resultados:
+                for p, caminho in resultado["particoes"].items():
+                    por_particao.setdefault(p, []).append(caminho)
+            tabelas = (
+                tabela_rfm(_mesclar_particao(caminhos), ultima_compra)
+                for _, caminhos in sorted(por_particao.items())
+            )
+        with etapa("mesclagem_rfm"):
+            usuarios = _gravar(tabelas, destino)
+    finally:
+        shutil.rmtree(trabalho, ignore_errors=True)
+
+    return {
+        "eventos": sum(r["eventos"] for r in resultados),
+        "usuarios": usuarios,
+        "derramamentos": sum(r["derramamentos"] for r in resultados),
+        "shards": len(resultados),
+        "ultima_compra": str(pa.scalar(ultima_compra, _TIPO_INSTANTE)),
+        "segundos": time.perf_counter() - comeco,
+        "saida": destino,
+    }
+
+
+def caminho_rfm(chave_dataset, diretorio=DIRETORIO_CACHE):
+    """Caminho da tabela RFM em cache de um log de eventos (hash do conteúdo + versão do cálculo)"""
+    return os.path.join(diretorio, f"{chave_dataset}-rfm{VERSAO_RFM}{EXTENSAO_COLUNAR}")
+
+
+def obter_rfm(fonte, chave_dataset, diretorio=DIRETORIO_CACHE, limite_bytes=LIMITE_BYTES_CACHE):
+    """
+    Devolve a tabela RFM (Arrow IPC, no cache de datasets) de um log de eventos, construindo-a se necessário.
+
+    Args:
+        fonte (str | file-like): Log de eventos (CSV ou arquivo enviado)
+        chave_dataset (str): Hash do conteúdo (ver `ingestao.hash_conteudo`)
+
+    Returns:
+        str: Caminho do arquivo `.arrow`, lido pelos pipelines como a cópia colunar de um dataset
+
+    Raises:
+        ColunasFaltandoError: Se o log não tiver `event_time`, `user_id` ou `price`
+        ValueError: Se nenhum evento de compra for encontrado
+    """
+    destino = caminho_rfm(chave_dataset, diretorio)
+    if os.path.exists(destino):
+        os.utime(destino)
+        return destino
+    os.makedirs(diretorio, exist_ok=True)
+    construir_rfm([fonte], destino)
+    limitar_cache(diretorio, limite_bytes, preservar=(destino,))
+    return destino
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entradas", nargs="+", help="Logs de eventos em CSV")
+    parser.add_argument("--saida", required=True, help="Tabela RFM (.arrow para Arrow IPC; senão CSV)")
+    parser.add_argument("--processos", type=int, default=1, help="Processos na agregação dos shards (0: um por CPU)")
+    parser.add_argument("--max-usuarios", type=int, default=LIMITE_USUARIOS_MEMORIA,
+                        help="Usuários em memória por processo antes de derramar em disco")
+    parser.add_argument("--particoes", type=int, default=PARTICOES_RFM)
+    parser.add_argument("--tamanho-shard", type=int, default=TAMANHO_SHARD, help="Bytes de CSV por shard")
+    parser.add_argument("--clusters", help="Também pontua a tabela com o K-Means e grava em CSV/Parquet")
+    args = parser.parse_args(argv)
+    ativar_copy_on_write()
+
+    try:
+        relatorio = construir_rfm(
+            args.entradas, args.saida, args.processos or None, args.max_usuarios, args.particoes,
+            tamanho_shard=args.tamanho_shard,
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    print(f"{relatorio['eventos']} eventos -> {relatorio['usuarios']} usuários em {relatorio['segundos']:.2f}s "
+          f"({relatorio['shards']} shards, {relatorio['derramamentos']} derramamentos; "
+          f"referência da recência: {relatorio['ultima_compra']})")
+
+    if args.clusters:
+        from exportacao import escrever_blocos
+        from modelos import carregar_kmeans
+        from pipelines import blocos_pontuados_clusters
+
+        formato = "parquet" if args.clusters.endswith(".parquet") else "csv"
+        with open(args.clusters, "wb") as arquivo:
+            escrever_blocos(blocos_pontuados_clusters(args.saida, carregar_kmeans()), formato, arquivo)
+        print(f"clusters gravados em {args.clusters}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Servidor HTTP local de pontuação com micro-batching
+
+Carrega o modelo de probabilidade de compra (Modelo 2) e o classificador de
+preços fora do padrão (Modelo 3) uma única vez e atende requisições linha a
+linha. Requisições concorrentes são agrupadas em micro-lotes (até
+`--max-lote` linhas ou `--max-espera-ms` após a primeira linha do lote), de
+forma que o custo fixo de cada `predict_proba`/`predict` do sklearn é
+dividido entre várias requisições.
+
+Uso:
+    python servidor_scoring.py --porta 8600 --max-lote 64 --max-espera-ms 5
+
+Endpoints:
+    POST /v1/conversao  {"price": ..., "brand_encoded": ..., ...}  -> {"prob_compra", "predicao", "classificacao"}
+    POST /v1/precos     {"price": ..., "price_ratio_cat": ...}     -> {"classificacao", "status_preco"}
+    GET  /metricas      Percentis de latência e histograma de tamanhos de lote
+    GET  /saude         Modelos carregados e versão (hash) de cada artefato
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import tornado.web
+
+from ingestao import ativar_copy_on_write
+from modelos import FEATURES_CONVERSAO, FEATURES_PRECOS, classificar_precos, prever_conversao
+from registro_artefatos import estado_artefatos, obter_artefato
+
+MAX_LOTE = 64
+MAX_ESPERA_MS = 5.0
+# Latências mantidas para o cálculo dos percentis (janela das últimas N requisições)
+JANELA_LATENCIAS = 10_000
+
+
+class MicroLote:
+    """
+    Agrupa linhas de requisições concorrentes e pontua cada grupo em uma única chamada.
+
+    Args:
+        pontuar (Callable[[pd.DataFrame], list[dict]]): Pontua um lote e devolve um resultado por linha
+        features (list[str]): Colunas esperadas em cada linha
+        max_lote (int): Tamanho máximo do micro-lote (1 = sem agrupamento)
+        max_espera_ms (float): Espera máxima, após a primeira linha, para completar o lote
+    """
+
+    def __init__(self, pontuar, features, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS):
+        self.pontuar = pontuar
+        self.features = features
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000
+        self.fila = asyncio.Queue()
+        self.latencias_ms = deque(maxlen=JANELA_LATENCIAS)
+        self.tamanhos_lote = Counter()
+        self.requisicoes = 0
+        # Um único thread de pontuação: o event loop segue aceitando requisições enquanto o lote roda
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._tarefa = None
+
+    def iniciar(self):
+        self._tarefa = asyncio.get_running_loop().create_task(self._consumir())
+
+    async def prever(self, linha):
+        """Enfileira uma linha e aguarda o resultado do micro-lote em que ela entrar"""
+        inicio = time.perf_counter()
+        futuro = asyncio.get_running_loop().create_future()
+        await self.fila.put((linha, futuro))
+        resultado = await futuro
+        self.latencias_ms.append((time.perf_counter() - inicio) * 1000)
+        self.requisicoes += 1
+        return resultado
+
+    async def _consumir(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self.fila.get()]
+            limite = loop.time() + self.max_espera
+            while len(lote) < self.max_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.fila.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+            self.tamanhos_lote[len(lote)] += 1
+            linhas, futuros = zip(*lote)
+            try:
+                dados = pd.DataFrame(list(linhas), columns=self.features)
+                resultados = await loop.run_in_executor(self._executor, self.pontuar, dados)
+            except Exception as e:
+                for futuro in futuros:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            for futuro, resultado in zip(futuros, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+    def metricas(self):
+        """Percentis de latência (ms) e histograma de tamanhos de lote"""
+        latencias = np.fromiter(self.latencias_ms, dtype=float)
+        percentis = {}
+        if len(latencias):
+            p50, p90, p99 = np.percentile(latencias, [50, 90, 99])
+            percentis = {"p50": p50, "p90": p90, "p99": p99, "max": float(latencias.max())}
+        return {
+            "requisicoes": self.requisicoes,
+            "latencia_ms": percentis,
+            "tamanhos_lote": {str(tamanho): total for tamanho, total in sorted(self.tamanhos_lote.items())},
+            "max_lote": self.max_lote,
+            "max_espera_ms": self.max_espera * 1000,
+        }
+
+
+def pontuador_conversao():
+    """Função de pontuação em lote do Modelo 2 (versão atual do registro a cada lote: recarga sem restart)"""
+    def pontuar(dados):
+        return prever_conversao(dados, obter_artefato("assets_conversao").objeto['model']).to_dict("records")
+    return pontuar
+
+
+def pontuador_precos():
+    """Função de pontuação em lote do Modelo 3 (versão atual do registro a cada lote: recarga sem restart)"""
+    def pontuar(dados):
+        return classificar_precos(dados, obter_artefato("reglog").objeto).to_dict("records")
+    return pontuar
+
+
+class PontuacaoHandler(tornado.web.RequestHandler):
+    def initialize(self, lotes, nome):
+        self.lote = lotes.get(nome)
+
+    async def post(self):
+        if self.lote is None:
+            raise tornado.web.HTTPError(503, reason="Modelo não carregado")
+        try:
+            linha = json.loads(self.request.body)
+        except json.JSONDecodeError:
+            raise tornado.web.HTTPError(400, reason="JSON inválido")
+        if not isinstance(linha, dict):
+            raise tornado.web.HTTPError(400, reason="Esperado um objeto JSON por linha")
+        faltando = [coluna for coluna in self.lote.features if coluna not in linha]
+        if faltando:
+            self.set_status(400)
+            self.write({"erro": f"Colunas obrigatórias ausentes: {', '.join(faltando)}"})
+            return
+        resultado = await self.lote.prever([linha[coluna] for coluna in self.lote.features])
+        self.write({chave: valor.item() if hasattr(valor, "item") else valor for chave, valor in resultado.items()})
+
+
+class MetricasHandler(tornado.web.RequestHandler):
+    def initialize(self, lotes):
+        self.lotes = lotes
+
+    def get(self):
+        self.write({nome: lote.metricas() for nome, lote in self.lotes.items()})
+
+
+class SaudeHandler(tornado.web.RequestHandler):
+    def initialize(self, lotes):
+        self.lotes = lotes
+
+    def get(self):
+        self.write({"status": "ok", "modelos": sorted(self.lotes), "artefatos": estado_artefatos()})
+
+
+def carregar_lotes(max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS):
+    """Carrega cada modelo no registro de artefatos; modelos ausentes ficam fora do servidor (503)"""
+    lotes = {}
+    try:
+        obter_artefato("assets_conversao")
+        lotes["conversao"] = MicroLote(pontuador_conversao(), FEATURES_CONVERSAO, max_lote, max_espera_ms)
+    except FileNotFoundError as e:
+        print(f"Modelo 2 indisponível: {e.filename}")
+    try:
+        obter_artefato("reglog")
+        lotes["precos"] = MicroLote(pontuador_precos(), FEATURES_PRECOS, max_lote, max_espera_ms)
+    except FileNotFoundError as e:
+        print(f"Modelo 3 indisponível: {e.filename}")
+    return lotes
+
+
+def criar_aplicacao(lotes):
+    return tornado.web.Application([
+        (r"/v1/conversao", PontuacaoHandler, {"lotes": lotes, "nome": "conversao"}),
+        (r"/v1/precos", PontuacaoHandler, {"lotes": lotes, "nome": "precos"}),
+        (r"/metricas", MetricasHandler, {"lotes": lotes}),
+        (r"/saude", SaudeHandler, {"lotes": lotes}),
+    ])
+
+
+async def servir(porta, max_lote, max_espera_ms):
+    lotes = carregar_lotes(max_lote, max_espera_ms)
+    for lote in lotes.values():
+        lote.iniciar()
+    criar_aplicacao(lotes).listen(porta)
+    print(f"Servidor de pontuação em http://localhost:{porta} (max_lote={max_lote}, max_espera_ms={max_espera_ms})")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8600)
+    parser.add_argument("--max-lote", type=int, default=MAX_LOTE, help="Tamanho máximo do micro-lote (1 = sem agrupamento)")
+    parser.add_argument("--max-espera-ms", type=float, default=MAX_ESPERA_MS, help="Espera máxima para completar um lote")
+    args = parser.parse_args(argv)
+    ativar_copy_on_write()
+    asyncio.run(servir(args.porta, args.max_lote, args.max_espera_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 Utilitários para formatação de números no padrão brasileiro
 """
+import numpy as np
 import pandas as pd
 
 def formatar_moeda(valor):
@@ -70,4 +71,213 @@ def formatar_milhares(valor):
     elif valor >= 1_000:
         return f"{valor/1_000:,.1f}K".replace(",", "X").replace(".", ",").replace("X", ".")
     else:
-        return formatar_numero(valor)
\ No newline at end of file
+        return formatar_numero(valor)
+
+# ===============================
+# Formatação colunar (Series/arrays inteiros)
+# ===============================
+# Valores escalados (valor × 10^decimais) acima do limite ou a menos da margem de um empate no
+# arredondamento ficam com a função escalar: abaixo do limite, o erro do produto em ponto
+# flutuante (meio ulp, < 1,3e-4) é menor que a margem, e o arredondamento vetorizado coincide
+# com o do `format` do Python. Valores inteiros são exatos até 2^53.
+_LIMITE_VETORIZADO = 2.0 ** 40
+_LIMITE_EXATO = 2.0 ** 53
+_MARGEM_EMPATE = 1e-3
+_POTENCIAS_10 = 10 ** np.arange(19, dtype=np.int64)
+
+def _texto(negativos, inteiros, decimais, prefixo="", sufixo=""):
+    """
+    Monta os textos ('prefixo-1.234,56sufixo') a partir dos valores absolutos escalados (int64, × 10^decimais).
+
+    Os caracteres são escritos em uma matriz de códigos UCS-4 (uma linha por posição, para
+    escritas contíguas): parte inteira alinhada à direita com '.' a cada três dígitos e o sinal,
+    vírgula, casas decimais e sufixo. A matriz transposta é vista como textos NumPy, dos quais
+    se removem os espaços à esquerda.
+    """
+    parte_inteira = inteiros // _POTENCIAS_10[decimais]
+    digitos = 1 + np.searchsorted(_POTENCIAS_10[1:], parte_inteira, side="right")
+    maximo = int(digitos.max(initial=1))
+    largura = 1 + maximo + (maximo - 1) // 3
+    total = largura + (decimais + 1 if decimais else 0) + len(sufixo)
+    codigos = np.full((total, len(inteiros)), ord(" "), dtype=np.uint32)
+    # Divisões em 32 bits sempre que os valores cabem
+    quociente = parte_inteira.astype(np.uint32 if maximo <= 9 else np.uint64)
+    for k in range(maximo):
+        posicao = largura - 1 - k - k // 3
+        presente = k < digitos
+        codigos[posicao] = np.where(presente, quociente % 10 + ord("0"), ord(" "))
+        quociente //= 10
+        if k and k % 3 == 0:
+            codigos[posicao + 1] = np.where(presente, ord("."), ord(" "))
+    # Sinal logo antes do primeiro dígito (ou ponto) de cada linha negativa
+    linhas = np.flatnonzero(negativos)
+    codigos[largura - 1 - digitos[linhas] - (digitos[linhas] - 1) // 3, linhas] = ord("-")
+    if decimais:
+        codigos[largura] = ord(",")
+        fracao = (inteiros % _POTENCIAS_10[decimais]).astype(np.uint32 if decimais <= 9 else np.uint64)
+        for k in range(decimais):
+            codigos[largura + decimais - k] = fracao % 10 + ord("0")
+            fracao //= 10
+    for posicao, caractere in enumerate(sufixo, start=total - len(sufixo)):
+        codigos[posicao] = ord(caractere)
+    textos = np.strings.lstrip(np.ascontiguousarray(codigos.T).view(f"<U{total}").ravel(), " ")
+    return np.strings.add(prefixo, textos) if prefixo else textos
+
+def _fixo(numeros, decimais, prefixo="", sufixo=""):
+    """
+    Equivalente vetorizado de f"{prefixo}{valor:,.{decimais}f}{sufixo}" com os separadores brasileiros.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Textos e máscara dos valores resolvidos (os demais ficam
+        com a função escalar: NaN, infinitos, valores grandes e empates no arredondamento)
+    """
+    with np.errstate(invalid="ignore", over="ignore"):
+        escalados = np.abs(numeros) * float(_POTENCIAS_10[decimais])
+        fracao = escalados - np.floor(escalados)
+        resolvidos = (escalados < _LIMITE_VETORIZADO) & (np.abs(fracao - 0.5) > _MARGEM_EMPATE)
+        resolvidos |= (np.floor(numeros) == numeros) & (escalados < _LIMITE_EXATO)
+    inteiros = np.rint(np.where(resolvidos, escalados, 0.0)).astype(np.int64)
+    return _texto(np.signbit(numeros), inteiros, decimais, prefixo, sufixo), resolvidos
+
+def _truncado(numeros):
+    """Equivalente vetorizado de f"{int(valor):,}" com '.' nos milhares"""
+    with np.errstate(invalid="ignore"):
+        truncados = np.trunc(numeros)
+        resolvidos = np.abs(truncados) < _LIMITE_EXATO
+    inteiros = np.abs(np.where(resolvidos, truncados, 0.0)).astype(np.int64)
+    return _texto(truncados < 0, inteiros, 0), resolvidos
+
+def _formatar_coluna(valores, escalar, vetorizado, nulo=None):
+    """
+    Aplica `vetorizado` à coluna inteira e `escalar` apenas aos valores que ele não resolve.
+
+    Colunas não numéricas (ou float32, cuja aritmética difere da do float64) são formatadas
+    inteiramente pela função escalar.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    tipo = np.dtype(getattr(serie.dtype, "numpy_dtype", serie.dtype))
+    if tipo.kind not in "iuf" or (tipo.kind == "f" and tipo.itemsize != 8):
+        return pd.Series([escalar(valor) for valor in serie], index=serie.index, name=serie.name, dtype=object)
+
+    numeros = serie.to_numpy(dtype="float64", na_value=np.nan)
+    textos, resolvidos = vetorizado(numeros)
+    resultado = textos.astype(object)
+    if nulo is not None:
+        nulos = np.isnan(numeros)
+        resultado[nulos] = nulo
+        resolvidos = resolvidos | nulos
+    if tipo.kind in "iu":
+        # Inteiros acima de 2^53 não são exatos em float64
+        resolvidos = resolvidos & (np.abs(numeros) < 2.0 ** 53)
+    pendentes = np.flatnonzero(~resolvidos)
+    if len(pendentes):
+        originais = serie.to_numpy()
+        for posicao in pendentes:
+            resultado[posicao] = escalar(originais[posicao])
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+def formatar_moeda_coluna(valores):
+    """
+    Versão colunar de `formatar_moeda`: mesmo resultado, sem uma chamada Python por valor
+    
+    Args:
+        valores (pd.Series | array-like): Valores a serem formatados
+    
+    Returns:
+        pd.Series: Textos formatados (mesmo índice da Series de entrada)
+    """
+    return _formatar_coluna(valores, formatar_moeda, lambda numeros: _fixo(numeros, 2, prefixo="R$ "), "R$ 0,00")
+
+def formatar_numero_coluna(valores, decimais=0):
+    """
+    Versão colunar de `formatar_numero`: mesmo resultado, sem uma chamada Python por valor
+    
+    Args:
+        valores (pd.Series | array-like): Valores a serem formatados
+        decimais (int): Número de casas decimais (padrão: 0, com o valor truncado como em `formatar_numero`)
+    
+    Returns:
+        pd.Series: Textos formatados (mesmo índice da Series de entrada)
+    """
+    vetorizado = _truncado if decimais == 0 else lambda numeros: _fixo(numeros, decimais)
+    return _formatar_coluna(valores, lambda valor: formatar_numero(valor, decimais), vetorizado, "0")
+
+def formatar_inteiro_coluna(valores):
+    """
+    Versão colunar de `formatar_inteiro`: mesmo resultado, sem uma chamada Python por valor
+    
+    Args:
+        valores (pd.Series | array-like): Valores a serem formatados
+    
+    Returns:
+        pd.Series: Textos formatados (mesmo índice da Series de entrada)
+    """
+    return _formatar_coluna(valores, formatar_inteiro, lambda numeros: _fixo(numeros, 0))
+
+def formatar_percentual_coluna(valores):
+    """
+    Versão colunar de `formatar_percentual`: mesmo resultado, sem uma chamada Python por valor
+    
+    Args:
+        valores (pd.Series | array-like): Valores percentuais a serem formatados
+    
+    Returns:
+        pd.Series: Textos formatados (mesmo índice da Series de entrada)
+    """
+    return _formatar_coluna(valores, formatar_percentual, lambda numeros: _fixo(numeros, 2, sufixo="%"), "0,00%")
+
+def formatar_milhares_coluna(valores):
+    """
+    Versão colunar de `formatar_milhares`: mesmo resultado, sem uma chamada Python por valor
+    
+    Args:
+        valores (pd.Series | array-like): Valores a serem formatados
+    
+    Returns:
+        pd.Series: Textos formatados de forma compacta (mesmo índice da Series de entrada)
+    """
+    def vetorizado(numeros):
+        with np.errstate(invalid="ignore"):
+            milhoes = numeros >= 1_000_000
+            milhares = ~milhoes & (numeros >= 1_000)
+        textos_milhoes, resolvidos_milhoes = _fixo(numeros / 1_000_000, 1, sufixo="M")
+        textos_milhares, resolvidos_milhares = _fixo(numeros / 1_000, 1, sufixo="K")
+        textos, resolvidos = _truncado(numeros)
+        textos = np.where(milhoes, textos_milhoes, np.where(milhares, textos_milhares, textos))
+        resolvidos = np.where(milhoes, resolvidos_milhoes, np.where(milhares, resolvidos_milhares, resolvidos))
+        return textos, resolvidos
+    return _formatar_coluna(valores, formatar_milhares, vetorizado, "0")
+
+_FORMATADORES_COLUNA = {
+    "moeda": formatar_moeda_coluna,
+    "numero": formatar_numero_coluna,
+    "inteiro": formatar_inteiro_coluna,
+    "percentual": formatar_percentual_coluna,
+    "milhares": formatar_milhares_coluna,
+}
+
+def formatar_tabela(df, formatos):
+    """
+    Prepara uma tabela de resultados para o `st.dataframe` com os números no padrão brasileiro.
+
+    Cada coluna é formatada de uma vez pelas versões colunares (sem uma chamada Python por
+    célula, como no `Styler.format`); a exibição fica com o `column_config` devolvido.
+    
+    Args:
+        df (pd.DataFrame): Tabela com os valores numéricos
+        formatos (dict): Coluna -> formato ('moeda', 'numero', 'inteiro', 'percentual' ou
+            'milhares') ou função colunar (ex.: `lambda s: formatar_numero_coluna(s, 2)`)
+    
+    Returns:
+        tuple[pd.DataFrame, dict]: Cópia da tabela com as colunas formatadas como texto e o
+        `column_config` dessas colunas (para `st.dataframe(tabela, column_config=...)`)
+    """
+    import streamlit as st
+
+    tabela = df.copy(deep=False)
+    configuracao = {}
+    for coluna, formato in formatos.items():
+        formatar = _FORMATADORES_COLUNA[formato] if isinstance(formato, str) else formato
+        tabela[coluna] = formatar(df[coluna])
+        configuracao[coluna] = st.column_config.TextColumn(str(coluna))
+    return tabela, configuracao